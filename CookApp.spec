@@ -11,8 +11,16 @@ a = Analysis(
     ],
     hiddenimports=[
         'common.isAdmin',  # 明确包含common.isAdmin模块
+        'common.capture',  # 共享截图模块
         'cook',  # 包含cook模块
         'cook_mumu',  # 包含cook_mumu模块
+        'overlay',  # 包含覆盖层模块
+        'food_index',  # 食物索引模块
+        'recipe_queue',  # 菜谱队列模块
+        'latency',  # 耗时统计模块
+        'flight_recorder',  # 飞行记录模块
+        'template_matcher',  # 模板匹配模块
+        'template_store',  # 模板编译缓存模块
         'tkinter',
         'tkinter.ttk',
         'tkinter.messagebox',
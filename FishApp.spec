@@ -12,6 +12,7 @@ a = Analysis(
     ],
     hiddenimports=[
         'common.isAdmin',  # 明确包含common.isAdmin模块
+        'common.capture',  # 共享截图模块
         'fishing_ui',  # 包含fishing_ui模块
         'fishing_business',  # 包含fishing_business模块
         'fishing_worker',  # 包含fishing_worker模块
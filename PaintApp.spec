@@ -13,6 +13,7 @@ a = Analysis(
     ],
     hiddenimports=[
         'common.isAdmin',
+        'common.capture',
         'paint_ui',
         'paint_business', 
         'paint_worker',
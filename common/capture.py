@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+公共 - 屏幕截图模块
+各工具共用的截图入口，截图直接写入预分配、可复用的 NumPy 缓冲区：
+  - 后端只负责把屏幕像素（BGRA）放到自己的复用内存中，不创建PIL图像
+  - ScreenCapture 用 cv2.cvtColor(dst=...) 一步转换为 BGR / RGB / 灰度，写入按尺寸预分配的缓冲区
+  - 同一尺寸、格式的缓冲区轮流使用（默认两块），上一帧在取下一帧时仍然有效；最近使用的 CAPTURE_POOLS 种尺寸的缓冲区保留，更早的释放
+  - pixel() 读取单个像素时使用单独的 1x1 内存，不影响区域截图的缓冲区
+
+后端:
+  - gdi:  Windows，BitBlt 到常驻的 DIB section（只在需要更大的尺寸时重新创建，较小的截图使用其左上角的视图），
+          像素内存直接映射为数组（多屏坐标与 ImageGrab all_screens 一致）
+  - x11:  Linux，XGetImage 读取 X 显示（包括 Xvfb 虚拟显示）
+  - file: 从图片文件或数组回放画面，用于没有桌面的环境测试
+  - pil:  PIL.ImageGrab，原有的截图方式，作为兜底和基准对照
+
+返回的数组是复用缓冲区的视图，会被之后的截图覆盖，需要长期保存时请 copy()。
+"""
+
+import os
+import sys
+import ctypes
+import ctypes.util
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每种尺寸和格式轮流使用的缓冲区数量
+CAPTURE_BUFFERS = 2
+# 保留缓冲区的尺寸和格式种类数，超过时释放最久没有使用的一种
+CAPTURE_POOLS = 8
+IMAGE_EXTS = ('.png', '.jpg', '.bmp')
+
+# BGRA -> 目标格式的转换，None 表示直接复制
+_CONVERSIONS = {
+    'bgr': (cv2.COLOR_BGRA2BGR, 3),
+    'rgb': (cv2.COLOR_BGRA2RGB, 3),
+    'gray': (cv2.COLOR_BGRA2GRAY, None),
+    'bgra': (None, 4),
+}
+
+
+class CaptureError(Exception):
+    """截图后端不可用或截图失败"""
+
+
+class CaptureBackend:
+    """截图后端接口
+
+    grab_bgra 返回 (高, 宽, 4) 的 BGRA 数组，可以是后端内部复用内存的视图，在下一次调用前有效。
+    grab_pixel 返回一个像素的 BGRA 值。
+    allocations 记录后端分配像素内存的次数（尺寸不变时应保持不变）。
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self.allocations = 0
+
+    def screen_rect(self):
+        """主屏幕区域 (left, top, width, height)"""
+        raise NotImplementedError
+
+    def grab_bgra(self, left, top, width, height):
+        raise NotImplementedError
+
+    def grab_pixel(self, x, y):
+        return self.grab_bgra(x, y, 1, 1)[0, 0]
+
+    def close(self):
+        pass
+
+
+class _DibSection:
+    """绑定在独立内存DC上的 32 位自顶向下 DIB section，像素内存映射为 (高, 宽, 4) 数组
+
+    只在请求的尺寸超过当前容量时重新创建（宽、高分别取最大值），较小的区域返回左上角的视图。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.dc = backend.gdi32.CreateCompatibleDC(backend.screen_dc)
+        if not self.dc:
+            raise CaptureError("无法创建内存设备上下文")
+        self.bitmap = None
+        self.previous_bitmap = None
+        self.capacity = (0, 0)
+        self.pixels = None
+
+    def ensure(self, width, height):
+        """保证容量不小于 width x height，返回该区域的视图"""
+        capacity_width, capacity_height = self.capacity
+        if width > capacity_width or height > capacity_height:
+            self._create(max(width, capacity_width), max(height, capacity_height))
+        return self.pixels[:height, :width]
+
+    def _create(self, width, height):
+        backend = self.backend
+        self.release()
+        info = backend.BITMAPINFO()
+        info.bmiHeader.biSize = ctypes.sizeof(info.bmiHeader)
+        info.bmiHeader.biWidth = width
+        info.bmiHeader.biHeight = -height  # 负数表示自顶向下，行顺序与数组一致
+        info.bmiHeader.biPlanes = 1
+        info.bmiHeader.biBitCount = 32
+        bits = ctypes.c_void_p()
+        self.bitmap = backend.gdi32.CreateDIBSection(self.dc, ctypes.byref(info), backend.DIB_RGB_COLORS,
+                                                     ctypes.byref(bits), None, 0)
+        if not self.bitmap or not bits.value:
+            self.bitmap = None
+            raise CaptureError(f"创建 {width}x{height} 的DIB失败")
+        self.previous_bitmap = backend.gdi32.SelectObject(self.dc, self.bitmap)
+        buffer = (ctypes.c_ubyte * (width * height * 4)).from_address(bits.value)
+        self.pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+        self.capacity = (width, height)
+        backend.allocations += 1
+
+    def release(self):
+        if self.bitmap:
+            self.backend.gdi32.SelectObject(self.dc, self.previous_bitmap)
+            self.backend.gdi32.DeleteObject(self.bitmap)
+        self.bitmap = None
+        self.pixels = None
+        self.capacity = (0, 0)
+
+    def close(self):
+        self.release()
+        if self.dc:
+            self.backend.gdi32.DeleteDC(self.dc)
+            self.dc = None
+
+
+class GdiBackend(CaptureBackend):
+    """Windows GDI 截图：屏幕DC BitBlt 到常驻的 32 位自顶向下 DIB section，像素内存直接作为数组使用
+
+    区域截图和单像素读取各用一个 DIB section，两者交替调用时都不需要重新创建。
+    """
+
+    name = 'gdi'
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+    DIB_RGB_COLORS = 0
+    # 截图时临时切换为每显示器DPI感知，坐标与 ImageGrab 一致，不受系统缩放影响
+    DPI_AWARENESS_PER_MONITOR_V2 = -4
+
+    def __init__(self):
+        super().__init__()
+        if sys.platform != 'win32':
+            raise CaptureError("GDI 截图只能在 Windows 上使用")
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                        ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD),
+                        ('biCompression', wintypes.DWORD), ('biSizeImage', wintypes.DWORD),
+                        ('biXPelsPerMeter', wintypes.LONG), ('biYPelsPerMeter', wintypes.LONG),
+                        ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD)]
+
+        class BITMAPINFO(ctypes.Structure):
+            _fields_ = [('bmiHeader', BITMAPINFOHEADER), ('bmiColors', wintypes.DWORD * 3)]
+
+        self.BITMAPINFO = BITMAPINFO
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.gdi32 = ctypes.WinDLL('gdi32', use_last_error=True)
+
+        handle = ctypes.c_void_p
+        self.user32.GetDC.argtypes = [handle]
+        self.user32.GetDC.restype = handle
+        self.user32.ReleaseDC.argtypes = [handle, handle]
+        self.user32.GetSystemMetrics.argtypes = [ctypes.c_int]
+        self.gdi32.CreateCompatibleDC.argtypes = [handle]
+        self.gdi32.CreateCompatibleDC.restype = handle
+        self.gdi32.CreateDIBSection.argtypes = [handle, ctypes.POINTER(BITMAPINFO), ctypes.c_uint,
+                                                ctypes.POINTER(ctypes.c_void_p), handle, ctypes.c_uint]
+        self.gdi32.CreateDIBSection.restype = handle
+        self.gdi32.SelectObject.argtypes = [handle, handle]
+        self.gdi32.SelectObject.restype = handle
+        self.gdi32.BitBlt.argtypes = [handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      handle, ctypes.c_int, ctypes.c_int, ctypes.c_uint]
+        self.gdi32.DeleteObject.argtypes = [handle]
+        self.gdi32.DeleteDC.argtypes = [handle]
+        self._set_dpi = getattr(self.user32, 'SetThreadDpiAwarenessContext', None)
+        if self._set_dpi is not None:
+            self._set_dpi.argtypes = [handle]
+            self._set_dpi.restype = handle
+
+        self.screen_dc = self.user32.GetDC(None)
+        if not self.screen_dc:
+            raise CaptureError("无法创建屏幕设备上下文")
+        self.area = _DibSection(self)
+        self.point = _DibSection(self)
+
+    def screen_rect(self):
+        return 0, 0, self.user32.GetSystemMetrics(0), self.user32.GetSystemMetrics(1)
+
+    def _blit(self, dib, left, top, width, height):
+        """把屏幕区域复制到 dib，返回该区域的 BGRA 视图"""
+        pixels = dib.ensure(width, height)
+        previous = self._set_dpi(ctypes.c_void_p(self.DPI_AWARENESS_PER_MONITOR_V2)) if self._set_dpi else None
+        try:
+            ok = self.gdi32.BitBlt(dib.dc, 0, 0, width, height, self.screen_dc, left, top,
+                                   self.SRCCOPY | self.CAPTUREBLT)
+        finally:
+            if previous:
+                self._set_dpi(previous)
+        if not ok:
+            raise CaptureError(f"BitBlt 失败: {ctypes.get_last_error()}")
+        self.gdi32.GdiFlush()
+        return pixels
+
+    def grab_bgra(self, left, top, width, height):
+        return self._blit(self.area, left, top, width, height)
+
+    def grab_pixel(self, x, y):
+        return self._blit(self.point, x, y, 1, 1)[0, 0]
+
+    def close(self):
+        self.area.close()
+        self.point.close()
+        if self.screen_dc:
+            self.user32.ReleaseDC(None, self.screen_dc)
+            self.screen_dc = None
+
+
+class _XImage(ctypes.Structure):
+    """Xlib XImage 结构体的前半部分（只读取像素相关字段）"""
+    _fields_ = [('width', ctypes.c_int), ('height', ctypes.c_int), ('xoffset', ctypes.c_int),
+                ('format', ctypes.c_int), ('data', ctypes.c_void_p), ('byte_order', ctypes.c_int),
+                ('bitmap_unit', ctypes.c_int), ('bitmap_bit_order', ctypes.c_int), ('bitmap_pad', ctypes.c_int),
+                ('depth', ctypes.c_int), ('bytes_per_line', ctypes.c_int), ('bits_per_pixel', ctypes.c_int)]
+
+
+class X11Backend(CaptureBackend):
+    """X11 截图（桌面或 Xvfb 虚拟显示）：XGetImage 读取根窗口，像素内存直接映射为数组
+
+    XImage 在下一次截图或关闭时释放。要求 24/32 位 TrueColor 显示（Xvfb 默认 -screen 0 1280x1024x24）。
+    """
+
+    name = 'x11'
+    ZPIXMAP = 2
+    ALL_PLANES = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self, display=None):
+        super().__init__()
+        path = ctypes.util.find_library('X11')
+        if not path:
+            raise CaptureError("未找到 libX11")
+        self.xlib = xlib = ctypes.CDLL(path)
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int, ctypes.c_int,
+                                   ctypes.c_uint, ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]
+        xlib.XGetImage.restype = ctypes.POINTER(_XImage)
+        xlib.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+
+        name = display or os.environ.get('DISPLAY')
+        if not name:
+            raise CaptureError("未设置 DISPLAY")
+        self.display = xlib.XOpenDisplay(name.encode('utf-8'))
+        if not self.display:
+            raise CaptureError(f"无法打开X显示: {name}")
+        self.screen = xlib.XDefaultScreen(self.display)
+        self.root = xlib.XDefaultRootWindow(self.display)
+        self.image = None
+
+    def screen_rect(self):
+        return (0, 0, self.xlib.XDisplayWidth(self.display, self.screen),
+                self.xlib.XDisplayHeight(self.display, self.screen))
+
+    def _release_image(self):
+        if self.image:
+            self.xlib.XDestroyImage(self.image)
+            self.image = None
+
+    def grab_bgra(self, left, top, width, height):
+        self._release_image()
+        image = self.xlib.XGetImage(self.display, self.root, left, top, width, height, self.ALL_PLANES, self.ZPIXMAP)
+        if not image:
+            raise CaptureError(f"XGetImage 失败: ({left}, {top}, {width}, {height})")
+        self.image = image
+        info = image.contents
+        if info.bits_per_pixel != 32:
+            raise CaptureError(f"不支持 {info.bits_per_pixel} 位像素的X显示")
+        buffer = (ctypes.c_ubyte * (info.bytes_per_line * height)).from_address(info.data)
+        rows = np.frombuffer(buffer, dtype=np.uint8).reshape(height, info.bytes_per_line)
+        return rows[:, :width * 4].reshape(height, width, 4)
+
+    def close(self):
+        self._release_image()
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+
+class FileBackend(CaptureBackend):
+    """从图片回放画面：每次截图前进到下一帧（循环），区域截图直接返回帧的切片，不复制像素"""
+
+    name = 'file'
+
+    def __init__(self, source, origin=(0, 0), advance=True):
+        """
+        :param source: 图片目录、图片路径列表或 BGR/BGRA 数组列表
+        :param origin: 画面左上角对应的屏幕坐标
+        :param advance: 每次截图后是否切换到下一帧
+        """
+        super().__init__()
+        if isinstance(source, str):
+            names = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTS))
+            source = [os.path.join(source, name) for name in names]
+        frames = []
+        for item in source:
+            if isinstance(item, str):
+                item = cv2.imdecode(np.fromfile(item, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+                if item is None:
+                    continue
+            if item.ndim == 2:
+                item = cv2.cvtColor(item, cv2.COLOR_GRAY2BGRA)
+            elif item.shape[2] == 3:
+                item = cv2.cvtColor(item, cv2.COLOR_BGR2BGRA)
+            frames.append(np.ascontiguousarray(item))
+        if not frames:
+            raise CaptureError("没有可回放的画面")
+        self.frames = frames
+        self.origin = origin
+        self.advance = advance
+        self.index = 0
+
+    def screen_rect(self):
+        height, width = self.frames[0].shape[:2]
+        return self.origin[0], self.origin[1], width, height
+
+    def grab_bgra(self, left, top, width, height):
+        frame = self.frames[self.index]
+        if self.advance:
+            self.index = (self.index + 1) % len(self.frames)
+        x, y = left - self.origin[0], top - self.origin[1]
+        if x < 0 or y < 0 or x + width > frame.shape[1] or y + height > frame.shape[0]:
+            raise CaptureError(f"截图区域超出画面: ({left}, {top}, {width}, {height})")
+        return frame[y:y + height, x:x + width]
+
+
+class PilBackend(CaptureBackend):
+    """PIL.ImageGrab 截图（原有方式）：每帧创建PIL图像并转换，作为兜底和基准对照"""
+
+    name = 'pil'
+
+    def __init__(self):
+        super().__init__()
+        from PIL import ImageGrab
+        self.image_grab = ImageGrab
+
+    def screen_rect(self):
+        width, height = self.image_grab.grab().size
+        return 0, 0, width, height
+
+    def grab_bgra(self, left, top, width, height):
+        image = self.image_grab.grab(bbox=(left, top, left + width, top + height), all_screens=True)
+        self.allocations += 2  # PIL图像和转换后的数组
+        return cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGRA)
+
+
+def create_backend(name='auto', **options):
+    """按名称创建截图后端，'auto' 在 Windows 上使用 gdi，有X显示时使用 x11，否则使用 pil"""
+    if name == 'gdi':
+        return GdiBackend()
+    if name == 'x11':
+        return X11Backend(**options)
+    if name == 'file':
+        return FileBackend(**options)
+    if name == 'pil':
+        return PilBackend()
+    if name != 'auto':
+        raise CaptureError(f"未知的截图后端: {name}")
+
+    candidates = [GdiBackend] if sys.platform == 'win32' else []
+    if os.environ.get('DISPLAY'):
+        candidates.append(X11Backend)
+    for backend in candidates:
+        try:
+            return backend()
+        except Exception as e:
+            logger.warning(f"截图后端 {backend.name} 不可用，尝试下一个: {e}")
+    return PilBackend()
+
+
+class ScreenCapture:
+    """截图到预分配的复用缓冲区
+
+    区域使用 (left, top, right, bottom) 屏幕坐标，与 ImageGrab.grab(bbox=...) 一致，None 表示主屏幕。
+    """
+
+    def __init__(self, backend='auto', buffers=CAPTURE_BUFFERS, **options):
+        """
+        :param backend: 后端名称或 CaptureBackend 实例
+        :param buffers: 同一尺寸、格式轮流使用的缓冲区数量
+        :param options: 创建后端的参数（如 file 后端的 source）
+        """
+        self.backend = backend if isinstance(backend, CaptureBackend) else create_backend(backend, **options)
+        self.buffers = max(1, buffers)
+        self._pools = OrderedDict()  # (格式, 高, 宽) -> [缓冲区列表, 下一个使用的序号]，按最近使用排序
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.buffer_allocations = 0
+        logger.info(f"截图后端: {self.backend.name}")
+
+    @property
+    def allocations(self):
+        """像素缓冲区的分配次数（转换缓冲区 + 后端内存），尺寸不变时不会增长"""
+        return self.buffer_allocations + self.backend.allocations
+
+    def _buffer(self, fmt, height, width):
+        channels = _CONVERSIONS[fmt][1]
+        key = (fmt, height, width)
+        pool = self._pools.get(key)
+        if pool is None:
+            shape = (height, width) if channels is None else (height, width, channels)
+            pool = self._pools[key] = [[np.empty(shape, dtype=np.uint8) for _ in range(self.buffers)], 0]
+            self.buffer_allocations += self.buffers
+            # 区域尺寸很多时（如画图工具的各种区域截图）只保留最近使用的几种，已返回的数组仍然有效
+            while len(self._pools) > CAPTURE_POOLS:
+                self._pools.popitem(last=False)
+        else:
+            self._pools.move_to_end(key)
+        arrays, index = pool
+        pool[1] = (index + 1) % len(arrays)
+        return arrays[index]
+
+    def grab(self, region=None, fmt='bgr'):
+        """截取区域并转换为指定格式（'bgr'、'rgb'、'gray'、'bgra'），返回复用缓冲区"""
+        if fmt not in _CONVERSIONS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        with self._lock:
+            if region is None:
+                left, top, width, height = self.backend.screen_rect()
+            else:
+                left, top, right, bottom = (int(value) for value in region)
+                width, height = right - left, bottom - top
+            if width <= 0 or height <= 0:
+                raise CaptureError(f"截图区域为空: {region}")
+
+            bgra = self.backend.grab_bgra(left, top, width, height)
+            out = self._buffer(fmt, height, width)
+            code = _CONVERSIONS[fmt][0]
+            if code is None:
+                np.copyto(out, bgra)
+            else:
+                cv2.cvtColor(bgra, code, dst=out)
+            self.frames += 1
+            return out
+
+    def pixel(self, x, y):
+        """读取一个屏幕像素的 (R, G, B)，使用后端的单像素读取，不占用区域截图的内存和缓冲区"""
+        with self._lock:
+            b, g, r = self.backend.grab_pixel(int(x), int(y))[:3]
+            self.frames += 1
+        return int(r), int(g), int(b)
+
+    def close(self):
+        self.backend.close()
+
+
+_default_capture = None
+_default_lock = threading.Lock()
+
+
+def default_capture():
+    """进程内共享的截图实例（首次使用时创建，自动选择后端）"""
+    global _default_capture
+    with _default_lock:
+        if _default_capture is None:
+            _default_capture = ScreenCapture()
+        return _default_capture
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - ADB后端模块
+直接通过 adb server 的socket协议与模拟器通信（不为每条命令启动 adb.exe 进程）：
+  - 截图使用 screencap 的原始RGBA输出，分辨率为模拟器原生分辨率，窗口无需在前台
+  - 点击和滑动通过一个常驻的 sh 会话执行 input tap / input swipe
+MuMu模拟器12的ADB地址为 127.0.0.1:16384，多开实例依次加32（16416、16448...）。
+"""
+
+import socket
+import struct
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ADB_HOST = '127.0.0.1'
+ADB_PORT = 5037
+# 常驻shell中每条命令后输出的结束标记，用于确认命令已执行完
+SHELL_MARKER = '__cook_done__'
+# MuMu模拟器12多开实例的ADB端口：第 i 个实例为 MUMU_ADB_PORT + MUMU_ADB_PORT_STEP * i
+MUMU_ADB_PORT = 16384
+MUMU_ADB_PORT_STEP = 32
+
+
+class AdbError(Exception):
+    """adb server 返回 FAIL 或连接异常"""
+
+
+def mumu_serial(index, host=ADB_HOST):
+    """MuMu模拟器12第 index 个多开实例（从0开始）的ADB序列号"""
+    return f'{host}:{MUMU_ADB_PORT + MUMU_ADB_PORT_STEP * index}'
+
+
+def recv_exact(sock, size):
+    """从socket读取恰好 size 字节"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise AdbError("adb连接被关闭")
+        received += count
+    return bytes(buffer)
+
+
+def recv_all(sock, chunk=1 << 20):
+    """读取socket直到对端关闭"""
+    data = bytearray()
+    while True:
+        part = sock.recv(chunk)
+        if not part:
+            return bytes(data)
+        data += part
+
+
+def send_request(sock, payload):
+    """按adb协议发送请求：4位十六进制长度 + 内容"""
+    data = payload.encode('utf-8')
+    sock.sendall(b'%04x' % len(data) + data)
+
+
+def read_status(sock):
+    """读取 OKAY/FAIL 应答，FAIL 时抛出 AdbError"""
+    status = recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        length = int(recv_exact(sock, 4), 16)
+        raise AdbError(recv_exact(sock, length).decode('utf-8', 'replace'))
+    raise AdbError(f"未知的adb应答: {status!r}")
+
+
+def parse_screencap(data):
+    """解析 screencap 原始输出，返回 (h, w, 4) 的RGBA数组
+
+    头部为 宽、高、像素格式 三个uint32，Android 9 起多一个色彩空间字段，按数据长度判断头部大小。
+    """
+    if len(data) < 12:
+        raise AdbError(f"screencap 输出过短: {len(data)} 字节")
+    width, height, _ = struct.unpack_from('<III', data)
+    header = len(data) - width * height * 4
+    if header not in (12, 16):
+        raise AdbError(f"无法解析 screencap 输出: {width}x{height}, {len(data)} 字节")
+    return np.frombuffer(data, dtype=np.uint8, offset=header).reshape(height, width, 4)
+
+
+class AdbDevice:
+    """通过 adb server 操作一个模拟器实例
+
+    capture 与 CookingBot 的 capture_source 接口一致，tap/swipe 的坐标是模拟器原生分辨率下的坐标，
+    也就是截图中的像素坐标，因此检测结果可以直接用于点击。
+    """
+
+    def __init__(self, serial, host=ADB_HOST, port=ADB_PORT, timeout=5.0):
+        """
+        :param serial: 设备序列号，MuMu模拟器为 127.0.0.1:16384 这样的地址
+        :param host: adb server 地址
+        :param port: adb server 端口
+        :param timeout: socket超时时间（秒）
+        """
+        self.serial = serial
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.size = None  # 最近一次截图的 (宽, 高)
+        self._shell = None
+        self._shell_buffer = b''
+        self._shell_lock = threading.Lock()
+
+        if ':' in serial:
+            # 网络设备需要先让 adb server 连接上
+            self.connect()
+
+    def _socket(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def host_request(self, payload):
+        """执行 host: 开头的服务，返回应答内容"""
+        with self._socket() as sock:
+            send_request(sock, payload)
+            read_status(sock)
+            length = int(recv_exact(sock, 4), 16)
+            return recv_exact(sock, length).decode('utf-8', 'replace')
+
+    def connect(self):
+        message = self.host_request(f'host:connect:{self.serial}')
+        logger.info(f"adb connect {self.serial}: {message}")
+        if 'connected' not in message:
+            raise AdbError(message)
+
+    def open_service(self, service):
+        """切换到本设备并打开服务，返回已就绪的socket"""
+        sock = self._socket()
+        try:
+            send_request(sock, f'host:transport:{self.serial}')
+            read_status(sock)
+            send_request(sock, service)
+            read_status(sock)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def screencap(self):
+        """截取模拟器画面，返回RGBA数组"""
+        with self.open_service('exec:screencap') as sock:
+            rgba = parse_screencap(recv_all(sock))
+        self.size = (rgba.shape[1], rgba.shape[0])
+        return rgba
+
+    def capture(self):
+        """capture_source 接口：返回 (RGB截图, 截图左上角坐标)，ADB截图的坐标系就是设备坐标系"""
+        return cv2.cvtColor(self.screencap(), cv2.COLOR_RGBA2RGB), (0, 0)
+
+    def shell(self, command):
+        """在常驻sh会话中执行命令并等待其完成，返回命令输出"""
+        with self._shell_lock:
+            for attempt in range(2):
+                try:
+                    if self._shell is None:
+                        self._shell = self.open_service('exec:sh')
+                        self._shell_buffer = b''
+                    self._shell.sendall(f'{command}; echo {SHELL_MARKER}\n'.encode('utf-8'))
+                    return self._read_until_marker()
+                except (OSError, AdbError) as e:
+                    # 会话断开（模拟器重启等）时重新打开一次
+                    self.close()
+                    if attempt:
+                        raise AdbError(f"adb shell 执行失败: {e}")
+                    logger.warning(f"adb shell 会话断开，重新连接: {e}")
+
+    def _read_until_marker(self):
+        marker = SHELL_MARKER.encode('utf-8') + b'\n'
+        while marker not in self._shell_buffer:
+            part = self._shell.recv(4096)
+            if not part:
+                raise AdbError("adb shell 会话被关闭")
+            self._shell_buffer += part
+        output, self._shell_buffer = self._shell_buffer.split(marker, 1)
+        return output.decode('utf-8', 'replace')
+
+    def tap(self, x, y):
+        self.shell(f'input tap {int(x)} {int(y)}')
+
+    def swipe(self, x1, y1, x2, y2, duration_ms=100):
+        self.shell(f'input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)} {int(duration_ms)}')
+
+    def screen_size(self):
+        """设备分辨率 (宽, 高)，没有截过图时先截一张"""
+        if self.size is None:
+            self.screencap()
+        return self.size
+
+    def close(self):
+        if self._shell is not None:
+            try:
+                self._shell.close()
+            except OSError:
+                pass
+            self._shell = None
@@ -0,0 +1,972 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 性能基准模块
+在录制的截图（或合成画面）上离线测量模板匹配各环节的耗时，不依赖游戏和Windows环境
+
+用法:
+    python benchmark.py peaks --frames ./recorded --template cook_menu
+    python benchmark.py frame --frames ./recorded
+    python benchmark.py coarse --frames ./recorded --template cook_menu
+    python benchmark.py parallel --frames ./recorded --workers 8
+    python benchmark.py overlay --ticks 200 --fps 15
+    python benchmark.py adb --serial 127.0.0.1:16384
+    python benchmark.py foods --food sala
+    python benchmark.py latency --frames ./recorded
+    python benchmark.py capture --backend auto --region 0,0,1280,720
+    python benchmark.py fft --frames ./recorded --kind binary
+    python benchmark.py roi --frames ./recorded --template finish
+    python benchmark.py click --frames ./recorded --template finish
+    python benchmark.py binary --frames ./recorded --template finish
+    python benchmark.py templates
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from template_matcher import (
+    FrameContext, TemplatePyramidCache, BUTTON_SCALE_FACTORS, FOOD_SCALE_FACTORS, preprocess_binary, build_scaled_templates,
+    extract_peaks, nms_boxes, match_pyramids, match_pyramids_coarse_to_fine, ScreenSpectrum, levels_for_box,
+    ROI_JITTER, CLICK_DIFF_SAME, CLICK_DIFF_GONE, roi_difference, BinaryScreen, match_pyramids_bits
+)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BTNS_DIR = os.path.join(SCRIPT_DIR, "btns")
+FOODS_DIR = os.path.join(SCRIPT_DIR, "foods")
+IMAGE_EXTS = ('.png', '.jpg', '.bmp')
+
+
+def imread_unicode(path):
+    """读取图像，兼容中文路径"""
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def load_frames(frames_dir, limit=None):
+    """加载录制的截图（BGR）"""
+    names = sorted(f for f in os.listdir(frames_dir) if f.lower().endswith(IMAGE_EXTS))
+    if limit:
+        names = names[:limit]
+    frames = [imread_unicode(os.path.join(frames_dir, name)) for name in names]
+    return [frame for frame in frames if frame is not None]
+
+
+def load_template(name):
+    """按名称加载模板：优先btns目录，其次foods目录"""
+    for directory in (BTNS_DIR, FOODS_DIR):
+        path = os.path.join(directory, f"{name}.png")
+        if os.path.exists(path):
+            return imread_unicode(path)
+    return None
+
+
+def synthesize_frames(template, count=5, size=(1440, 2560), copies=12, seed=0):
+    """没有录制画面时，在随机纹理背景上粘贴模板生成合成画面"""
+    rng = np.random.default_rng(seed)
+    h, w = template.shape[:2]
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 256, (size[0] // 8, size[1] // 8, 3), dtype=np.uint8)
+        frame = cv2.resize(noise, (size[1], size[0]), interpolation=cv2.INTER_LINEAR)
+        for _ in range(copies):
+            x = int(rng.integers(0, size[1] - w))
+            y = int(rng.integers(0, size[0] - h))
+            frame[y:y + h, x:x + w] = template
+        frames.append(frame)
+    return frames
+
+
+def legacy_extract_and_nms(results, threshold):
+    """原实现：逐像素构造Python列表后调用cv2.dnn.NMSBoxes"""
+    matches = []
+    for result, w, h in results:
+        locations = np.where(result >= threshold)
+        for pt in zip(*locations[::-1]):
+            matches.append([int(pt[0]), int(pt[1]), int(w), int(h), float(result[pt[1], pt[0]])])
+    if not matches:
+        return np.empty((0, 5))
+    rectangles = np.array(matches)
+    indices = cv2.dnn.NMSBoxes(rectangles[:, :4].tolist(), rectangles[:, 4].tolist(), threshold, 0.4)
+    if len(indices) == 0:
+        return np.empty((0, 5))
+    return rectangles[np.asarray(indices).flatten()]
+
+
+def vectorized_extract_and_nms(results, threshold):
+    """新实现：局部极大值提取 + 向量化NMS"""
+    peaks = [extract_peaks(result, threshold, w, h) for result, w, h in results]
+    return nms_boxes(np.vstack(peaks), threshold, 0.4)
+
+
+def box_agreement(reference, candidate, tolerance=2):
+    """计算参考结果中有多少比例的框在候选结果中能找到对应框（坐标偏差不超过tolerance像素）"""
+    if len(reference) == 0:
+        return 1.0 if len(candidate) == 0 else 0.0
+    if len(candidate) == 0:
+        return 0.0
+    diff = np.abs(reference[:, None, :4] - candidate[None, :, :4]).max(axis=2)
+    return float(np.mean(diff.min(axis=1) <= tolerance))
+
+
+def bench_peaks(frames, template, threshold=0.55, repeat=3):
+    """对比峰值提取与NMS的新旧实现"""
+    levels = build_scaled_templates(preprocess_binary(template), BUTTON_SCALE_FACTORS)
+    legacy_total = 0.0
+    vector_total = 0.0
+    agreement = 0.0
+    hits = 0
+
+    for frame in frames:
+        screen = preprocess_binary(frame)
+        results = []
+        for scale, scaled in levels:
+            result = cv2.matchTemplate(screen, scaled, cv2.TM_CCOEFF_NORMED)
+            h, w = scaled.shape[:2]
+            results.append((result, w, h))
+            hits += int(np.count_nonzero(result >= threshold))
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            legacy = legacy_extract_and_nms(results, threshold)
+        legacy_total += (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            vector = vectorized_extract_and_nms(results, threshold)
+        vector_total += (time.perf_counter() - start) / repeat
+
+        agreement += box_agreement(legacy, vector)
+
+    n = len(frames)
+    print(f"帧数: {n}, 平均每帧超阈值像素: {hits / n:.0f}")
+    print(f"原实现  (逐像素列表 + NMSBoxes): {legacy_total / n * 1000:8.2f} ms/帧")
+    print(f"新实现  (局部极大值 + 向量化NMS): {vector_total / n * 1000:8.2f} ms/帧")
+    print(f"加速比: {legacy_total / max(vector_total, 1e-9):.1f}x, 结果一致率: {agreement / n:.1%}")
+
+
+def bench_frame(frames, detections=3, repeat=3):
+    """对比每次检测各自预处理与同一帧共享 FrameContext 的耗时"""
+    separate_total = 0.0
+    shared_total = 0.0
+
+    for frame in frames:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _ in range(detections):
+                preprocess_binary(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        separate_total += (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            context = FrameContext(rgb)
+            for _ in range(detections):
+                context.binary
+        shared_total += (time.perf_counter() - start) / repeat
+
+    n = len(frames)
+    h, w = frames[0].shape[:2]
+    print(f"帧数: {n}, 分辨率: {w}x{h}, 每个tick检测次数: {detections}")
+    print(f"每次检测单独预处理: {separate_total / n * 1000:8.2f} ms/tick")
+    print(f"共享 FrameContext:  {shared_total / n * 1000:8.2f} ms/tick")
+    print(f"加速比: {separate_total / max(shared_total, 1e-9):.1f}x")
+
+
+def bench_coarse(frames, template, threshold=0.55, factor=0.5, repeat=3):
+    """对比整帧全尺度搜索与由粗到细搜索的耗时和结果一致率"""
+    cache = TemplatePyramidCache()
+    cache.build('target', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    pyramids = cache.get('target')
+    coarse_pyramids = cache.get_coarse('target', factor)
+
+    exhaustive_total = 0.0
+    coarse_total = 0.0
+    recall = 0.0
+    precision = 0.0
+
+    for frame in frames:
+        context = FrameContext(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        screen = context.binary
+        coarse_screen = context.downscaled(factor, 'binary')
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            reference = match_pyramids(screen, pyramids, threshold)
+        exhaustive_total += (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            candidate = match_pyramids_coarse_to_fine(
+                screen, coarse_screen, pyramids, coarse_pyramids, factor, threshold
+            )
+        coarse_total += (time.perf_counter() - start) / repeat
+
+        recall += box_agreement(reference, candidate)
+        precision += box_agreement(candidate, reference)
+
+    n = len(frames)
+    print(f"帧数: {n}, 缩放系数: {factor}, 匹配阈值: {threshold}")
+    print(f"全尺度搜索:  {exhaustive_total / n * 1000:8.2f} ms/帧")
+    print(f"由粗到细:    {coarse_total / n * 1000:8.2f} ms/帧")
+    print(f"加速比: {exhaustive_total / max(coarse_total, 1e-9):.1f}x, "
+          f"召回率: {recall / n:.1%}, 精确率: {precision / n:.1%}")
+
+
+def bench_parallel(frames, template, threshold=0.55, workers=None, repeat=3):
+    """对比单线程与线程池并行的多尺度匹配耗时"""
+    workers = workers or os.cpu_count() or 4
+    cache = TemplatePyramidCache()
+    cache.build('target', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    pyramids = cache.get('target')
+
+    serial_total = 0.0
+    parallel_total = 0.0
+    agreement = 0.0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for frame in frames:
+            screen = preprocess_binary(frame)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                serial = match_pyramids(screen, pyramids, threshold)
+            serial_total += (time.perf_counter() - start) / repeat
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parallel = match_pyramids(screen, pyramids, threshold, executor=executor)
+            parallel_total += (time.perf_counter() - start) / repeat
+
+            agreement += box_agreement(serial, parallel, tolerance=0)
+
+    n = len(frames)
+    print(f"帧数: {n}, 线程数: {workers}, 尺度数: {sum(len(levels) for levels in pyramids)}")
+    print(f"单线程:    {serial_total / n * 1000:8.2f} ms/帧")
+    print(f"线程池并行: {parallel_total / n * 1000:8.2f} ms/帧")
+    print(f"加速比: {serial_total / max(parallel_total, 1e-9):.1f}x, 结果一致率: {agreement / n:.1%}")
+
+
+def bench_overlay(ticks=200, detections=3, boxes=4, fps=15):
+    """对比每次检测同步重绘覆盖层与限帧率覆盖层的耗时（需要图形界面）"""
+    import tkinter as tk
+    from overlay import OverlayWindow
+
+    try:
+        overlay = OverlayWindow(fps=fps)
+    except tk.TclError as e:
+        print(f"无法创建覆盖层窗口，跳过: {e}")
+        return
+
+    rng = np.random.default_rng(0)
+    width = overlay.root.winfo_screenwidth()
+    height = overlay.root.winfo_screenheight()
+
+    def random_matches():
+        xs = rng.integers(0, max(width - 100, 1), boxes)
+        ys = rng.integers(20, max(height - 100, 21), boxes)
+        return [(int(x), int(y), 80, 60, 0.8) for x, y in zip(xs, ys)]
+
+    try:
+        # 旧方式：每次检测都清空画布重绘并立即处理Tk事件
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for _ in range(detections):
+                overlay.draw(random_matches(), 'btn')
+                overlay.root.update()
+        legacy_total = time.perf_counter() - start
+        legacy_redraws = overlay.redraws
+
+        # 新方式：检测只提交最新结果，每个tick调用一次 pump，由其限制重绘帧率
+        overlay.redraws = 0
+        start = time.perf_counter()
+        for _ in range(ticks):
+            for _ in range(detections):
+                overlay.update_overlay(random_matches(), 'btn')
+            overlay.pump()
+        throttled_total = time.perf_counter() - start
+        throttled_redraws = overlay.redraws
+    finally:
+        overlay.close()
+
+    n = ticks * detections
+    print(f"tick数: {ticks}, 每tick检测次数: {detections}, 每次检测框数: {boxes}, 限定帧率: {fps}")
+    print(f"同步重绘: {legacy_total / n * 1000:8.3f} ms/次检测, 重绘 {legacy_redraws} 次")
+    print(f"限帧率:   {throttled_total / n * 1000:8.3f} ms/次检测, 重绘 {throttled_redraws} 次")
+
+
+def latency_summary(samples):
+    samples = np.asarray(samples) * 1000
+    return f"平均 {samples.mean():7.2f} ms, p95 {np.percentile(samples, 95):7.2f} ms"
+
+
+def bench_adb(frames, serial=None, port=5037, repeat=20):
+    """对比ADB截图/点击与桌面截图的单帧延迟
+
+    不指定 serial 时启动本地替身 adb server（replay.FakeAdbServer），依次返回 frames 中的画面。
+    """
+    from adb_backend import AdbDevice
+
+    server = None
+    if serial is None:
+        from replay import FakeAdbServer
+        rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        counter = iter(range(1 << 30))
+        server = FakeAdbServer(lambda: rgb_frames[next(counter) % len(rgb_frames)]).start()
+        serial, port = '127.0.0.1:16384', server.port
+        print(f"使用本地替身 adb server（端口 {port}）")
+
+    try:
+        device = AdbDevice(serial, port=port)
+        device.capture()  # 预热连接
+        width, height = device.screen_size()
+
+        capture_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            device.capture()
+            capture_times.append(time.perf_counter() - start)
+
+        tap_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            device.shell('echo tap')  # 不真正点击，只测常驻shell的往返延迟
+            tap_times.append(time.perf_counter() - start)
+        device.close()
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(f"分辨率: {width}x{height}, 次数: {repeat}")
+    print(f"ADB截图:        {latency_summary(capture_times)}")
+    print(f"ADB shell往返:  {latency_summary(tap_times)}")
+
+    try:
+        from PIL import ImageGrab
+        grab_times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            np.array(ImageGrab.grab(bbox=(0, 0, width, height), all_screens=True))
+            grab_times.append(time.perf_counter() - start)
+        print(f"桌面截图:       {latency_summary(grab_times)}")
+    except Exception as e:
+        print(f"桌面截图不可用，跳过: {e}")
+
+
+def bench_latency(frames, template, threshold=0.55, repeat=3):
+    """测量耗时统计的开销：同样的按钮检测流程不计时与分段计时的耗时对比，以及单次记录的开销"""
+    from latency import LatencyRecorder, stage
+
+    cache = TemplatePyramidCache()
+    cache.build('btn', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    recorder = LatencyRecorder()
+
+    def detect(frame):
+        frame.binary
+        return match_pyramids(frame.binary, cache.get('btn'), threshold)
+
+    def detect_timed(frame):
+        # 与 CookingBot.detect_buttons 相同的分段：截图（此处为创建帧）、预处理、匹配（NMS在匹配内部）
+        with recorder.stages('detect/btn'):
+            with stage('capture'):
+                frame = FrameContext(frame.rgb)
+            with stage('preprocess'):
+                frame.binary
+            with stage('match'):
+                return match_pyramids(frame.binary, cache.get('btn'), threshold)
+
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    plain, timed = [], []
+    for _ in range(repeat):
+        # 交替测量，减少CPU频率等因素对两组结果的影响
+        for rgb in rgb_frames:
+            start = time.perf_counter()
+            detect(FrameContext(rgb))
+            plain.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            detect_timed(FrameContext(rgb))
+            timed.append(time.perf_counter() - start)
+
+    # 单次分段统计的固定开销：不做任何实际工作的 stages + 4个 stage
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        with recorder.stages('overhead'):
+            for name in ('capture', 'preprocess', 'match', 'nms'):
+                with stage(name):
+                    pass
+    fixed = (time.perf_counter() - start) / n
+
+    plain_ms = np.median(plain) * 1000
+    timed_ms = np.median(timed) * 1000
+    print(f"帧数: {len(frames)}, 重复: {repeat}")
+    print(f"不计时:   {plain_ms:8.2f} ms/次检测 (中位数)")
+    print(f"分段计时: {timed_ms:8.2f} ms/次检测 (中位数)")
+    print(f"单次检测的计时开销: {fixed * 1e6:.1f} us, 占检测耗时 {fixed * 1000 / plain_ms:.3%}")
+    for name, item in recorder.summary('detect/').items():
+        print(f"  {name:<24}{item['count']:>6}{item['mean_ms']:>10.2f}{item['p95_ms']:>10.2f}")
+
+
+def bench_capture(frames, backend='file', region=None, repeat=200):
+    """对比截图：原有的 ImageGrab + np.array vs 共享截图模块写入复用缓冲区
+
+    backend 为 file 时在录制/合成画面上回放（原有方式用 PIL 图像裁剪 + np.array 模拟），
+    其他后端截取真实屏幕。每帧分配的内存用 tracemalloc 的峰值统计（不含PIL内部的像素内存）。
+    """
+    import tracemalloc
+    from PIL import Image
+    sys.path.append(os.path.dirname(SCRIPT_DIR))
+    from common.capture import ScreenCapture
+
+    if backend == 'file':
+        capture = ScreenCapture('file', source=frames)
+        rgb_frames = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+        counter = iter(range(10 ** 9))
+
+        def legacy(bbox):
+            image = rgb_frames[next(counter) % len(rgb_frames)]
+            return np.array(image.crop(bbox) if bbox else image.copy())
+    else:
+        from PIL import ImageGrab
+        capture = ScreenCapture(backend)
+
+        def legacy(bbox):
+            return np.array(ImageGrab.grab(bbox=bbox, all_screens=True))
+
+    if region is None:
+        left, top, width, height = capture.backend.screen_rect()
+        region = (left, top, left + width, top + height)
+
+    def measure(grab):
+        grab()  # 预热：创建缓冲区、后端内存
+        allocated = []
+        tracemalloc.start()
+        for _ in range(min(repeat, 20)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            grab()
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            grab()
+        return repeat / (time.perf_counter() - start), np.median(allocated)
+
+    legacy_fps, legacy_bytes = measure(lambda: legacy(region))
+    shared_fps, shared_bytes = measure(lambda: capture.grab(region, 'rgb'))
+    gray_fps, gray_bytes = measure(lambda: capture.grab(region, 'gray'))
+    capture.close()
+
+    width, height = region[2] - region[0], region[3] - region[1]
+    print(f"后端: {capture.backend.name}, 区域: {region} ({width}x{height}), 次数: {repeat}")
+    print(f"原有 ImageGrab:    {legacy_fps:8.1f} 帧/秒, 每帧分配 {legacy_bytes / 1024:10.1f} KB")
+    print(f"共享截图 RGB:      {shared_fps:8.1f} 帧/秒, 每帧分配 {shared_bytes / 1024:10.1f} KB")
+    print(f"共享截图 灰度:     {gray_fps:8.1f} 帧/秒, 每帧分配 {gray_bytes / 1024:10.1f} KB")
+    print(f"共享截图 {capture.frames} 帧的像素缓冲区分配: {capture.allocations} 次（只在每种格式第一次截图时分配）")
+
+
+def bench_fft(frames, template, kind='binary', counts=(1, 2, 4, 8, 16, 32), repeat=2):
+    """对比整帧匹配：每个模板单独 matchTemplate vs 共用一帧的截图频谱，找出模板数量的交叉点
+
+    模板取自按钮缩放系数生成的各尺度（数量超过尺度数时循环使用），每个模板都单独计算，与实际检测一致；
+    共享方式的耗时包含每帧一次的截图频谱计算。
+    """
+    if kind == 'binary':
+        screens = [preprocess_binary(frame) for frame in frames]
+        template = preprocess_binary(template)
+    else:
+        screens = frames
+    levels = [scaled for _, scaled in build_scaled_templates(template, BUTTON_SCALE_FACTORS)]
+    templates = [levels[i % len(levels)].copy() for i in range(max(counts))]
+
+    def direct(screen, count):
+        return [cv2.matchTemplate(screen, t, cv2.TM_CCOEFF_NORMED) for t in templates[:count]]
+
+    def shared(screen, count):
+        spectrum = ScreenSpectrum(screen)
+        return [spectrum.match(t) for t in templates[:count]]
+
+    # 结果一致性：与 matchTemplate 的最大差值
+    reference = direct(screens[0], len(levels))
+    candidate = shared(screens[0], len(levels))
+    max_diff = max(float(np.abs(a - b).max()) for a, b in zip(reference, candidate))
+
+    start = time.perf_counter()
+    for screen in screens:
+        ScreenSpectrum(screen)
+    spectrum_ms = (time.perf_counter() - start) / len(screens) * 1000
+
+    print(f"帧数: {len(screens)}, 画面: {screens[0].shape[1]}x{screens[0].shape[0]}, 图像: {kind}, "
+          f"模板尺寸: {', '.join(f'{t.shape[1]}x{t.shape[0]}' for t in levels)}")
+    print(f"与 matchTemplate 的最大差值: {max_diff:.2e}, 截图频谱: {spectrum_ms:.1f} ms/帧")
+    print(f"{'模板数':>6}{'逐个匹配ms':>14}{'共享频谱ms':>14}{'加速':>8}")
+    crossover = None
+    for count in counts:
+        timings = []
+        for func in (direct, shared):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for screen in screens:
+                    func(screen, count)
+            timings.append((time.perf_counter() - start) / (repeat * len(screens)) * 1000)
+        if crossover is None and timings[1] < timings[0]:
+            crossover = count
+        print(f"{count:>6}{timings[0]:>14.1f}{timings[1]:>14.1f}{timings[0] / timings[1]:>7.2f}x")
+    if crossover is None:
+        print(f"模板数不超过 {max(counts)} 时共享频谱都不比逐个 matchTemplate 快")
+    else:
+        print(f"交叉点: {crossover} 个模板起共享频谱更快")
+
+
+def bench_roi(frames, template, threshold=0.55, padding=0.5, repeat=20):
+    """对比按钮原位置检查（CookingBot.roi_present）：整帧二值化后匹配扩展区域 vs 只二值化搜索区域并先搜索原位置
+
+    按钮位置取自整帧检测结果；"消失"用同样大小但不含按钮的位置模拟。每次检查都创建新的帧，与点击后轮询一致。
+    """
+    cache = TemplatePyramidCache()
+    cache.build('btn', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+
+    def full_frame(rgb, box):
+        frame = FrameContext(rgb)
+        x0, y0, x1, y1 = frame.region(box, int(max(box[2], box[3]) * padding) + 1)
+        return len(match_pyramids(frame.binary[y0:y1, x0:x1], levels_for_box(cache.get('btn'), box), threshold)) > 0
+
+    def local(rgb, box):
+        frame = FrameContext(rgb)
+        levels = levels_for_box(cache.get('btn'), box)
+        for pad in (ROI_JITTER, int(max(box[2], box[3]) * padding) + 1):
+            if len(match_pyramids(frame.binary_region(frame.region(box, pad)), levels, threshold)) > 0:
+                return True
+        return False
+
+    cases = {'存在': [], '消失': []}
+    rng = np.random.default_rng(0)
+    for rgb in rgb_frames:
+        boxes = match_pyramids(preprocess_binary(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)), cache.get('btn'), threshold)
+        if len(boxes) == 0:
+            continue
+        box = boxes[0]
+        cases['存在'].append((rgb, box))
+        # 随机挑一个不含按钮的同尺寸位置
+        height, width = rgb.shape[:2]
+        for _ in range(100):
+            moved = box.copy()
+            moved[0] = rng.integers(0, width - int(box[2]))
+            moved[1] = rng.integers(0, height - int(box[3]))
+            if not full_frame(rgb, moved):
+                cases['消失'].append((rgb, moved))
+                break
+    if not cases['存在']:
+        print("画面中没有检测到按钮")
+        return
+
+    print(f"帧数: {len(rgb_frames)}, 画面: {rgb_frames[0].shape[1]}x{rgb_frames[0].shape[0]}, "
+          f"按钮: {int(cases['存在'][0][1][2])}x{int(cases['存在'][0][1][3])}, 扩展: {padding}, 原位置: ±{ROI_JITTER}px")
+    print(f"{'按钮':>6}{'整帧二值化ms':>16}{'局部二值化ms':>16}{'加速':>8}{'结果一致':>10}")
+    for name, items in cases.items():
+        if not items:
+            continue
+        agree = all(full_frame(rgb, box) == local(rgb, box) for rgb, box in items)
+        timings = []
+        for func in (full_frame, local):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for rgb, box in items:
+                    func(rgb, box)
+            timings.append((time.perf_counter() - start) / (repeat * len(items)) * 1000)
+        print(f"{name:>6}{timings[0]:>16.2f}{timings[1]:>16.2f}{timings[0] / timings[1]:>7.1f}x{str(agree):>10}")
+
+
+def bench_binary(frames, template, threshold=0.55, padding=0.5, crop=(640, 360), repeat=3):
+    """对比按钮二值图匹配：cv2.matchTemplate vs 位打包popcount匹配（--match-mode binary）
+
+    "区域"为检测到的按钮四周扩展 padding 倍边长的搜索区域（位置先验、点击确认的规模），
+    "整帧"为截图中心 crop 大小的区域（整帧位打包匹配太慢，只取一部分测量）。
+    位打包的耗时包含每个区域一次的打包和积分图；同时统计置1像素数上界排除的位置比例和提前放弃节省的行数。
+    """
+    cache = TemplatePyramidCache()
+    cache.build('btn', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    levels = cache.get('btn')
+    screens = [preprocess_binary(frame) for frame in frames]
+
+    cases = {'区域': [], '整帧': []}
+    for screen in screens:
+        height, width = screen.shape[:2]
+        for box in match_pyramids(screen, levels, threshold)[:3]:
+            pad = int(max(box[2], box[3]) * padding) + 1
+            x, y, w, h = [int(value) for value in box[:4]]
+            cases['区域'].append(screen[max(y - pad, 0):y + h + pad, max(x - pad, 0):x + w + pad])
+        cw, ch = min(crop[0], width), min(crop[1], height)
+        x0, y0 = (width - cw) // 2, (height - ch) // 2
+        cases['整帧'].append(screen[y0:y0 + ch, x0:x0 + cw])
+
+    def exhaustive(region):
+        return match_pyramids(region, levels, threshold)
+
+    def packed(region, stats=None):
+        bits_screen = BinaryScreen(region)
+        if stats is None:
+            return match_pyramids_bits(bits_screen, levels, threshold)
+        peaks = [extract_peaks(bits_screen.match(t, threshold, stats), threshold, t.shape[1], t.shape[0])
+                 for level in levels for _, t in level if t.shape[0] <= region.shape[0] and t.shape[1] <= region.shape[1]]
+        return nms_boxes(np.vstack(peaks), threshold, 0.4) if peaks else np.empty((0, 5))
+
+    print(f"帧数: {len(screens)}, 画面: {screens[0].shape[1]}x{screens[0].shape[0]}, "
+          f"模板尺寸: {', '.join(f'{t.shape[1]}x{t.shape[0]}' for _, t in levels[0])}, 阈值: {threshold}")
+    print(f"{'范围':>6}{'数量':>6}{'matchTemplate ms':>18}{'位打包ms':>12}{'加速':>8}{'结果一致':>10}"
+          f"{'上界排除':>10}{'提前放弃':>10}")
+    for name, regions in cases.items():
+        if not regions:
+            continue
+        stats = {}
+        agree = min(min(box_agreement(exhaustive(region), packed(region, stats)),
+                        box_agreement(packed(region), exhaustive(region))) for region in regions)
+        timings = []
+        for func in (exhaustive, packed):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for region in regions:
+                    func(region)
+            timings.append((time.perf_counter() - start) / (repeat * len(regions)) * 1000)
+        pruned = 1 - stats.get('candidates', 0) / max(stats.get('positions', 0), 1)
+        skipped = 1 - stats.get('rows', 0) / max(stats.get('template_rows', 0), 1)
+        print(f"{name:>6}{len(regions):>6}{timings[0]:>18.2f}{timings[1]:>12.2f}{timings[0] / timings[1]:>7.2f}x"
+              f"{agree:>10.0%}{pruned:>10.0%}{skipped:>10.0%}")
+
+
+def bench_click(frames, template, threshold=0.55, padding=0.5, repeat=20):
+    """对比点击确认（CookingBot.button_gone）：每次都在原位置附近匹配模板 vs 先比较按钮区域与点击前快照，差异不明确时才匹配
+
+    "按钮仍在"用亮度降低10%的同一画面模拟（按下效果），"按钮消失"把按钮区域换成画面中另一处的内容。
+    """
+    cache = TemplatePyramidCache()
+    cache.build('btn', [preprocess_binary(template)], BUTTON_SCALE_FACTORS)
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+
+    def present(rgb, box):
+        frame = FrameContext(rgb)
+        levels = levels_for_box(cache.get('btn'), box)
+        for pad in (ROI_JITTER, int(max(box[2], box[3]) * padding) + 1):
+            if len(match_pyramids(frame.binary_region(frame.region(box, pad)), levels, threshold)) > 0:
+                return True
+        return False
+
+    def by_template(rgb, box, snapshot):
+        return not present(rgb, box)
+
+    escalations = []
+
+    def by_diff(rgb, box, snapshot):
+        frame = FrameContext(rgb)
+        diff = roi_difference(snapshot, frame.crop('gray', frame.region(box)))
+        if diff is not None and (diff <= CLICK_DIFF_SAME or diff >= CLICK_DIFF_GONE):
+            return diff >= CLICK_DIFF_GONE
+        escalations.append(diff)
+        return not present(rgb, box)
+
+    cases = {'仍在': [], '消失': []}
+    rng = np.random.default_rng(0)
+    for rgb in rgb_frames:
+        boxes = match_pyramids(preprocess_binary(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)), cache.get('btn'), threshold)
+        if len(boxes) == 0:
+            continue
+        box = boxes[0]
+        frame = FrameContext(rgb)
+        snapshot = frame.crop('gray', frame.region(box)).copy()
+        cases['仍在'].append((cv2.convertScaleAbs(rgb, alpha=0.9), box, snapshot))
+        x, y, w, h = [int(value) for value in box[:4]]
+        height, width = rgb.shape[:2]
+        for _ in range(100):
+            sx, sy = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+            gone = rgb.copy()
+            gone[y:y + h, x:x + w] = rgb[sy:sy + h, sx:sx + w]
+            if not present(gone, box):
+                cases['消失'].append((gone, box, snapshot))
+                break
+    if not cases['仍在']:
+        print("画面中没有检测到按钮")
+        return
+
+    print(f"帧数: {len(rgb_frames)}, 画面: {rgb_frames[0].shape[1]}x{rgb_frames[0].shape[0]}, "
+          f"按钮: {int(cases['仍在'][0][1][2])}x{int(cases['仍在'][0][1][3])}, "
+          f"差异阈值: 仍在<={CLICK_DIFF_SAME}, 消失>={CLICK_DIFF_GONE}")
+    print(f"{'按钮':>6}{'模板匹配ms':>14}{'区域差异ms':>14}{'加速':>8}{'结果一致':>10}{'转匹配':>8}")
+    for name, items in cases.items():
+        if not items:
+            continue
+        escalations.clear()
+        agree = all([by_template(*item) == by_diff(*item) for item in items])
+        escalated = len(escalations)
+        timings = []
+        for func in (by_template, by_diff):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for item in items:
+                    func(*item)
+            timings.append((time.perf_counter() - start) / (repeat * len(items)) * 1000)
+        print(f"{name:>6}{timings[0]:>14.3f}{timings[1]:>14.3f}{timings[0] / timings[1]:>7.1f}x{str(agree):>10}"
+              f"{escalated:>8}")
+
+
+def bench_foods(food_name='sala', repeat=3):
+    """对比食物识别：逐个食物模板匹配 vs 食物索引单次扫描（合成的食物面板）"""
+    import tempfile
+    from food_index import FoodIndex, FOOD_CARD_THRESHOLD
+    from replay import SyntheticKitchen, write_synthetic_buttons
+
+    buttons = write_synthetic_buttons(tempfile.mkdtemp(prefix='bench_btns_'))
+    game = SyntheticKitchen(buttons, food_name)
+    game.panel = 0  # 打开食物面板
+    frame = FrameContext(game.capture()[0])
+    screen = frame.bgr
+
+    index = FoodIndex(FOODS_DIR)
+    cache = TemplatePyramidCache()
+    cache.build('food_card', [index.prototype], FOOD_SCALE_FACTORS)
+    icons = sorted(f for f in os.listdir(FOODS_DIR) if f.endswith('.png'))
+    for name in index.foods:
+        templates = [imread_unicode(os.path.join(FOODS_DIR, f)) for f in icons if f in (f'{name}.png', f'{name}_1.png')]
+        cache.build(name, templates, FOOD_SCALE_FACTORS)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        single = match_pyramids(screen, cache.get(food_name), 0.8, per_template_nms=True)
+    single_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found_all = [name for name in index.foods if len(match_pyramids(screen, cache.get(name), 0.8))]
+    all_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hits = index.identify(screen, match_pyramids(screen, cache.get('food_card'), FOOD_CARD_THRESHOLD))
+    index_time = (time.perf_counter() - start) / repeat
+
+    print(f"食物种类: {len(index.foods)}, 面板上的卡片: {len(game.food_icons)}, 尺度数: {len(FOOD_SCALE_FACTORS)}")
+    print(f"单个食物模板匹配: {single_time * 1000:8.1f} ms, 找到 {len(single)} 个")
+    print(f"逐个匹配全部食物: {all_time * 1000:8.1f} ms, 识别 {len(found_all)} 种")
+    print(f"食物索引单次扫描: {index_time * 1000:8.1f} ms, 识别 {len(hits)} 张卡片: "
+          + ', '.join(f"{hit.name}{hit.cell}" for hit in sorted(hits, key=lambda hit: hit.cell)))
+
+
+def bench_templates(repeat=5):
+    """对比启动时的模板加载：逐个解码PNG并生成各尺度 vs 从内存映射的模板编译缓存读取
+
+    模板为 btns 和 foods 目录下的全部图片（按钮按二值图、食物按彩色图，加上食物索引使用的原尺寸图标）；
+    缓存写在临时目录，不影响 configs/template_cache。同时测量修改一个文件后只重新编译该文件的耗时。
+    """
+    import shutil
+    import tempfile
+    from food_index import FoodIndex
+    from template_store import TemplateStore
+
+    jobs = []
+    for folder, kind, scales in ((BTNS_DIR, 'binary', BUTTON_SCALE_FACTORS), (FOODS_DIR, 'bgr', FOOD_SCALE_FACTORS)):
+        if os.path.isdir(folder):
+            jobs.extend((os.path.join(folder, f), kind, scales) for f in sorted(os.listdir(folder))
+                        if f.lower().endswith(IMAGE_EXTS))
+
+    def load(store):
+        pyramids = [store.pyramid(path, kind, scales) for path, kind, scales in jobs]
+        FoodIndex(FOODS_DIR, imread=store.image)
+        return pyramids
+
+    directory = tempfile.mkdtemp(prefix='bench_template_cache_')
+    try:
+        store = TemplateStore(directory, root=SCRIPT_DIR)
+        load(store)
+        store.save()
+
+        timings = []
+        for make_store in (lambda: TemplateStore(), lambda: TemplateStore(directory, root=SCRIPT_DIR)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                pyramids = load(make_store())
+            timings.append((time.perf_counter() - start) / repeat * 1000)
+        levels = sum(len(levels) for levels in pyramids if levels)
+
+        # 修改一个文件（内容变化）后的增量编译
+        work = tempfile.mkdtemp(prefix='bench_template_src_')
+        path, kind, scales = jobs[0]
+        copy = shutil.copy(path, work)
+        store = TemplateStore(directory, root=SCRIPT_DIR)
+        store.pyramid(copy, kind, scales)
+        store.save()
+        image = imread_unicode(copy)
+        image[0, 0] = 255 - image[0, 0]
+        cv2.imencode(os.path.splitext(copy)[1], image)[1].tofile(copy)
+        start = time.perf_counter()
+        store = TemplateStore(directory, root=SCRIPT_DIR)
+        load(store)
+        store.pyramid(copy, kind, scales)
+        incremental = (time.perf_counter() - start) * 1000
+        shutil.rmtree(work, ignore_errors=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"模板文件: {len(jobs)}, 各尺度模板: {levels}")
+    print(f"逐个解码编译:   {timings[0]:8.1f} ms")
+    print(f"内存映射缓存:   {timings[1]:8.1f} ms  ({timings[0] / timings[1]:.1f}x)")
+    print(f"修改一个文件后: {incremental:8.1f} ms  (重新编译 {store.compiles} 个)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='自动烹饪性能基准')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    peaks = sub.add_parser('peaks', help='峰值提取与NMS：逐像素循环 vs 向量化')
+    peaks.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    peaks.add_argument('--template', type=str, default='cook_menu', help='模板名称（btns或foods下的文件名）')
+    peaks.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    peaks.add_argument('--limit', type=int, default=20, help='最多使用的帧数')
+
+    frame = sub.add_parser('frame', help='预处理：每次检测单独处理 vs 同一帧共享')
+    frame.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    frame.add_argument('--template', type=str, default='cook_menu', help='合成画面时粘贴的模板')
+    frame.add_argument('--detections', type=int, default=3, help='每个tick的检测次数')
+    frame.add_argument('--limit', type=int, default=20, help='最多使用的帧数')
+
+    coarse = sub.add_parser('coarse', help='整帧匹配：全尺度搜索 vs 由粗到细')
+    coarse.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    coarse.add_argument('--template', type=str, default='cook_menu', help='模板名称（btns或foods下的文件名）')
+    coarse.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    coarse.add_argument('--factor', type=float, default=0.5, help='粗匹配缩放系数')
+    coarse.add_argument('--limit', type=int, default=20, help='最多使用的帧数')
+
+    parallel = sub.add_parser('parallel', help='多尺度匹配：单线程 vs 线程池并行')
+    parallel.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    parallel.add_argument('--template', type=str, default='cook_menu', help='模板名称（btns或foods下的文件名）')
+    parallel.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    parallel.add_argument('--workers', type=int, default=None, help='线程数，默认使用CPU核心数')
+    parallel.add_argument('--limit', type=int, default=20, help='最多使用的帧数')
+
+    overlay = sub.add_parser('overlay', help='覆盖层：每次检测同步重绘 vs 限帧率重绘')
+    overlay.add_argument('--ticks', type=int, default=200, help='模拟的主循环tick数')
+    overlay.add_argument('--detections', type=int, default=3, help='每个tick的检测次数')
+    overlay.add_argument('--boxes', type=int, default=4, help='每次检测的框数')
+    overlay.add_argument('--fps', type=int, default=15, help='覆盖层限定帧率')
+
+    adb = sub.add_parser('adb', help='截图延迟：ADB screencap vs 桌面截图')
+    adb.add_argument('--frames', type=str, default=None, help='替身adb server返回的录制截图，不指定则使用合成画面')
+    adb.add_argument('--template', type=str, default='cook_menu', help='合成画面时粘贴的模板')
+    adb.add_argument('--serial', type=str, default=None, help='真实设备序列号，不指定则使用本地替身adb server')
+    adb.add_argument('--port', type=int, default=5037, help='adb server 端口')
+    adb.add_argument('--repeat', type=int, default=20, help='每项测量次数')
+    adb.add_argument('--limit', type=int, default=5, help='最多使用的帧数')
+
+    foods = sub.add_parser('foods', help='食物识别：逐个食物模板匹配 vs 食物索引单次扫描')
+    foods.add_argument('--food', type=str, default='sala', help='面板左上角放置的目标食物')
+    foods.add_argument('--repeat', type=int, default=3, help='重复次数')
+
+    templates = sub.add_parser('templates', help='启动加载模板：逐个解码编译 vs 内存映射的模板编译缓存')
+    templates.add_argument('--repeat', type=int, default=5, help='重复次数')
+
+    latency = sub.add_parser('latency', help='耗时统计：不计时 vs 分段计时的检测耗时')
+    latency.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    latency.add_argument('--template', type=str, default='cook_menu', help='模板名称（btns或foods下的文件名）')
+    latency.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    latency.add_argument('--limit', type=int, default=20, help='最多使用的帧数')
+
+    capture = sub.add_parser('capture', help='截图：ImageGrab + np.array vs 共享截图模块的复用缓冲区')
+    capture.add_argument('--frames', type=str, default=None, help='file后端回放的录制截图，不指定则使用合成画面')
+    capture.add_argument('--template', type=str, default='cook_menu', help='合成画面时粘贴的模板')
+    capture.add_argument('--backend', type=str, default='file', help='截图后端: file, auto, gdi, x11, pil')
+    capture.add_argument('--region', type=str, default=None, help='截图区域 left,top,right,bottom，默认整个画面')
+    capture.add_argument('--repeat', type=int, default=200, help='每项测量次数')
+    capture.add_argument('--limit', type=int, default=5, help='最多使用的帧数')
+
+    fft = sub.add_parser('fft', help='整帧匹配：逐个模板 matchTemplate vs 共用截图频谱，模板数量的交叉点')
+    fft.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    fft.add_argument('--template', type=str, default='cook_menu', help='模板名称（btns或foods下的文件名）')
+    fft.add_argument('--kind', type=str, default='binary', choices=['binary', 'bgr'], help='匹配使用的图像类型')
+    fft.add_argument('--counts', type=str, default='1,2,4,8,16,32', help='测量的模板数量，逗号分隔')
+    fft.add_argument('--limit', type=int, default=2, help='最多使用的帧数')
+
+    roi = sub.add_parser('roi', help='按钮原位置检查：整帧二值化 vs 只二值化搜索区域')
+    roi.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    roi.add_argument('--template', type=str, default='finish', help='模板名称（btns或foods下的文件名）')
+    roi.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    roi.add_argument('--padding', type=float, default=0.5, help='搜索区域扩展，以按钮最大边长为单位')
+    roi.add_argument('--repeat', type=int, default=20, help='每项测量次数')
+    roi.add_argument('--limit', type=int, default=5, help='最多使用的帧数')
+
+    click = sub.add_parser('click', help='点击确认：原位置模板匹配 vs 按钮区域与点击前快照的归一化差异')
+    click.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    click.add_argument('--template', type=str, default='finish', help='模板名称（btns或foods下的文件名）')
+    click.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    click.add_argument('--padding', type=float, default=0.5, help='搜索区域扩展，以按钮最大边长为单位')
+    click.add_argument('--repeat', type=int, default=20, help='每项测量次数')
+    click.add_argument('--limit', type=int, default=5, help='最多使用的帧数')
+
+    binary = sub.add_parser('binary', help='按钮二值图匹配：matchTemplate vs 位打包popcount匹配')
+    binary.add_argument('--frames', type=str, default=None, help='录制截图目录，不指定则使用合成画面')
+    binary.add_argument('--template', type=str, default='finish', help='模板名称（btns或foods下的文件名）')
+    binary.add_argument('--threshold', type=float, default=0.55, help='匹配阈值')
+    binary.add_argument('--padding', type=float, default=0.5, help='区域扩展，以按钮最大边长为单位')
+    binary.add_argument('--crop', type=str, default='640,360', help='整帧测量使用的中心区域 宽,高')
+    binary.add_argument('--repeat', type=int, default=3, help='每项测量次数')
+    binary.add_argument('--limit', type=int, default=2, help='最多使用的帧数')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'foods':
+        bench_foods(food_name=args.food, repeat=args.repeat)
+        return 0
+    if args.command == 'templates':
+        bench_templates(repeat=args.repeat)
+        return 0
+    if args.command == 'overlay':
+        # 覆盖层基准不需要截图和模板
+        bench_overlay(ticks=args.ticks, detections=args.detections, boxes=args.boxes, fps=args.fps)
+        return 0
+
+    template = load_template(args.template)
+    if template is None:
+        # btns目录未随仓库分发时，退回使用任意一个食物图标
+        fallback = sorted(f for f in os.listdir(FOODS_DIR) if f.endswith('.png'))[0]
+        print(f"未找到模板 {args.template}，改用 {fallback}")
+        template = imread_unicode(os.path.join(FOODS_DIR, fallback))
+
+    if args.frames:
+        frames = load_frames(args.frames, args.limit)
+    else:
+        frames = synthesize_frames(template, count=min(args.limit, 5))
+    if not frames:
+        print("没有可用的画面")
+        return 1
+
+    if args.command == 'peaks':
+        bench_peaks(frames, template, threshold=args.threshold)
+    elif args.command == 'frame':
+        bench_frame(frames, detections=args.detections)
+    elif args.command == 'coarse':
+        bench_coarse(frames, template, threshold=args.threshold, factor=args.factor)
+    elif args.command == 'parallel':
+        bench_parallel(frames, template, threshold=args.threshold, workers=args.workers)
+    elif args.command == 'adb':
+        bench_adb(frames, serial=args.serial, port=args.port, repeat=args.repeat)
+    elif args.command == 'latency':
+        bench_latency(frames, template, threshold=args.threshold)
+    elif args.command == 'fft':
+        bench_fft(frames, template, kind=args.kind, counts=[int(value) for value in args.counts.split(',')])
+    elif args.command == 'roi':
+        bench_roi(frames, template, threshold=args.threshold, padding=args.padding, repeat=args.repeat)
+    elif args.command == 'click':
+        bench_click(frames, template, threshold=args.threshold, padding=args.padding, repeat=args.repeat)
+    elif args.command == 'binary':
+        bench_binary(frames, template, threshold=args.threshold, padding=args.padding,
+                     crop=tuple(int(value) for value in args.crop.split(',')), repeat=args.repeat)
+    elif args.command == 'capture':
+        region = tuple(int(value) for value in args.region.split(',')) if args.region else None
+        bench_capture(frames, backend=args.backend, region=region, repeat=args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
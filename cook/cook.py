@@ -16,6 +16,21 @@ import win32con
 import win32com.client
 import tkinter as tk
 from PIL import Image, ImageTk
+# 共享截图模块位于上级目录的 common 中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.capture import default_capture
+from overlay import create_overlay
+from food_index import FoodIndex, FOOD_CARD_THRESHOLD
+from recipe_queue import RecipeQueue, StoveScheduler, CookTimes
+from latency import LatencyRecorder, stage
+from flight_recorder import FlightRecorder, FLIGHT_FRAMES
+from template_store import TemplateStore, TemplateWatcher
+from template_matcher import (
+    FrameContext, TemplatePyramidCache, BUTTON_SCALE_FACTORS, COOK_SCALE_FACTORS, FOOD_SCALE_FACTORS,
+    SpatialPriors, ScaleCalibration, FrameChangeGate, preprocess_binary, filter_levels, levels_for_box, ROI_JITTER,
+    CLICK_DIFF_SAME, CLICK_DIFF_GONE, roi_difference,
+    match_pyramids_coarse_to_fine, match_pyramids, match_pyramids_spectrum, match_pyramids_bits
+)
 
 # 配置日志
 logging.basicConfig(
@@ -38,80 +53,47 @@ class CookingState(Enum):
     DETECT_FINISH = auto()  # 检测Finish按钮
 
 
-class OverlayWindow:
-    def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("Overlay")
-        self.root.attributes('-topmost', True)  # 置顶
-        self.root.attributes('-alpha', 0.8)  # 设置透明度
-        self.root.attributes('-transparentcolor', 'white')  # 设置透明色
-        self.root.overrideredirect(True)  # 无边框
-        
-        # 获取屏幕尺寸
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        
-        # 设置窗口大小和位置
-        self.root.geometry(f"{screen_width}x{screen_height}+0+0")
-        
-        # 创建画布
-        self.canvas = tk.Canvas(self.root, width=screen_width, height=screen_height, 
-                              highlightthickness=0, bg='white')
-        self.canvas.pack(fill=tk.BOTH, expand=True)
-        
-        self.matches = []
-        self.button_name = None
-        
-        # 设置定时器用于更新显示
-        self.update_interval = 8  # 约120fps
-        self.root.after(self.update_interval, self.update)
-        
-    def update_overlay(self, matches, button_name=None):
-        """更新覆盖层显示"""
-        self.matches = matches
-        self.button_name = button_name
-        
-    def update(self):
-        """更新画布显示"""
-        self.canvas.delete("all")
-        
-        for match in self.matches:
-            x, y, w, h, conf = match
-            # 绘制绿色矩形框
-            self.canvas.create_rectangle(x, y, x + w, y + h, 
-                                      outline='green', width=2)
-            
-            # 显示按钮名称和置信度
-            display_text = f'{conf:.2f}'
-            if self.button_name:
-                display_text = f'{self.button_name}: {display_text}'
-            
-            self.canvas.create_text(x, y - 3, text=display_text,
-                                  fill='green', anchor='sw',
-                                  font=('Arial', 10, 'bold'))
-        
-        self.root.after(self.update_interval, self.update)
-        
-    def show(self):
-        """显示窗口"""
-        self.root.deiconify()
-        
-    def close(self):
-        """关闭窗口"""
-        self.root.destroy()
-        
-    def run(self):
-        """运行主循环"""
-        self.root.mainloop()
-
-
 class CookingBot:
-    def __init__(self, food_name="food", loop_count=1):
+    def __init__(self, food_name="food", loop_count=1, match_mode='exhaustive', match_workers=None,
+                 change_sensitivity=6.0,
+                 capture_source=None, show_overlay=True, food_recognizer='index', recipes=None,
+                 latency_report=None, flight_frames=FLIGHT_FRAMES, template_cache=True):
         """
         初始化烹饪机器人
         :param food_name: 食物模板的名称（不包含.png后缀）
         :param loop_count: 循环执行次数，-1表示无限循环
+        :param match_mode: 整帧匹配模式，'exhaustive'、'coarse'（由粗到细）、'fft'（整帧频谱共享）或 'binary'（位打包二值匹配）
+        :param match_workers: 模板匹配线程数，None表示使用CPU核心数
+        :param change_sensitivity: 画面变化检测阈值（分块平均灰度差），0表示每次都重新匹配
+        :param capture_source: 截图来源，无参数可调用对象，返回 (RGB截图, 截图左上角的屏幕坐标)；
+                               None表示截取游戏窗口（离线回放等场景使用）
+        :param show_overlay: 是否显示检测框覆盖层，无人值守运行时可关闭以节省CPU
+        :param food_recognizer: 食物识别方式，'index' 单次扫描识别面板上的全部食物，'template' 只匹配当前食物的模板
+        :param recipes: 菜谱队列，[(食物名称, 目标数量)] 或 "葡萄酱:30,提拉米苏:20"；
+                        None表示只制作 food_name 且不限数量
+        :param latency_report: 耗时统计报告文件（.json 或 .csv），运行中定期写入，None表示不写文件
+        :param flight_frames: 飞行记录在内存中保留的最近帧数，超时、出错或按热键时写入debug目录，0表示关闭
+        :param template_cache: 是否使用磁盘上的模板编译缓存（configs/template_cache），关闭时每次启动都重新编译模板
         """
+        # 菜谱队列：空闲灶台按队列顺序安排菜品，全部完成后自动停止
+        self.recipe_queue = RecipeQueue(recipes if recipes else [(food_name, None)])
+        if recipes:
+            food_name = self.recipe_queue.next_food() or food_name
+        # 每种食物的烹饪时间保存在配置文件中，灶台都在烹饪时只在预计完成时间附近检测finish按钮
+        self.scheduler = StoveScheduler(self.recipe_queue, cook_times=CookTimes(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "configs", "cook_times.json")
+        ))
+        self.finish_idle_slice = 1.0  # 等待灶台完成时每次最多空闲的秒数，保持热键和覆盖层响应
+
+        # 耗时统计：各状态处理、各模板检测的分段耗时和点击到界面确认的延迟
+        self.latency = LatencyRecorder(latency_report)
+        self.last_click_at = None  # 最近一次点击完成的时间（perf_counter）
+        # 飞行记录：最近的截图、检测结果、点击和状态切换只保存在内存中，需要时由后台线程写入debug目录
+        self.flight_recorder = FlightRecorder('debug', capacity=flight_frames)
+        self.pending_stove = None  # 已点击菜单按钮、等待start的灶台序号
+        # 菜谱模式下finish按钮一出现就收取，让灶台尽快开始下一道菜；否则等3个灶台都完成后一起收取
+        self.finish_batch = 1 if recipes else 3
+
         # 创建Tkinter实例
         self.app = tk.Tk()
         self.app.withdraw()  # 隐藏主窗口
@@ -124,7 +106,9 @@ class CookingBot:
         self.menu_clicks = 0
         self.finish_clicks = 0
         self.food_clicked = False
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # 多尺度、多模板的 matchTemplate 分发到线程池并行执行，默认使用全部CPU核心
+        self.match_workers = match_workers or os.cpu_count() or 4
+        self.executor = ThreadPoolExecutor(max_workers=self.match_workers)
         self.running = True
         self.food_name = food_name
         self.loop_count = loop_count
@@ -151,13 +135,14 @@ class CookingBot:
             'back': ['back.png'],
         }
 
-        # 创建并显示遮罩窗口
-        self.overlay = OverlayWindow()
+        # 创建并显示遮罩窗口，按限定帧率在主循环中重绘，检测时只提交最新结果
+        self.overlay = create_overlay(show_overlay)
         self.overlay.show()
         
         keyboard.add_hotkey('ctrl+q', self.stop)
+        keyboard.add_hotkey('ctrl+shift+d', lambda: self.flight_recorder.dump('hotkey', force=True))
         logger.info(f"当前选择的食物: {food_name}")
-        logger.info("按 Ctrl+Q 可以退出程序")
+        logger.info("按 Ctrl+Q 可以退出程序，按 Ctrl+Shift+D 保存最近的画面和检测结果")
 
         # 添加视角旋转相关配置
         self.screen_width = pyautogui.size().width
@@ -183,15 +168,52 @@ class CookingBot:
         self.menu_buttons_finished = []  # 已完成(finish已点击)的菜单按钮索引列表
         self.all_finish_clicked = False  # 标记是否所有finish按钮都已点击
 
-        # 优化模板匹配参数
-        self.scale_factors = np.arange(0.5, 1.5, 0.1)
+        # 优化模板匹配参数：各模板使用的缩放系数，未列出的模板使用默认值
+        self.scale_factors = {
+            'default': BUTTON_SCALE_FACTORS,
+            'cook': COOK_SCALE_FACTORS,
+            'food': FOOD_SCALE_FACTORS,
+            'food_card': FOOD_SCALE_FACTORS,
+        }
+        # 模板多尺度缓存，在加载模板时生成
+        self.pyramid_cache = TemplatePyramidCache()
+        # 模板编译缓存：预处理后的模板和各尺度版本保存在磁盘上，启动时内存映射读取；
+        # 模板目录的监视器在 run 中加载模板后创建，运行中只重新编译并替换发生变化的模板
+        self.template_store = TemplateStore(
+            os.path.join(self.script_dir, "configs", "template_cache") if template_cache else None,
+            root=self.script_dir
+        )
+        self.template_watcher = None
+        # 按钮位置先验：先在上次命中位置附近搜索，未命中再整帧搜索
+        self.spatial_priors = SpatialPriors(expand=1.0)
+        # 整帧匹配模式：'exhaustive' 原图全尺度搜索，'coarse' 先缩小定位再在原图细化，
+        # 'fft' 每帧只计算一次截图频谱和窗口统计，所有模板、所有尺度共用（结果与 'exhaustive' 相同），
+        # 'binary' 按钮二值图位打包后用popcount匹配并提前放弃（结果与 'exhaustive' 相同，食物仍逐个匹配）
+        self.match_mode = match_mode
+        self.coarse_factor = 0.5
+        # UI缩放校准：按客户区尺寸记录每个模板的最佳缩放系数，之后只搜索其附近的窄带
+        self.scale_calibration = ScaleCalibration(
+            os.path.join(self.script_dir, "configs", "scale_calibration.json")
+        )
+        # 画面变化检测：画面静止时直接复用上次的检测结果
+        self.frame_gate = FrameChangeGate(sensitivity=change_sensitivity)
+
+        # 截图来源，None表示截取游戏窗口
+        self.capture_source = capture_source
+
+        # 食物识别方式；食物索引在 run 中与模板一起加载
+        self.food_recognizer = food_recognizer
+        self.food_index = None
+        self.visible_foods = []  # 最近一次识别到的面板食物 [FoodHit]，坐标为屏幕坐标
 
         # 优化截图缓存
-        self.last_screenshot = None
-        self.last_screenshot_time = 0
+        self.current_frame = None  # 当前帧预处理上下文，每个状态tick或点击后失效
+        self.recorded_frame = None  # 最近交给飞行记录的帧
 
         self.start_clicks = 0  # 添加开始按钮点击计数器
         self.cook_clicks = 0  # 添加cook按钮点击计数器
+        # 点击确认的判定方式统计：按钮区域差异直接判定 / 差异不明确时模板匹配
+        self.click_checks = {'diff': 0, 'match': 0}
 
     def find_and_activate_game_window(self):
         """查找并激活心动小镇窗口"""
@@ -302,34 +324,16 @@ class CookingBot:
             return False
     
     def update_window_rect(self):
-        """更新窗口位置和大小信息"""
+        """更新窗口客户区在屏幕上的位置和大小信息"""
         if self.game_hwnd:
             try:
-                # 获取窗口客户区矩形
+                # 获取窗口客户区矩形（相对客户区左上角）
                 client_rect = win32gui.GetClientRect(self.game_hwnd)
-                # 获取窗口屏幕坐标
-                left, top, right, bottom = win32gui.GetWindowRect(self.game_hwnd)
-                
-                # 计算窗口边框尺寸
-                border_left = 0
-                border_top = 0
-                
-                # 如果不是全屏模式，需要计算标题栏和边框的偏移
-                if right - left > 0 and bottom - top > 0 and client_rect[2] > 0 and client_rect[3] > 0:
-                    # 计算左右边框宽度
-                    total_border_width = (right - left) - client_rect[2]
-                    border_left = total_border_width // 2
-                    
-                    # 计算标题栏和上边框高度
-                    total_border_height = (bottom - top) - client_rect[3]
-                    border_top = total_border_height - border_left  # 假设下边框与左右边框等宽
-                
-                # 计算客户区在屏幕上的位置
-                client_left = left + border_left
-                client_top = top + border_top
+                # 将客户区左上角换算为屏幕坐标，标题栏和边框自然被排除
+                client_left, client_top = win32gui.ClientToScreen(self.game_hwnd, (0, 0))
                 client_right = client_left + client_rect[2]
                 client_bottom = client_top + client_rect[3]
-                
+
                 # 保存窗口客户区位置
                 self.window_rect = (client_left, client_top, client_right, client_bottom)
                 return True
@@ -338,146 +342,233 @@ class CookingBot:
                 self.window_rect = None
                 return False
         return False
-    
-    def capture_window_screenshot(self):
-        """截取全屏截图"""
+
+    def get_capture_region(self):
+        """获取截图区域 (left, top, right, bottom)，没有可用的游戏窗口时返回None表示全屏"""
+        if not self.window_rect:
+            return None
+        left, top, right, bottom = self.window_rect
+        if right - left <= 0 or bottom - top <= 0:  # 窗口最小化时客户区为空
+            return None
+        return self.window_rect
+
+    def capture_window_screenshot(self, region=None):
+        """截取游戏窗口客户区截图
+
+        Args:
+            region: 截图区域 (left, top, right, bottom)，为None时截取全屏
+
+        Returns:
+            np.ndarray: RGB截图（复用缓冲区，下下次截图时被覆盖），失败返回None
+        """
         try:
-            # 直接使用pyautogui截取全屏
-            screenshot = pyautogui.screenshot()
-            return np.array(screenshot)
+            # 截图写入复用的缓冲区，帧内检测只读取，不需要复制
+            return default_capture().grab(region, 'rgb')
         except Exception as e:
-            logger.error(f"全屏截图失败: {e}")
-            return np.array(pyautogui.screenshot())
+            logger.error(f"截图失败: {e}")
+            return None
+
+    def get_frame(self):
+        """获取当前帧的预处理上下文，同一帧内的所有检测共享截图和预处理结果
+
+        只截取游戏窗口客户区，帧内检测得到的坐标通过 frame.to_screen 换算回屏幕坐标。
+        """
+        if self.current_frame is not None:
+            return self.current_frame
+        with stage('capture'):
+            if self.capture_source is not None:
+                screen, offset = self.capture_source()
+                self.current_frame = FrameContext(screen, offset=offset)
+            else:
+                region = self.get_capture_region()
+                screen = self.capture_window_screenshot(region)
+                if screen is None and region:
+                    # 窗口截图失败时退回全屏截图
+                    region = None
+                    screen = self.capture_window_screenshot()
+                offset = region[:2] if region else (0, 0)
+                self.current_frame = FrameContext(screen, offset=offset)
+        return self.current_frame
+
+    def record_frame(self):
+        """把当前帧交给飞行记录，同一帧只记录一次
+
+        只在检测按钮、食物时调用，点击后 wait_until 轮询的截图不记录，飞行记录不增加轮询的开销。
+        """
+        frame = self.current_frame
+        if frame is not None and frame is not self.recorded_frame:
+            self.recorded_frame = frame
+            self.flight_recorder.record_frame(frame.rgb, frame.offset, self.state.name)
+
+    def invalidate_frame(self):
+        """使当前帧失效，下次检测重新截图（新的状态tick开始或点击之后调用）"""
+        self.current_frame = None
 
     def get_screenshot(self):
-        """获取屏幕截图，带缓存"""
-        current_time = time.time()
-        if (self.last_screenshot is None or
-                current_time - self.last_screenshot_time >= 0.1):  # 直接使用固定值0.1
-            # 使用窗口截图代替全屏截图
-            self.last_screenshot = self.capture_window_screenshot()
-            self.last_screenshot_time = current_time
-        return self.last_screenshot
+        """获取当前帧的屏幕截图（RGB）"""
+        return self.get_frame().rgb
 
     def load_food_templates(self):
-        """加载食物彩色模板"""
+        """加载食物彩色模板的各尺度版本（优先使用模板编译缓存）
+
+        Returns:
+            list: 各食物模板的金字塔
+        """
         food_templates = []
         for filename in self.template_config['food']:
             path = os.path.join(self.foods_dir, filename)
-            template = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            levels = self.template_store.pyramid(path, 'bgr', self.get_scale_factors('food'))
 
-            if template is None:
+            if not levels:
                 logger.error(f"无法加载食物模板: {path}")
                 continue
-            food_templates.append(template)
+            food_templates.append(levels)
             logger.debug(f"已加载食物模板: {path}")
+
+        # 只替换食物模板的多尺度缓存
+        self.pyramid_cache.put('food', food_templates)
+        self.template_store.save()
         return food_templates
 
-    def load_templates(self):
-        """加载并预处理普通按钮模板"""
+    def load_templates(self, keys=None):
+        """加载普通按钮模板预处理后的各尺度版本（优先使用模板编译缓存）
+
+        Args:
+            keys: 只加载这些模板键，None表示全部；重新加载时某个键的模板全部读取失败（如文件正在写入）则保留原有模板
+
+        Returns:
+            dict: {模板键: 各模板的金字塔}
+        """
         templates = {}
 
         for key, template_files in self.template_config.items():
-            if key == 'food':  # 跳过食物模板，它们会被单独处理
+            if key == 'food' or (keys is not None and key not in keys):  # 跳过食物模板，它们会被单独处理
                 continue
 
             templates[key] = []
             for filename in template_files:
                 path = os.path.join(self.btns_dir, filename)
-                template = cv2.imread(path)
-                if template is None:
+                levels = self.template_store.pyramid(path, 'binary', self.get_scale_factors(key))
+                if not levels:
                     logger.error(f"无法加载模板: {path}")
                     continue
+                templates[key].append(levels)
+                logger.debug(f"已加载模板: {path}")
 
-                processed = self.preprocess_image(template)
-                if processed is not None:
-                    templates[key].append(processed)
-                    logger.debug(f"已加载模板: {path}")
+            # 加载时一次性生成（或从缓存映射）各尺度模板，检测时直接复用
+            if templates[key] or keys is None:
+                self.pyramid_cache.put(key, templates[key])
 
+        self.template_store.save()
         return templates
 
+    def load_food_index(self):
+        """为 foods 目录下的全部图标建立索引，并生成通用卡片原型的多尺度缓存"""
+        food_index = FoodIndex(self.foods_dir, imread=self.template_store.image)
+        if food_index.prototype is not None and 'food_card' not in self.pyramid_cache:
+            self.pyramid_cache.build('food_card', [food_index.prototype], self.get_scale_factors('food_card'))
+        self.template_store.save()
+        return food_index
+
+    def reload_changed_templates(self):
+        """模板目录中有文件新增、修改或删除时，只重新编译并替换受影响的模板（在主循环中每个tick调用）"""
+        if self.template_watcher is None:
+            return
+        changed = {os.path.normcase(os.path.abspath(path)) for path in self.template_watcher.poll()}
+        if not changed:
+            return
+
+        def affected(directory, filenames):
+            return any(os.path.normcase(os.path.abspath(os.path.join(directory, name))) in changed
+                       for name in filenames)
+
+        keys = [key for key, filenames in self.template_config.items()
+                if key != 'food' and affected(self.btns_dir, filenames)]
+        if keys:
+            self.load_templates(keys)
+        if affected(self.foods_dir, self.template_config['food']):
+            self.load_food_templates()
+            keys.append('food')
+        foods_dir = os.path.normcase(os.path.abspath(self.foods_dir))
+        if self.food_index is not None and any(os.path.dirname(path) == foods_dir for path in changed):
+            # 食物图标有增删改：重建食物索引和卡片原型
+            self.food_index.load()
+            if self.food_index.prototype is not None:
+                self.pyramid_cache.build('food_card', [self.food_index.prototype], self.get_scale_factors('food_card'))
+                keys.append('food_card')
+            self.template_store.save()
+
+        for key in keys:
+            self.frame_gate.forget(key)  # 缓存的是旧模板的检测结果
+            self.scale_calibration.forget(key)  # 新模板可能需要不同的缩放
+        logger.info(f"模板文件有变化: {', '.join(os.path.basename(path) for path in sorted(changed))}，"
+                    f"已重新加载: {keys or '无'}")
+
+    def get_scale_factors(self, template_name):
+        """获取指定模板使用的缩放系数"""
+        return self.scale_factors.get(template_name, self.scale_factors['default'])
+
+    def recognize_foods(self, frame):
+        """单次扫描食物面板：用通用卡片原型定位全部卡片，再用食物索引识别每张卡片上的食物和格子
+
+        Returns:
+            list[FoodHit]: 检测框为屏幕坐标，同时保存到 visible_foods
+        """
+        with stage('match'):
+            cards = self.match_cached('food_card', frame, 'bgr', FOOD_CARD_THRESHOLD)
+        with stage('identify'):
+            hits = self.food_index.identify(frame.bgr, cards)
+        if len(cards) > 0 and not hits:
+            # 定位到的"卡片"上没有任何食物（如食物面板还没打开时匹配到灶台），
+            # 不是真正的卡片，按它校准的缩放系数也不可信，下次重新做全尺度搜索
+            self.scale_calibration.forget('food_card')
+            self.frame_gate.forget('food_card')
+        self.visible_foods = [hit._replace(box=list(frame.to_screen(np.array([hit.box]))[0])) for hit in hits]
+        return self.visible_foods
+
     def detect_food(self):
         """使用彩色图像检测食物按钮，优先选择左上角的图标"""
-        try:
-            # 使用窗口截图代替全屏截图
-            screen = self.capture_window_screenshot()
-            screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
+        with self.latency.stages('detect/food'):
+            return self._detect_food()
 
-            all_matches = []
-            scale_factors = self.scale_factors
+    def _detect_food(self):
+        try:
+            frame = self.get_frame()
             threshold = 0.8
-
-            for template in self.food_templates:
-                template_matches = []
-
-                for scale in scale_factors:
-                    if scale != 1.0:
-                        scaled_template = cv2.resize(
-                            template,
-                            None,
-                            fx=scale,
-                            fy=scale,
-                            interpolation=cv2.INTER_LINEAR
-                        )
-                    else:
-                        scaled_template = template
-
-                    result = cv2.matchTemplate(
-                        screen_bgr,
-                        scaled_template,
-                        cv2.TM_CCOEFF_NORMED
-                    )
-
-                    locations = np.where(result >= threshold)
-                    h, w = scaled_template.shape[:2]
-
-                    for pt in zip(*locations[::-1]):
-                        template_matches.append([
-                            int(pt[0]),
-                            int(pt[1]),
-                            int(w),
-                            int(h),
-                            float(result[pt[1], pt[0]])
-                        ])
-
-                if template_matches:
-                    # 对单个模板的结果进行NMS
-                    rectangles = np.array(template_matches)
-                    indices = cv2.dnn.NMSBoxes(
-                        rectangles[:, :4].tolist(),
-                        rectangles[:, 4].tolist(),
-                        threshold,
-                        0.4
-                    )
-                    if len(indices) > 0:
-                        best_matches = rectangles[indices.flatten()]
-                        all_matches.extend(best_matches)
-
-            if all_matches:
-                # 对所有匹配结果再次进行NMS
-                rectangles = np.array(all_matches)
-                indices = cv2.dnn.NMSBoxes(
-                    rectangles[:, :4].tolist(),
-                    rectangles[:, 4].tolist(),
-                    threshold,
-                    0.4
-                )
-
-                if len(indices) > 0:
-                    best_matches = rectangles[indices.flatten()]
-
-                    # 按照位置排序（先按y坐标，再按x坐标）
-                    sorted_matches = sorted(best_matches, key=lambda x: (x[1], x[0]))
-
-                    # 只选择最左上角的按钮
-                    selected_match = sorted_matches[0]
-
-                    logger.info(f"[food] 检测到 {len(best_matches)} 个食物按钮，"
-                                f"选择左上角按钮，位置: ({selected_match[0]}, {selected_match[1]})")
-
-                    # 显示和返回左上角的按钮
-                    self.overlay.update_overlay([selected_match], button_name=self.food_name)
-                    return [selected_match]
+            with stage('preprocess'):
+                frame.bgr  # 首次访问时计算并缓存
+
+            hits = None
+            if self.food_recognizer == 'index' and self.food_name in self.food_index.foods:
+                # 单次扫描识别面板上的全部食物，耗时与支持的食物数量基本无关
+                hits = self.recognize_foods(frame)
+                best_matches = [hit.box for hit in hits if hit.name == self.food_name]
+                if not best_matches:
+                    logger.info(f"[food] 食物索引识别到 {len(hits)} 张卡片但没有目标食物，改用模板匹配")
+                    hits = None
+
+            if hits is None:
+                # 先在上次的食物位置附近匹配，对每个模板单独NMS后再整体NMS，并换算为屏幕坐标
+                with stage('match'):
+                    best_matches = frame.to_screen(self.match_cached(
+                        'food', frame, 'bgr', threshold, per_template_nms=True
+                    ))
+            self.record_frame()
+            self.flight_recorder.note('detect', template='food', boxes=best_matches)
+
+            if len(best_matches) > 0:
+                # 按照位置排序（先按y坐标，再按x坐标）
+                sorted_matches = sorted(best_matches, key=lambda x: (x[1], x[0]))
+
+                # 只选择最左上角的按钮
+                selected_match = sorted_matches[0]
+
+                logger.info(f"[food] 检测到 {len(best_matches)} 个食物按钮，"
+                            f"选择左上角按钮，位置: ({selected_match[0]}, {selected_match[1]})")
+
+                # 显示和返回左上角的按钮
+                self.overlay.update_overlay([selected_match], button_name=self.food_name)
+                return [selected_match]
 
             logger.info("[food] 未检测到食物按钮")
             self.overlay.update_overlay([], button_name=self.food_name)
@@ -487,86 +578,135 @@ class CookingBot:
             logger.error(f"食物按钮检测失败: {e}")
             return []
 
+    def match_templates(self, template_name, frame, kind, threshold, per_template_nms=False, scales=None):
+        """按当前匹配模式在整帧上匹配模板
+
+        Args:
+            template_name: 模板键
+            frame: FrameContext
+            kind: 使用的图像类型，'binary'（按钮）或 'bgr'（食物）
+            scales: 只搜索这些缩放系数，None表示全部尺度
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        with stage('preprocess'):
+            screen = getattr(frame, kind)  # 首次访问时计算并缓存
+        template_pyramids = filter_levels(self.pyramid_cache.get(template_name), scales)
+        if self.match_mode == 'coarse':
+            coarse_pyramids = filter_levels(self.pyramid_cache.get_coarse(template_name, self.coarse_factor), scales)
+            return match_pyramids_coarse_to_fine(
+                screen, frame.downscaled(self.coarse_factor, kind), template_pyramids, coarse_pyramids,
+                self.coarse_factor, threshold, per_template_nms, executor=self.executor
+            )
+        if self.match_mode == 'fft':
+            return match_pyramids_spectrum(frame.spectrum(kind), template_pyramids, threshold, per_template_nms,
+                                           executor=self.executor)
+        if self.match_mode == 'binary' and kind == 'binary':
+            return match_pyramids_bits(frame.packed_binary, template_pyramids, threshold, per_template_nms,
+                                       executor=self.executor)
+        return match_pyramids(screen, template_pyramids, threshold, per_template_nms, executor=self.executor)
+
+    def match_cached(self, template_name, frame, kind, threshold, per_template_nms=False):
+        """检测模板：画面与上次检测时相比没有变化时直接复用上次的结果
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        cached = self.frame_gate.lookup(template_name, frame)
+        if cached is not None:
+            return cached
+
+        boxes = self.match_with_prior(template_name, frame, kind, threshold, per_template_nms)
+        self.frame_gate.store(template_name, frame, boxes)
+        return boxes
+
+    def match_with_prior(self, template_name, frame, kind, threshold, per_template_nms=False):
+        """先在上次命中位置附近匹配，数量不足时回退到整帧搜索
+
+        已完成UI缩放校准的模板只搜索校准尺度附近的窄带。
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        height, width = frame.shape[:2]
+        if self.scale_calibration.set_size(width, height):
+            # 客户区尺寸变化后按钮位置全部失效，缩放改用该尺寸下的校准结果
+            logger.info(f"客户区尺寸: {self.scale_calibration.size_key}")
+            self.spatial_priors.forget()
+
+        template_pyramids = self.pyramid_cache.get(template_name)
+        scales = self.scale_calibration.select(template_name, template_pyramids)
+
+        region = self.spatial_priors.search_region(template_name, frame.shape)
+        if region is not None:
+            # 只处理先验区域：二值图只对该区域做二值化，先验命中时整帧不需要二值化
+            x0, y0, x1, y1 = region
+            boxes = match_pyramids(frame.crop(kind, region), filter_levels(template_pyramids, scales),
+                                   threshold, per_template_nms, executor=self.executor)
+            if self.spatial_priors.accept(template_name, boxes):
+                boxes[:, 0] += x0
+                boxes[:, 1] += y0
+                self.spatial_priors.remember(template_name, boxes, full_frame=False)
+                self.scale_calibration.observe(template_name, boxes, template_pyramids)
+                return boxes
+
+        boxes = self.match_templates(template_name, frame, kind, threshold, per_template_nms, scales)
+        self.spatial_priors.remember(template_name, boxes)
+        self.scale_calibration.observe(template_name, boxes, template_pyramids)
+        return boxes
+
+    def log_detection_stats(self):
+        """输出位置先验命中率和画面静止跳过率"""
+        summary = self.spatial_priors.summary()
+        if summary:
+            logger.info(f"位置先验命中率: {summary}")
+        summary = self.frame_gate.summary()
+        if summary:
+            logger.info(f"画面静止跳过匹配: {summary}")
+        if self.overlay.updates:
+            logger.info(f"覆盖层: 提交 {self.overlay.updates} 次, 重绘 {self.overlay.redraws} 次")
+        if any(self.click_checks.values()):
+            logger.info(f"点击确认: 区域差异判定 {self.click_checks['diff']} 次, "
+                        f"模板匹配 {self.click_checks['match']} 次")
+        for name, item in self.latency.summary().items():
+            if name.startswith('state/') or name.endswith('/total') or name.startswith('confirm/'):
+                logger.info(f"[耗时] {name}: {item['count']} 次, 平均 {item['mean_ms']:.1f}ms, "
+                            f"p95 {item['p95_ms']:.1f}ms")
+
     def detect_buttons(self, template_name, threshold=0.7):
-        """添加调试信息的按钮检测"""
-        try:
-            if template_name == 'cook':
-                # cook按钮使用更快的检测参数
-                self.scale_factors = np.arange(0.9, 1.1, 0.1)
-                threshold = 0.5
-            else:
-                self.scale_factors = np.arange(0.8, 1.2, 0.1)
-                threshold = 0.55
+        """添加调试信息的按钮检测，按截图、预处理、匹配、NMS分段统计耗时"""
+        if template_name == 'food':
+            return self.detect_food()
+        with self.latency.stages(f"detect/{template_name}"):
+            return self._detect_buttons(template_name)
 
-            if template_name == 'food':
-                return self.detect_food()
+    def _detect_buttons(self, template_name):
+        try:
+            threshold = self.button_threshold(template_name)
 
-            screen = self.get_screenshot()
-            if screen is None:
+            frame = self.get_frame()
+            if frame.rgb is None:
                 logger.error("获取屏幕截图失败")
                 return []
 
-            screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
-            screen_processed = self.preprocess_image(screen_bgr)
-
-            template_list = self.templates.get(template_name, [])
-            if not template_list:
+            # 同一帧的二值化结果（frame.binary）在多个模板检测之间共享，先验区域命中时只二值化该区域
+            if not self.pyramid_cache.get(template_name):
                 logger.error(f"没有找到模板: {template_name}")
                 return []
 
-            all_matches = []
-
-            for idx, template in enumerate(template_list):
-                template_matches = []
-
-                for scale in self.scale_factors:
-                    if scale != 1.0:
-                        scaled_template = cv2.resize(
-                            template,
-                            None,
-                            fx=scale,
-                            fy=scale,
-                            interpolation=cv2.INTER_LINEAR
-                        )
-                    else:
-                        scaled_template = template
-
-                    result = cv2.matchTemplate(
-                        screen_processed,
-                        scaled_template,
-                        cv2.TM_CCOEFF_NORMED
-                    )
-
-                    locations = np.where(result >= threshold)
-                    h, w = scaled_template.shape[:2]
-
-                    for pt in zip(*locations[::-1]):
-                        template_matches.append([
-                            int(pt[0]),
-                            int(pt[1]),
-                            int(w),
-                            int(h),
-                            float(result[pt[1], pt[0]])
-                        ])
-
-                if template_matches:
-                    all_matches.extend(template_matches)
-
-            # 对所有匹配结果进行NMS，使用固定阈值0.4
-            if all_matches:
-                rectangles = np.array(all_matches)
-                indices = cv2.dnn.NMSBoxes(
-                    rectangles[:, :4].tolist(),
-                    rectangles[:, 4].tolist(),
-                    threshold,
-                    0.4  # 直接使用固定值
-                )
+            # 先在上次命中位置附近匹配，未命中再整帧搜索，结果换算为屏幕坐标
+            with stage('match'):
+                best_matches = frame.to_screen(self.match_cached(
+                    template_name, frame, 'binary', threshold
+                ))
+            self.record_frame()
+            self.flight_recorder.note('detect', template=template_name, boxes=best_matches)
 
-                if len(indices) > 0:
-                    best_matches = rectangles[indices.flatten()]
-                    logger.debug(f"[{template_name}] 检测到 {len(best_matches)} 个按钮")
-                    self.overlay.update_overlay(best_matches, button_name=template_name)
-                    return best_matches.tolist()
+            if len(best_matches) > 0:
+                logger.debug(f"[{template_name}] 检测到 {len(best_matches)} 个按钮")
+                self.overlay.update_overlay(best_matches, button_name=template_name)
+                return best_matches.tolist()
 
             logger.debug(f"[{template_name}] 未检测到按钮")
             self.overlay.update_overlay([], button_name=template_name)
@@ -580,7 +720,13 @@ class CookingBot:
         """更改要制作的食物"""
         self.food_name = food_name
         self.template_config['food'] = [f'{food_name}.png', f'{food_name}_1.png']
-        self.templates = self.load_templates()  # 重新加载有模板
+        self.food_templates = self.load_food_templates()  # 只重新加载食物模板及其多尺度缓存
+        self.spatial_priors.forget('food')  # 新食物的位置需要重新搜索
+        self.scale_calibration.forget('food')  # 新食物图标需要重新校准缩放
+        self.frame_gate.forget('food')  # 缓存的是旧食物的检测结果
+        if self.food_index is not None and food_name not in self.food_index.foods:
+            self.food_index.load()  # foods 目录中新增了图标
+        self.food_clicked = False  # 食物面板中需要重新选择食物
         logger.info(f"已更改食物为: {food_name}")
 
     def get_available_foods(self):
@@ -596,21 +742,7 @@ class CookingBot:
     def preprocess_image(self, image):
         """简化的图像预处理方法"""
         try:
-            # 转换为灰度图
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-            # 应用简单的高斯模糊去噪
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-            # 自适应阈值分割
-            thresh = cv2.adaptiveThreshold(
-                blurred, 255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY,
-                11, 2
-            )
-
-            return thresh
+            return preprocess_binary(image)
 
         except Exception as e:
             logger.error(f"图像预处理失败: {e}")
@@ -643,6 +775,7 @@ class CookingBot:
     def handle_timeout(self):
         """处理超时情况"""
         if (datetime.now() - self.state_start_time).seconds >= self.timeout:
+            self.flight_recorder.dump('timeout')
             if self.retry_count < self.max_retries:
                 self.retry_count += 1
                 logger.warning(f"状态 {self.state} 超时，第 {self.retry_count} 次重试")
@@ -656,14 +789,17 @@ class CookingBot:
     def change_state(self, new_state):
         """切换状态"""
         logger.info(f"状态切换: {self.state} -> {new_state}")
+        self.flight_recorder.note('state', old=self.state.name, new=new_state.name)
         self.state = new_state
         self.reset_state_timer()
 
     def mouse_click_button(self, button, double_click=False, delay=0.1):
-        x, y, w, h = button
+        """点击检测结果 [x, y, w, h, conf] 的中心（检测结果已是屏幕坐标）"""
+        x, y, w, h = list(button)[:4]
         center_x = int(x + w // 2)
         center_y = int(y + h // 2)
-        self.mouse_click(self, center_x, center_y, double_click, delay)
+        self.mouse_click(center_x, center_y, double_click, delay)
+        return center_x, center_y
         
     def mouse_click(self, x, y, double_click=False, delay=0.1):
         """使用mouseDown和mouseUp模拟点击
@@ -688,6 +824,10 @@ class CookingBot:
                 pyautogui.mouseUp(x=x, y=y, button='left')
             
             logger.debug(f"模拟点击: ({x}, {y}), 双击: {double_click}")
+            self.flight_recorder.note('click', x=x, y=y, double_click=double_click)
+            # 点击后画面会变化，之后的检测需要重新截图
+            self.invalidate_frame()
+            self.last_click_at = time.perf_counter()
             
         except Exception as e:
             logger.error(f"模拟点击失败: {e}")
@@ -697,9 +837,109 @@ class CookingBot:
             except:
                 pass
 
+    def button_threshold(self, template_name):
+        """按钮模板使用的匹配阈值"""
+        if template_name == 'cook':
+            # cook按钮使用更快的检测参数
+            return 0.5
+        return 0.55
+
+    def wait_until(self, condition, timeout, poll=0.05, label=None):
+        """轮询等待界面变化，条件满足时立即返回，取代点击后的固定等待
+
+        每次轮询前使当前帧失效，condition 中的检测都基于新截图。至少检查两次：
+        第一次截图可能早于界面响应，检测较慢时单次检查就会耗尽 timeout。
+
+        Args:
+            condition: 无参数的检查函数，返回真值表示界面已经变化
+            timeout: 最长等待时间（秒）
+            poll: 轮询间隔（秒）
+            label: 点击的按钮名称，记录从点击完成到界面确认的延迟 'confirm/{label}'（超时记入 '.../timeout'）
+
+        Returns:
+            condition 最后一次的返回值，超时时为假值
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        checks = 0
+        while True:
+            self.invalidate_frame()
+            result = condition()
+            checks += 1
+            now = time.perf_counter()
+            remaining = deadline - now
+            if result or (remaining <= 0 and checks >= 2):
+                if label:
+                    clicked_at = self.last_click_at if self.last_click_at and self.last_click_at <= start else start
+                    self.latency.record(f"confirm/{label}" if result else f"confirm/{label}/timeout", now - clicked_at)
+                return result
+            time.sleep(min(poll, max(remaining, 0)))
+
+    def roi_present(self, template_name, button, padding=0.5):
+        """只在按钮原位置附近检查模板是否仍然存在，只匹配一个尺度的小区域，也只二值化该区域，比整帧检测便宜得多
+
+        Args:
+            button: 屏幕坐标的检测框 [x, y, w, h, conf]
+            padding: 搜索区域四周扩展的距离，以按钮最大边长为单位
+        """
+        frame = self.get_frame()
+        if frame.rgb is None:
+            return False
+        template_pyramids = levels_for_box(self.pyramid_cache.get(template_name), button)
+        threshold = self.button_threshold(template_name)
+        # 按钮通常还在原处：先只搜索原位置附近 ROI_JITTER 像素，找不到再搜索扩展区域
+        for pad in (ROI_JITTER, int(max(button[2], button[3]) * padding) + 1):
+            boxes = match_pyramids(frame.binary_region(frame.region(button, pad)), template_pyramids, threshold)
+            if len(boxes) > 0:
+                return True
+        return False
+
+    def roi_snapshot(self, button):
+        """截取按钮区域的灰度图（只转换该区域），用于点击后判断该区域是否变化"""
+        frame = self.get_frame()
+        return frame.crop('gray', frame.region(button)).copy()
+
+    def roi_changed(self, button, snapshot, threshold=8.0):
+        """按钮区域与快照相比的平均灰度差是否超过阈值"""
+        frame = self.get_frame()
+        current = frame.crop('gray', frame.region(button))
+        if current.shape != snapshot.shape:
+            return True
+        return current.size > 0 and float(cv2.absdiff(current, snapshot).mean()) > threshold
+
+    def button_gone(self, template_name, button, snapshot):
+        """点击后按钮是否已经消失：先比较按钮区域与点击前快照的归一化差异，判断不了时才在原位置附近匹配模板"""
+        frame = self.get_frame()
+        diff = roi_difference(snapshot, frame.crop('gray', frame.region(button)))
+        if diff is not None and (diff <= CLICK_DIFF_SAME or diff >= CLICK_DIFF_GONE):
+            self.click_checks['diff'] += 1
+            return diff >= CLICK_DIFF_GONE
+        self.click_checks['match'] += 1
+        return not self.roi_present(template_name, button)
+
+    def confirm_click(self, template_name, button, snapshot, timeout, label=None):
+        """等待点击的按钮消失，返回是否消失
+
+        Args:
+            button: 屏幕坐标的检测框 [x, y, w, h, conf]
+            snapshot: 点击前的 roi_snapshot(button)
+        """
+        gone = self.wait_until(lambda: self.button_gone(template_name, button, snapshot), timeout=timeout, label=label)
+        self.flight_recorder.note('confirm', template=template_name, box=list(button), gone=bool(gone))
+        return gone
+
     def handle_menu_state(self):
         """处理菜单和cook按钮检测状态，优先点击cook按钮"""
         try:
+            # 0. 所有灶台都在烹饪且都未到预计完成时间：不截图检测，空闲到最早的检测窗口
+            wait = self.scheduler.seconds_until_finish_check()
+            if self.scheduler.all_busy and wait > 0:
+                idle = min(wait, self.finish_idle_slice)
+                logger.debug(f"所有灶台都在烹饪，{wait:.1f}s 后开始检测finish按钮")
+                time.sleep(idle)
+                self.scheduler.record_idle(idle)
+                return
+
             # 1. 首先检测cook按钮，如果有就优先点击
             cook_buttons = self.detect_buttons('cook', threshold=0.6)
             if cook_buttons and len(cook_buttons) > 0:
@@ -708,25 +948,51 @@ class CookingBot:
                     cook_button = cook_buttons[0].tolist() if isinstance(cook_buttons[0], np.ndarray) else list(
                         cook_buttons[0])
 
-                    self.mouse_click(cook_button, double_click=False)
+                    before = self.roi_snapshot(cook_button)
+                    center_x, center_y = self.mouse_click_button(cook_button, double_click=False)
                     logger.info(f"点击cook按钮 位置: ({center_x}, {center_y})")
                     self.cook_clicks += 1
                     
-                    # cook点击成功后继续检测菜单按钮
-                    time.sleep(0.5)
+                    # 等待cook按钮消失后继续检测菜单按钮
+                    self.confirm_click('cook', cook_button, before, timeout=0.5, label='cook')
                     return
                 except Exception as e:
                     logger.error(f"点击cook按钮失败: {e}")
             
-            # 2. 检测finish按钮数量，如果有3个就进入finish处理状态
-            finish_buttons = self.detect_buttons('finish')
-            if finish_buttons and len(finish_buttons) >= 3:
+            # 2. 检测finish按钮数量，达到收取数量就进入finish处理状态；所有灶台都未进入预计完成时间前的检测窗口时跳过检测
+            finish_buttons = self.detect_buttons('finish') if wait <= 0 else []
+            seen = set()
+            for finish_button in finish_buttons:
+                stove = self.scheduler.finish_stove(finish_button)
+                if stove is not None:
+                    self.scheduler.finish_seen(stove)
+                    seen.add(stove)
+            if wait <= 0:
+                self.scheduler.finish_polled(seen)
+                self.scheduler.settle_unconfirmed(finish_buttons)
+            if finish_buttons and len(finish_buttons) >= self.finish_batch:
                 logger.info(f"=== 检测到 {len(finish_buttons)} 个finish按钮，进入finish处理状态 ===")
                 self.finish_button_positions = finish_buttons[:3]  # 只取前3个
                 self.change_state(CookingState.DETECT_FINISH)
                 return
             
-            # 3. 检测菜单按钮
+            # 3. 菜谱全部完成后停止；全部下锅但未完成时只等待finish，不再打开菜单
+            if self.recipe_queue.finished:
+                logger.info(f"=== 菜谱队列已全部完成: {self.recipe_queue} ===")
+                self.running = False
+                return
+            next_food = self.scheduler.next_food()
+            if next_food is None:
+                if self.scheduler.stalled():
+                    logger.warning(f"菜谱已全部下锅，但长时间没有看到finish按钮，停止运行: {self.recipe_queue}")
+                    self.flight_recorder.dump('timeout')
+                    self.running = False
+                    return
+                logger.info(f"菜谱已全部下锅，等待灶台完成: {self.recipe_queue}")
+                time.sleep(0.5)
+                return
+
+            # 4. 检测菜单按钮
             menu_buttons = self.detect_buttons('cook_menu', threshold=0.6)
             logger.info(f"当前状态: DETECT_MENU_AND_COOK, 检测到菜单按钮数: {len(menu_buttons)}")
             
@@ -746,10 +1012,16 @@ class CookingBot:
                     center_x = int(x + w // 2)
                     center_y = int(y + h // 2)
 
+                    # 按菜谱队列为这个灶台安排菜品
+                    if next_food != self.food_name:
+                        self.set_food(next_food)
+                    self.pending_stove = self.scheduler.stove_for(button_data)
+
                     # 点击菜单按钮
-                    logger.info(f"点击菜单按钮 位置: ({center_x}, {center_y})")
+                    logger.info(f"点击菜单按钮 位置: ({center_x}, {center_y}), 灶台 {self.pending_stove + 1}: {next_food}")
                     self.mouse_click(center_x, center_y, double_click=False)
-                    time.sleep(0.5)
+                    # 等待食物面板弹出（出现start按钮）
+                    self.wait_until(lambda: self.detect_buttons('cook_start'), timeout=1.0, label='menu')
                     
                     # 点击菜单按钮后，进入食物和start按钮检测状态
                     self.change_state(CookingState.DETECT_FOOD_AND_START)
@@ -762,6 +1034,7 @@ class CookingBot:
             
         except Exception as e:
             logger.error(f"处理菜单和cook按钮状态时出错: {e}")
+            self.flight_recorder.dump('error')
             if not self.handle_timeout():
                 raise Exception("菜单和cook按钮检测状态处理超时")
 
@@ -784,9 +1057,11 @@ class CookingBot:
                         # 点击食物按钮
                         center_x = int(x + w // 2)
                         center_y = int(y + h // 2)
+                        before = self.roi_snapshot(food_button)
                         self.mouse_click(center_x, center_y, double_click=False)
                         logger.info(f"点击食物按钮 位置: ({center_x}, {center_y})")
-                        time.sleep(0.5)
+                        # 等待食物图标出现选中效果
+                        self.wait_until(lambda: self.roi_changed(food_button, before), timeout=0.5, label='food')
                         
                         # 食物点击成功，设置标记
                         self.food_clicked = True
@@ -808,17 +1083,19 @@ class CookingBot:
                     # 点击start按钮
                     center_x = int(x + w // 2)
                     center_y = int(y + h // 2)
+                    before = self.roi_snapshot(start_button)
                     self.mouse_click(center_x, center_y, double_click=False)
                     logger.info(f"点击start按钮 位置: ({center_x}, {center_y})")
-                    time.sleep(0.7)
                     
-                    # 验证点击是否成功
-                    verify_buttons = self.detect_buttons('cook_start', threshold=0.5)
-                    if not verify_buttons or len(verify_buttons) == 0:
+                    # 验证点击是否成功：等待start按钮消失（比较按钮区域，判断不了时才匹配模板）
+                    if self.confirm_click('cook_start', start_button, before, timeout=0.7, label='start'):
                         logger.info("start按钮点击成功（按钮消失）")
                         # 增加start按钮点击计数
                         self.start_clicks += 1
                         logger.info(f"当前start按钮点击次数: {self.start_clicks}")
+                        if self.pending_stove is not None:
+                            self.scheduler.start(self.pending_stove, self.food_name)
+                            self.pending_stove = None
                         
                         # 点击成功后返回菜单检测状态
                         self.change_state(CookingState.DETECT_MENU_AND_COOK)
@@ -834,9 +1111,10 @@ class CookingBot:
                             x, y, w, h, conf = back_button
                             center_x = int(x + w // 2)
                             center_y = int(y + h // 2)
+                            before = self.roi_snapshot(back_button)
                             self.mouse_click(center_x, center_y, double_click=False)
                             logger.info(f"点击back按钮 位置: ({center_x}, {center_y})")
-                            time.sleep(0.5)
+                            self.confirm_click('back', back_button, before, timeout=0.5, label='back')
                 except Exception as e:
                     logger.error(f"点击start按钮失败: {e}")
             else:
@@ -845,11 +1123,13 @@ class CookingBot:
             # 如果长时间未找到按钮，返回菜单检测状态
             if self.is_state_timeout():
                 logger.warning("长时间未找到食物或start按钮，返回菜单检测状态")
+                self.flight_recorder.dump('timeout')
                 self.change_state(CookingState.DETECT_MENU_AND_COOK)
                 return
                 
         except Exception as e:
             logger.error(f"处理食物和start按钮状态时出错: {e}")
+            self.flight_recorder.dump('error')
             if not self.handle_timeout():
                 raise Exception("食物和start按钮检测状态处理超时")
 
@@ -864,13 +1144,21 @@ class CookingBot:
                 center_x = int(x + w // 2)
                 center_y = int(y + h // 2)
 
-                logger.info(f"点击finish按钮 {i+1}/3 位置: ({center_x}, {center_y})")
+                logger.info(f"点击finish按钮 {i+1}/{len(self.finish_button_positions)} 位置: ({center_x}, {center_y})")
+                stove = self.scheduler.finish_stove(button_data)
+                before = self.roi_snapshot(button_data)
                 self.mouse_click(center_x, center_y, double_click=False)
-                time.sleep(0.6)  # 点击后短暂等待
+                # 等待该finish按钮消失，消失后记为对应灶台的菜品完成；超时未消失的在下次检测finish按钮时再确认
+                if self.confirm_click('finish', button_data, before, timeout=0.6, label='finish'):
+                    if stove is not None:
+                        self.scheduler.finish(stove)
+                elif stove is not None:
+                    self.scheduler.finish_unconfirmed(stove, button_data)
                 self.finish_clicks += 1
             
             # 验证是否成功点击了所有finish按钮
             finish_buttons = self.detect_buttons('finish')
+            self.scheduler.settle_unconfirmed(finish_buttons)
             if not finish_buttons or len(finish_buttons) == 0:
                 logger.info("=== 成功点击了所有finish按钮（按钮数量减少） ===")
                 # 清空保存的finish按钮位置
@@ -887,12 +1175,14 @@ class CookingBot:
             # 如果长时间未点击成功，返回菜单检测状态
             if self.is_state_timeout():
                 logger.warning("长时间未成功点击finish按钮，返回菜单检测状态")
+                self.flight_recorder.dump('timeout')
                 self.finish_button_positions = []
                 self.change_state(CookingState.DETECT_MENU_AND_COOK)
                 return
                 
         except Exception as e:
             logger.error(f"处理finish按钮状态时出错: {e}")
+            self.flight_recorder.dump('error')
             # 发生错误时返回菜单检测状态
             self.change_state(CookingState.DETECT_MENU_AND_COOK)
 
@@ -937,9 +1227,18 @@ class CookingBot:
             # 分别存储普通模板和食物模板
             self.templates = self.load_templates()
             self.food_templates = self.load_food_templates()
+            self.food_index = self.load_food_index()
+            self.template_watcher = TemplateWatcher([self.btns_dir, self.foods_dir])
+            logger.info(f"模板加载完成: 使用缓存 {self.template_store.hits} 个, 重新编译 {self.template_store.compiles} 个")
 
             logger.info("开始自动烹饪流程...")
-            logger.info("使用窗口截图模式，只截取心动小镇窗口区域")
+            # 查找并激活心动小镇窗口，找到后只截取其客户区
+            if not self.game_hwnd:
+                self.find_and_activate_game_window()
+            if self.get_capture_region():
+                logger.info("使用窗口截图模式，只截取心动小镇窗口区域")
+            else:
+                logger.info("未找到心动小镇窗口，使用全屏截图模式")
             
             self.should_exit = False  # 添加新的标记
             last_window_update_time = time.time()  # 记录上次窗口位置更新时间
@@ -960,19 +1259,24 @@ class CookingBot:
                         height = bottom - top
                         logger.debug(f"更新窗口位置: 左={left}, 上={top}, 宽={width}, 高={height}")
 
+                # 每个状态tick使用一帧新的截图
+                self.invalidate_frame()
+
                 try:
-                    # 根据当前状态调用相应的处理方法
-                    if self.state == CookingState.DETECT_MENU_AND_COOK:
-                        self.handle_menu_state()
-                    elif self.state == CookingState.DETECT_FOOD_AND_START:
-                        self.handle_food_state()
-                    elif self.state == CookingState.DETECT_FINISH:
-                        self.handle_finish_state()
+                    # 根据当前状态调用相应的处理方法，按进入时的状态统计处理耗时
+                    with self.latency.timer(f"state/{self.state.name}"):
+                        if self.state == CookingState.DETECT_MENU_AND_COOK:
+                            self.handle_menu_state()
+                        elif self.state == CookingState.DETECT_FOOD_AND_START:
+                            self.handle_food_state()
+                        elif self.state == CookingState.DETECT_FINISH:
+                            self.handle_finish_state()
 
                 except Exception as e:
                     if str(e) == "完成所有操作":
                         logger.info(f"=== 完成第 {self.current_loop + 1} 次循环 ===")
                         self.current_loop += 1
+                        self.log_detection_stats()
 
                         # 检查是否需要退出程序
                         if self.should_exit:
@@ -989,56 +1293,28 @@ class CookingBot:
                     else:
                         raise
 
-                # 处理Tkinter事件
-                self.app.update()
+                # 按限定帧率刷新覆盖层并处理Tkinter事件，定期写入耗时报告，检查模板文件是否有更新
+                self.overlay.pump()
+                self.latency.maybe_write()
+                self.reload_changed_templates()
                 time.sleep(0.1)  # 主循环间隔
 
         except KeyboardInterrupt:
             logger.info("收到键盘中断信号，程序结束")
         except Exception as e:
             logger.error(f"程序运行出错: {e}")
+            self.flight_recorder.dump('error', force=True)
         finally:
+            self.log_detection_stats()
+            self.scheduler.log_report()
+            self.latency.write()
+            self.flight_recorder.close()
             self.executor.shutdown()
             self.overlay.close()
             self.app.destroy()
             logger.info("程序已退出")
 
 
-    def get_optimized_screenshot(self):
-        """获取优化后的截图"""
-        current_time = time.time()
-        if (self.last_screenshot is None or
-                current_time - self.last_screenshot_time >= 0.1):  # 直接使用固定值0.1
-            screen = np.array(pyautogui.screenshot())
-            screen = self.optimize_image_size(screen)
-            self.last_screenshot = screen
-            self.last_screenshot_time = current_time
-        return self.last_screenshot
-
-
-    def detect_with_roi(self, template_name):
-        """使用ROI区域进行检测"""
-        screen = self.get_optimized_screenshot()
-        if not self.roi_enabled:
-            return self.detect_buttons(screen, template_name)
-
-        h, w = screen.shape[:2]
-        roi_x = int(w * 0.2)
-        roi_y = int(h * 0.2)
-        roi_w = int(w * 0.6)
-        roi_h = int(h * 0.6)
-
-        roi = screen[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w]
-        matches = self.detect_buttons(roi, template_name)
-
-        # 调整坐标以匹配始幕
-        for match in matches:
-            match[0] += roi_x
-            match[1] += roi_y
-
-        return matches
-
-
     def reset_button_positions(self):
         """重置按钮位置缓存"""
         self.food_button_pos = None
@@ -1061,15 +1337,13 @@ class CookingBot:
             bool: 点击是否成功
         """
         try:
-            # 记录点击前的状态，用于后续验证
-            initial_buttons = self.detect_buttons(template_name)
-            initial_count = len(initial_buttons)
-            logger.debug(f"点击前按钮数量: {initial_count}")
-
             # 确保button是列表或元组类型
             if isinstance(button, np.ndarray):
                 button = button.tolist()
 
+            # 点击前只记录按钮区域，不再整帧检测
+            before = self.roi_snapshot(button)
+
             # 计算并行点击
             x, y, w, h, _ = button
             center_x = x + w // 2
@@ -1079,11 +1353,10 @@ class CookingBot:
             self.mouse_click(center_x, center_y, double_click=False)
             logger.info(f"点击按钮: ({center_x}, {center_y})")
 
-            # 等待界面更新
-            time.sleep(wait_time)
-
             # 根据不同情况验证点击效果
             if verify_start_button:
+                # 等待界面更新
+                time.sleep(wait_time)
                 # 特殊情况：验证食物和开始按钮是否同时存在
                 food_buttons = self.detect_buttons('food')
                 start_buttons = self.detect_buttons('cook_start')
@@ -1091,17 +1364,13 @@ class CookingBot:
                 logger.debug(f"验证开始按钮: 食物按钮={len(food_buttons)}, 开始按钮={len(start_buttons)}")
                 return success
 
-            # 普通情况：检查按钮数量变化
-            current_buttons = self.detect_buttons(template_name)
-            current_count = len(current_buttons)
-            logger.debug(f"点击后按钮数量: {current_count}")
-
+            # 普通情况：点击的按钮消失即按钮数量发生了变化
+            success = self.confirm_click(template_name, button, before, timeout=wait_time)
             if expected_count is not None:
-                # 如果指期望数量，直接比较
+                # 指定了期望数量时才需要整帧检测计数
+                current_count = len(self.detect_buttons(template_name))
+                logger.debug(f"点击后按钮数量: {current_count}")
                 success = current_count == expected_count
-            else:
-                # 否则只要数量发生变化认为成功
-                success = current_count != initial_count
 
             logger.debug(f"点击验证结果: {success}")
             return success
@@ -1112,41 +1381,45 @@ class CookingBot:
 
 
     def save_debug_images(self, template_name):
-        """保存调试用的图像"""
-        try:
-            # 保存原始截图
-            screen = self.get_screenshot()
-            cv2.imwrite('debug/original_screen.png', cv2.cvtColor(screen, cv2.COLOR_RGB2BGR))
-
-            # 保存处理后的截图
-            screen_processed = self.preprocess_image(cv2.cvtColor(screen, cv2.COLOR_RGB2BGR))
-            cv2.imwrite('debug/processed_screen.png', screen_processed)
-
-            # 保存模板图像
-            template_list = self.templates.get(template_name, [])
-            for idx, template in enumerate(template_list):
-                cv2.imwrite(f'debug/template_{template_name}_{idx}.png', template)
-
-            logger.info(f"调试图像已保存到 debug 目录")
-
-        except Exception as e:
-            logger.error(f"保存调试图像失败: {e}")
+        """保存调试用的图像：当前帧和最近的检测结果交给飞行记录在后台写入 debug 目录"""
+        self.get_frame()
+        self.record_frame()
+        return self.flight_recorder.dump(template_name, force=True)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='自动烹饪机器人')
     parser.add_argument('--food', type=str, default='饱藏泡芙蛋糕卷', help='食物名称')
     parser.add_argument('--loop', type=int, default=-1, help='循环次数，-1表示无限循环')
+    parser.add_argument('--recipes', type=str, default=None,
+                        help='菜谱队列，如 "葡萄酱:30,提拉米苏:20"，按顺序制作，全部完成后停止')
+    parser.add_argument('--match-mode', type=str, default='exhaustive', choices=['exhaustive', 'coarse', 'fft', 'binary'],
+                        help='整帧匹配模式：exhaustive 全尺度搜索，coarse 由粗到细，fft 所有模板共用整帧频谱，'
+                             'binary 按钮二值图位打包匹配')
+    parser.add_argument('--workers', type=int, default=None, help='模板匹配线程数，默认使用CPU核心数')
+    parser.add_argument('--no-overlay', action='store_true', help='不显示检测框覆盖层（无人值守运行）')
+    parser.add_argument('--food-recognizer', type=str, default='index', choices=['index', 'template'],
+                        help='食物识别方式：index 单次扫描识别面板上的全部食物，template 只匹配当前食物的模板')
+    parser.add_argument('--latency-report', type=str, default=None,
+                        help='耗时统计报告文件（.json 或 .csv），运行中每30秒写入一次')
+    parser.add_argument('--change-sensitivity', type=float, default=6.0,
+                        help='画面变化检测阈值（分块平均灰度差），0表示关闭')
+    parser.add_argument('--flight-frames', type=int, default=FLIGHT_FRAMES,
+                        help='飞行记录保留的最近帧数，超时、出错或按 Ctrl+Shift+D 时写入debug目录，0表示关闭')
+    parser.add_argument('--no-template-cache', action='store_true',
+                        help='不使用 configs/template_cache 中的模板编译缓存，每次启动重新编译模板')
 
     args = parser.parse_args()
 
     try:
-        bot = CookingBot(food_name=args.food, loop_count=args.loop)
+        bot = CookingBot(food_name=args.food, loop_count=args.loop, match_mode=args.match_mode,
+                     match_workers=args.workers, change_sensitivity=args.change_sensitivity,
+                     food_recognizer=args.food_recognizer, show_overlay=not args.no_overlay,
+                     recipes=args.recipes, latency_report=args.latency_report,
+                     flight_frames=args.flight_frames, template_cache=not args.no_template_cache)
         # 显示所有可用的食物模板
         available_foods = bot.get_available_foods()
         logger.info(f"可用的食物模板: {available_foods}")
         bot.run()
-             # 查找并激活心动小镇窗口
-        bot.find_and_activate_game_window()
     except Exception as e:
         logger.error(f"程序运行失败: {e}")
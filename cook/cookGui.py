@@ -6,6 +6,7 @@ import sys
 import logging
 import ctypes
 from cook import CookingBot
+from recipe_queue import parse_recipes
 from common import isAdmin
 
 class TkLogHandler(logging.Handler):
@@ -22,17 +23,18 @@ class TkLogHandler(logging.Handler):
         self.text_widget.see(tk.END)
 
 class CookingThread(threading.Thread):
-    def __init__(self, food_name, loop_count, log_handler):
+    def __init__(self, food_name, loop_count, log_handler, recipes=None):
         super().__init__()
         self.food_name = food_name
         self.loop_count = loop_count
+        self.recipes = recipes
         self.log_handler = log_handler
         self.bot = None
         self._stop_event = threading.Event()
 
     def run(self):
         try:
-            self.bot = CookingBot(food_name=self.food_name, loop_count=self.loop_count)
+            self.bot = CookingBot(food_name=self.food_name, loop_count=self.loop_count, recipes=self.recipes)
             logging.getLogger().addHandler(self.log_handler)
             self.bot.run()
         except Exception as e:
@@ -47,7 +49,7 @@ class MainApp:
     def __init__(self, root):
         self.root = root
         self.root.title("自动烹饪机器人 (Tkinter版)")
-        self.root.geometry("650x420")
+        self.root.geometry("650x460")
         self.cooking_thread = None
         isAdmin.hide_console()
          # 检查管理员权限
@@ -76,10 +78,42 @@ class MainApp:
         self.btn_stop = tk.Button(frm_top, text="停止", width=10, command=self.stop_cooking, state=tk.DISABLED)
         self.btn_stop.pack(side=tk.LEFT)
 
-        # 日志显示
-        self.log_text = scrolledtext.ScrolledText(root, height=18, font=("Consolas", 10))
-        self.log_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0,10))
+        # 菜谱队列：按顺序制作多种菜品，为空时只制作上面选择的食物
+        frm_recipe = tk.Frame(root)
+        frm_recipe.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        tk.Label(frm_recipe, text="菜谱队列:").pack(side=tk.LEFT)
+        self.recipe_var = tk.StringVar()
+        self.recipe_entry = tk.Entry(frm_recipe, textvariable=self.recipe_var, width=36)
+        self.recipe_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(frm_recipe, text="数量:").pack(side=tk.LEFT)
+        self.count_var = tk.StringVar(value="30")
+        self.count_entry = tk.Entry(frm_recipe, textvariable=self.count_var, width=5)
+        self.count_entry.pack(side=tk.LEFT, padx=5)
+
+        self.btn_add = tk.Button(frm_recipe, text="加入队列", command=self.add_recipe)
+        self.btn_add.pack(side=tk.LEFT, padx=5)
+        self.btn_clear = tk.Button(frm_recipe, text="清空", command=lambda: self.recipe_var.set(""))
+        self.btn_clear.pack(side=tk.LEFT)
+
+        # 日志和耗时统计分两个标签页显示
+        notebook = ttk.Notebook(root)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0,10))
+
+        self.log_text = scrolledtext.ScrolledText(notebook, height=18, font=("Consolas", 10))
         self.log_text.config(state=tk.NORMAL)
+        notebook.add(self.log_text, text="日志")
+
+        # 耗时面板：各状态、各模板检测分段和点击确认延迟的直方图统计，运行中定时刷新
+        columns = ('count', 'mean', 'p50', 'p95', 'max')
+        self.latency_tree = ttk.Treeview(notebook, columns=columns, height=18)
+        self.latency_tree.heading('#0', text="名称")
+        self.latency_tree.column('#0', width=220)
+        for column, title in zip(columns, ("次数", "平均ms", "p50 ms", "p95 ms", "最大ms")):
+            self.latency_tree.heading(column, text=title)
+            self.latency_tree.column(column, width=70, anchor=tk.E)
+        notebook.add(self.latency_tree, text="耗时")
 
         # 日志处理器
         self.log_handler = TkLogHandler(self.log_text)
@@ -90,6 +124,7 @@ class MainApp:
 
         # 关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.refresh_latency()
 
     def load_food_list(self):
         try:
@@ -101,6 +136,31 @@ class MainApp:
         except Exception as e:
             messagebox.showerror("错误", f"加载食物列表失败: {str(e)}")
 
+    def refresh_latency(self):
+        """从运行中的机器人读取耗时统计并刷新面板"""
+        bot = self.cooking_thread.bot if self.cooking_thread else None
+        if bot is not None:
+            self.latency_tree.delete(*self.latency_tree.get_children())
+            for name, item in bot.latency.summary().items():
+                self.latency_tree.insert('', tk.END, text=name, values=(
+                    item['count'], f"{item['mean_ms']:.1f}", f"{item['p50_ms']:.1f}",
+                    f"{item['p95_ms']:.1f}", f"{item['max_ms']:.1f}"))
+        self.root.after(2000, self.refresh_latency)
+
+    def add_recipe(self):
+        """把当前选择的食物和数量加入菜谱队列"""
+        food_name = self.food_var.get()
+        try:
+            count = int(self.count_var.get())
+        except ValueError:
+            messagebox.showwarning("警告", "数量请输入整数")
+            return
+        if not food_name:
+            messagebox.showwarning("警告", "请选择食物")
+            return
+        recipes = self.recipe_var.get().strip()
+        self.recipe_var.set(f"{recipes},{food_name}:{count}" if recipes else f"{food_name}:{count}")
+
     def start_cooking(self):
         food_name = self.food_var.get()
         try:
@@ -111,13 +171,24 @@ class MainApp:
         if not food_name:
             messagebox.showwarning("警告", "请选择食物")
             return
+        try:
+            recipes = parse_recipes(self.recipe_var.get())
+        except ValueError as e:
+            messagebox.showwarning("警告", str(e))
+            return
+        unknown = [name for name, _ in recipes if name not in self.food_combo['values']]
+        if unknown:
+            messagebox.showwarning("警告", f"菜谱中的食物没有图标: {', '.join(unknown)}")
+            return
         self.log_text.delete(1.0, tk.END)
-        self.cooking_thread = CookingThread(food_name, loop_count, self.log_handler)
+        self.cooking_thread = CookingThread(food_name, loop_count, self.log_handler, recipes=recipes or None)
         self.cooking_thread.start()
         self.btn_start.config(state=tk.DISABLED)
         self.btn_stop.config(state=tk.NORMAL)
         self.food_combo.config(state=tk.DISABLED)
         self.loop_entry.config(state=tk.DISABLED)
+        self.recipe_entry.config(state=tk.DISABLED)
+        self.btn_add.config(state=tk.DISABLED)
 
     def stop_cooking(self):
         if self.cooking_thread:
@@ -127,6 +198,8 @@ class MainApp:
         self.btn_stop.config(state=tk.DISABLED)
         self.food_combo.config(state=tk.NORMAL)
         self.loop_entry.config(state=tk.NORMAL)
+        self.recipe_entry.config(state=tk.NORMAL)
+        self.btn_add.config(state=tk.NORMAL)
 
     def on_close(self):
         if self.cooking_thread and self.cooking_thread.is_alive():
@@ -3,7 +3,6 @@ import pyautogui
 import numpy as np
 import os
 import time
-import tkinter as tk
 import logging
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
@@ -12,6 +11,21 @@ import keyboard
 from datetime import datetime, timedelta
 import sys
 import argparse
+from contextlib import nullcontext
+import win32gui
+# 共享截图模块位于上级目录的 common 中
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.capture import default_capture
+from overlay import create_overlay
+from food_index import FoodIndex, FOOD_CARD_THRESHOLD
+from flight_recorder import FlightRecorder, FLIGHT_FRAMES
+from template_store import TemplateStore, TemplateWatcher
+from template_matcher import (
+    FrameContext, TemplatePyramidCache, BUTTON_SCALE_FACTORS, COOK_SCALE_FACTORS, FOOD_SCALE_FACTORS,
+    SpatialPriors, ScaleCalibration, FrameChangeGate, preprocess_binary, filter_levels, levels_for_box, ROI_JITTER,
+    CLICK_DIFF_SAME, CLICK_DIFF_GONE, COARSE_THRESHOLD_MARGIN, roi_difference,
+    match_pyramids_coarse_to_fine, match_pyramids, match_pyramids_spectrum, match_pyramids_bits
+)
 
 # 配置日志
 logging.basicConfig(
@@ -25,6 +39,46 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 各模板默认使用的缩放系数，未列出的模板使用 'default'
+TEMPLATE_SCALE_FACTORS = {
+    'default': BUTTON_SCALE_FACTORS,
+    'cook': COOK_SCALE_FACTORS,
+    'food': FOOD_SCALE_FACTORS,
+    'food_card': FOOD_SCALE_FACTORS,
+}
+
+# 视角旋转：一圈分 ROTATION_SEGMENTS 段，每段水平拖动 ROTATION_SEGMENT_DISTANCE 像素，用时 ROTATION_DRAG_TIME 秒
+ROTATION_SEGMENTS = 4
+ROTATION_SEGMENT_DISTANCE = 200
+ROTATION_DRAG_TIME = 0.1
+# 分段旋转一圈的总拖动距离，累计拖动量按一圈取模
+ROTATION_CIRCLE = ROTATION_SEGMENTS * ROTATION_SEGMENT_DISTANCE
+# 每次拖动后等待画面稳定、快速检查按钮的最长时间（秒）
+ROTATION_SETTLE = 0.3
+# finish状态下灶台都在烹饪时既没有菜单按钮也没有完成按钮，最多这么久（秒）没看到按钮仍相信记住的灶台视角
+ROTATION_MEMORY_TIMEOUT = 300.0
+# 指定的模拟器窗口不可用（最小化、句柄失效）时，每隔这么久（秒）重新获取一次窗口位置
+WINDOW_RETRY_INTERVAL = 1.0
+
+
+def template_config_for(food_name):
+    """模板键 -> 模板文件列表，'food' 在 foods 目录下，其余在 btns 目录下"""
+    return {
+        'cook_menu': [
+            'cook_menu.png'
+        ],
+        'cook': [
+            'cook.png'
+        ],
+        'finish': [
+            'finish.png'
+        ],
+        'cook_start': ['cook_start.png'],  # 单模板
+        'food': [f'{food_name}.png', f'{food_name}_1.png'],  # 动态食物模板
+        'back': ['back.png'],
+    }
+
+
 class CookingState(Enum):
     DETECT_MENU = auto()
     CLICK_MENU = auto()
@@ -35,60 +89,48 @@ class CookingState(Enum):
     CLICK_FINISH = auto()
 
 
-class OverlayWindow:
-    def __init__(self):
-        """初始化覆盖窗口"""
-        self.root = tk.Tk()
-        self.root.title("Overlay")
-        self.root.attributes('-alpha', 1.0, '-topmost', True)
-        self.root.attributes('-fullscreen', True)
-        self.root.configure(bg='black')
-        self.root.attributes('-transparentcolor', 'black')
-
-        self.canvas = tk.Canvas(
-            self.root,
-            highlightthickness=0,
-            bg='black'
-        )
-        self.canvas.pack(fill='both', expand=True)
-
-    def update_overlay(self, matches):
-        """更新覆盖层显示"""
-        self.canvas.delete('all')  # 清除之前的矩形
-
-        for match in matches:
-            x, y, w, h, conf = match
-            # 绘制绿色矩形框
-            self.canvas.create_rectangle(
-                x, y, x + w, y + h,
-                outline='green',
-                width=5
-
-            )
-            # 显示置信度
-            self.canvas.create_text(
-                x, y - 10,
-                text=f'{conf:.2f}',
-                fill='green',
-                anchor='sw',
-                font=('Arial', 12, 'bold')  # 加粗字体
-            )
-
-        self.root.update()
-
-
 class CookingBot:
-    def __init__(self, food_name="food", loop_count=1):
+    def __init__(self, food_name="food", loop_count=1, window_title="MuMu", match_mode='exhaustive',
+                 match_workers=None, change_sensitivity=6.0,
+                 capture_source=None, show_overlay=True, window_handle=None, pyramid_cache=None,
+                 input_lock=None, adb_device=None, food_recognizer='index', flight_frames=FLIGHT_FRAMES,
+                 template_cache=True, debug_dir='debug'):
         """
         初始化烹饪机器人
         :param food_name: 食物模板的名称（不包含.png后缀）
         :param loop_count: 循环执行次数，-1表示无限循环
+        :param window_title: 模拟器窗口标题包含的关键字，用于只截取模拟器窗口
+        :param match_mode: 整帧匹配模式，'exhaustive'、'coarse'（由粗到细）、'fft'（整帧频谱共享）或 'binary'（位打包二值匹配）
+        :param match_workers: 模板匹配线程数，None表示使用CPU核心数
+        :param change_sensitivity: 画面变化检测阈值（分块平均灰度差），0表示每次都重新匹配
+        :param capture_source: 截图来源，无参数可调用对象，返回 (RGB截图, 截图左上角的屏幕坐标)；
+                               None表示截取游戏窗口（离线回放等场景使用）
+        :param show_overlay: 是否显示检测框覆盖层，无人值守运行时可关闭以节省CPU
+        :param window_handle: 指定模拟器窗口句柄（多开时由调度进程分配），None表示按 window_title 查找
+        :param pyramid_cache: 共享的只读模板金字塔缓存（多开时由调度进程生成），None表示自行生成
+        :param input_lock: 鼠标操作锁（多开时为跨进程锁，保证同一时刻只有一个实例操作鼠标），None表示不加锁
+        :param adb_device: adb_backend.AdbDevice，指定时通过ADB截图和点击，模拟器窗口无需在前台
+        :param food_recognizer: 食物识别方式，'index' 单次扫描识别面板上的全部食物，'template' 只匹配当前食物的模板
+        :param flight_frames: 飞行记录在内存中保留的最近帧数，超时、出错或按热键时写入debug目录，0表示关闭
+        :param template_cache: 是否使用磁盘上的模板编译缓存（configs/template_cache），关闭时每次启动都重新编译模板
+        :param debug_dir: 飞行记录的转储目录（多开时每个实例使用单独的目录）
         """
+        # 模拟器窗口句柄和客户区位置
+        self.window_title = window_title
+        self.window_handle = window_handle
+        self.game_hwnd = None
+        # 鼠标是全局资源，多开时所有点击和拖动都要先取得该锁
+        self.input_lock = input_lock if input_lock is not None else nullcontext()
+        self.window_rect = None
+        self.window_lost = False  # 指定的窗口当前是否不可用，只在状态变化时输出日志
+
         self.state = CookingState.DETECT_MENU
         self.menu_clicks = 0
         self.finish_clicks = 0
         self.food_clicked = False
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # 多尺度、多模板的 matchTemplate 分发到线程池并行执行，默认使用全部CPU核心
+        self.match_workers = match_workers or os.cpu_count() or 4
+        self.executor = ThreadPoolExecutor(max_workers=self.match_workers)
         self.running = True
         self.food_name = food_name
         self.loop_count = loop_count
@@ -100,30 +142,50 @@ class CookingBot:
         self.foods_dir = os.path.join(self.script_dir, "foods")
 
         # 定义多模板配置
-        self.template_config = {
-            'cook_menu': [
-                'cook_menu.png'
-            ],
-            'cook': [
-                'cook.png'
-            ],
-            'finish': [
-                'finish.png'
-            ],
-            'cook_start': ['cook_start.png'],  # 单模板
-            'food': [f'{food_name}.png', f'{food_name}_1.png'],  # 动态食物模板
-            'back': ['back.png'],
-        }
+        self.template_config = template_config_for(food_name)
+
+        # 优化模板匹配参数：各模板使用的缩放系数，未列出的模板使用默认值
+        self.scale_factors = dict(TEMPLATE_SCALE_FACTORS)
+        # 模板多尺度缓存，在加载模板时生成；多开时使用调度进程共享的缓存，只在本进程补建缺少的键
+        self.shared_templates = pyramid_cache is not None
+        self.pyramid_cache = pyramid_cache if self.shared_templates else TemplatePyramidCache()
+        # 模板编译缓存：预处理后的模板和各尺度版本保存在磁盘上，启动时内存映射读取
+        self.template_store = TemplateStore(
+            os.path.join(self.script_dir, "configs", "template_cache") if template_cache else None,
+            root=self.script_dir
+        )
+        # 按钮位置先验：先在上次命中位置附近搜索，未命中再整帧搜索
+        self.spatial_priors = SpatialPriors(expand=1.0)
+        # 整帧匹配模式：'exhaustive' 原图全尺度搜索，'coarse' 先缩小定位再在原图细化，
+        # 'fft' 每帧只计算一次截图频谱和窗口统计，所有模板、所有尺度共用（结果与 'exhaustive' 相同），
+        # 'binary' 按钮二值图位打包后用popcount匹配并提前放弃（结果与 'exhaustive' 相同，食物仍逐个匹配）
+        self.match_mode = match_mode
+        self.coarse_factor = 0.5
+        # UI缩放校准：按客户区尺寸记录每个模板的最佳缩放系数，之后只搜索其附近的窄带
+        self.scale_calibration = ScaleCalibration(
+            os.path.join(self.script_dir, "configs", "scale_calibration.json")
+        )
+        # 画面变化检测：画面静止时直接复用上次的检测结果
+        self.frame_gate = FrameChangeGate(sensitivity=change_sensitivity)
+        # 飞行记录：最近的截图、检测结果、点击和状态切换只保存在内存中，需要时由后台线程写入debug目录
+        self.flight_recorder = FlightRecorder(debug_dir, capacity=flight_frames)
 
         # 分别存储普通模板和食物模板
         self.templates = self.load_templates()
         self.food_templates = self.load_food_templates()
+        self.food_recognizer = food_recognizer
+        self.food_index = self.load_food_index()
+        self.visible_foods = []  # 最近一次识别到的面板食物 [FoodHit]，坐标为屏幕坐标
+        # 模板目录监视：运行中只重新编译并替换发生变化的模板
+        self.template_watcher = TemplateWatcher([self.btns_dir, self.foods_dir])
 
-        self.overlay = OverlayWindow()
+        # 覆盖层按限定帧率在主循环中重绘，检测时只提交最新结果
+        self.overlay = create_overlay(show_overlay, line_width=5, font_size=12)
 
         keyboard.add_hotkey('ctrl+q', self.stop)
+        keyboard.add_hotkey('ctrl+shift+d', lambda: self.flight_recorder.dump('hotkey', force=True))
         logger.info(f"当前选择的食物: {food_name}")
-        logger.info("按 Ctrl+Q 可以退出程序")
+        logger.info("按 Ctrl+Q 可以退出程序，按 Ctrl+Shift+D 保存最近的画面和检测结果")
 
         # 添加视角旋转相关配置
         self.screen_width = pyautogui.size().width
@@ -139,133 +201,187 @@ class CookingBot:
         self.food_button_pos = None
         self.start_button_pos = None
 
-        # 优化模板匹配参数
-        self.scale_factors = np.arange(0.5, 1.5, 0.1)
+        # 截图来源，None表示截取游戏窗口；使用ADB时截取模拟器原生画面，检测坐标即设备坐标
+        self.adb_device = adb_device
+        if capture_source is None and adb_device is not None:
+            capture_source = adb_device.capture
+        self.capture_source = capture_source
 
         # 优化截图缓存
-        self.last_screenshot = None
-        self.last_screenshot_time = 0
+        self.current_frame = None  # 当前帧预处理上下文，每个状态tick或点击后失效
+        self.recorded_frame = None  # 最近交给飞行记录的帧
 
         self.start_clicks = 0  # 添加开始按钮点击计数器
+        # 点击确认的判定方式统计：按钮区域差异直接判定 / 差异不明确时模板匹配
+        self.click_checks = {'diff': 0, 'match': 0}
+
+        # 视角记忆：累计水平拖动量（像素，按一圈取模），以及上次看到灶台按钮时的拖动量，None表示没有记录
+        self.rotation_offset = 0
+        self.stove_offset = None
+        self.stove_seen_at = 0.0  # 最近一次在记住的视角看到灶台按钮的时间（time.monotonic）
+        self.rotation_stats = {'returns': 0, 'return_hits': 0, 'segments': 0}
 
     def load_food_templates(self):
-        """加载食物彩色模板"""
+        """加载食物彩色模板的各尺度版本（优先使用模板编译缓存），共享缓存中已有时直接使用
+
+        Returns:
+            list: 各食物模板的金字塔
+        """
+        if self.shared_templates and 'food' in self.pyramid_cache:
+            return self.pyramid_cache.get('food')
+
         food_templates = []
         for filename in self.template_config['food']:
             path = os.path.join(self.foods_dir, filename)
-            template = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            levels = self.template_store.pyramid(path, 'bgr', self.get_scale_factors('food'))
 
-            if template is None:
+            if not levels:
                 logger.error(f"无法加载食物模板: {path}")
                 continue
-            food_templates.append(template)
+            food_templates.append(levels)
             logger.debug(f"已加载食物模板: {path}")
+
+        # 只替换食物模板的多尺度缓存
+        self.pyramid_cache.put('food', food_templates)
+        self.template_store.save()
         return food_templates
 
-    def load_templates(self):
-        """加载并预处理普通按钮模板"""
+    def load_templates(self, keys=None):
+        """加载普通按钮模板预处理后的各尺度版本（优先使用模板编译缓存）
+
+        Args:
+            keys: 只加载这些模板键，None表示全部（共享缓存中已有的键直接使用）；
+                  重新加载时某个键的模板全部读取失败（如文件正在写入）则保留原有模板
+
+        Returns:
+            dict: {模板键: 各模板的金字塔}
+        """
         templates = {}
 
         for key, template_files in self.template_config.items():
-            if key == 'food':  # 跳过食物模板，它们会被单独处理
+            if key == 'food' or (keys is not None and key not in keys):  # 跳过食物模板，它们会被单独处理
+                continue
+            if keys is None and self.shared_templates and key in self.pyramid_cache:
+                templates[key] = self.pyramid_cache.get(key)
                 continue
 
             templates[key] = []
             for filename in template_files:
                 path = os.path.join(self.btns_dir, filename)
-                template = cv2.imread(path)
-                if template is None:
+                levels = self.template_store.pyramid(path, 'binary', self.get_scale_factors(key))
+                if not levels:
                     logger.error(f"无法加载模板: {path}")
                     continue
+                templates[key].append(levels)
+                logger.debug(f"已加载模板: {path}")
 
-                processed = self.preprocess_image(template)
-                if processed is not None:
-                    templates[key].append(processed)
-                    logger.debug(f"已加载模板: {path}")
+            # 加载时一次性生成（或从缓存映射）各尺度模板，检测时直接复用
+            if templates[key] or keys is None:
+                self.pyramid_cache.put(key, templates[key])
 
+        self.template_store.save()
         return templates
 
+    def load_food_index(self):
+        """为 foods 目录下的全部图标建立索引，并生成通用卡片原型的多尺度缓存"""
+        food_index = FoodIndex(self.foods_dir, imread=self.template_store.image)
+        if food_index.prototype is not None and 'food_card' not in self.pyramid_cache:
+            self.pyramid_cache.build('food_card', [food_index.prototype], self.get_scale_factors('food_card'))
+        self.template_store.save()
+        return food_index
+
+    def reload_changed_templates(self):
+        """模板目录中有文件新增、修改或删除时，只重新编译并替换受影响的模板（在主循环中每个tick调用）
+
+        替换只发生在本进程：多开时共享缓存中的旧模板由本进程自己的新模板覆盖。
+        """
+        changed = {os.path.normcase(os.path.abspath(path)) for path in self.template_watcher.poll()}
+        if not changed:
+            return
+
+        def affected(directory, filenames):
+            return any(os.path.normcase(os.path.abspath(os.path.join(directory, name))) in changed
+                       for name in filenames)
+
+        keys = [key for key, filenames in self.template_config.items()
+                if key != 'food' and affected(self.btns_dir, filenames)]
+        if keys:
+            self.load_templates(keys)
+        if affected(self.foods_dir, self.template_config['food']):
+            self.pyramid_cache.discard('food')
+            self.food_templates = self.load_food_templates()
+            keys.append('food')
+        foods_dir = os.path.normcase(os.path.abspath(self.foods_dir))
+        if self.food_index is not None and any(os.path.dirname(path) == foods_dir for path in changed):
+            # 食物图标有增删改：重建食物索引和卡片原型
+            self.food_index.load()
+            if self.food_index.prototype is not None:
+                self.pyramid_cache.build('food_card', [self.food_index.prototype], self.get_scale_factors('food_card'))
+                keys.append('food_card')
+            self.template_store.save()
+
+        for key in keys:
+            self.frame_gate.forget(key)  # 缓存的是旧模板的检测结果
+            self.scale_calibration.forget(key)  # 新模板可能需要不同的缩放
+        logger.info(f"模板文件有变化: {', '.join(os.path.basename(path) for path in sorted(changed))}，"
+                    f"已重新加载: {keys or '无'}")
+
+    def get_scale_factors(self, template_name):
+        """获取指定模板使用的缩放系数"""
+        return self.scale_factors.get(template_name, self.scale_factors['default'])
+
+    def recognize_foods(self, frame):
+        """单次扫描食物面板：用通用卡片原型定位全部卡片，再用食物索引识别每张卡片上的食物和格子
+
+        Returns:
+            list[FoodHit]: 检测框为屏幕坐标，同时保存到 visible_foods
+        """
+        cards = self.match_cached('food_card', frame, 'bgr', FOOD_CARD_THRESHOLD)
+        hits = self.food_index.identify(frame.bgr, cards)
+        if len(cards) > 0 and not hits:
+            # 定位到的"卡片"上没有任何食物（如食物面板还没打开时匹配到灶台），
+            # 不是真正的卡片，按它校准的缩放系数也不可信，下次重新做全尺度搜索
+            self.scale_calibration.forget('food_card')
+            self.frame_gate.forget('food_card')
+        self.visible_foods = [hit._replace(box=list(frame.to_screen(np.array([hit.box]))[0])) for hit in hits]
+        return self.visible_foods
+
     def detect_food(self):
         """使用彩色图像检测食物按钮，优先选择左上角的图标"""
         try:
-            screen = np.array(pyautogui.screenshot())
-            screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
-
-            all_matches = []
-            scale_factors = self.scale_factors
+            frame = self.get_frame()
             threshold = 0.8
 
-            for template in self.food_templates:
-                template_matches = []
-
-                for scale in scale_factors:
-                    if scale != 1.0:
-                        scaled_template = cv2.resize(
-                            template,
-                            None,
-                            fx=scale,
-                            fy=scale,
-                            interpolation=cv2.INTER_LINEAR
-                        )
-                    else:
-                        scaled_template = template
-
-                    result = cv2.matchTemplate(
-                        screen_bgr,
-                        scaled_template,
-                        cv2.TM_CCOEFF_NORMED
-                    )
-
-                    locations = np.where(result >= threshold)
-                    h, w = scaled_template.shape[:2]
-
-                    for pt in zip(*locations[::-1]):
-                        template_matches.append([
-                            int(pt[0]),
-                            int(pt[1]),
-                            int(w),
-                            int(h),
-                            float(result[pt[1], pt[0]])
-                        ])
-
-                if template_matches:
-                    # 对单个模板的结果进行NMS
-                    rectangles = np.array(template_matches)
-                    indices = cv2.dnn.NMSBoxes(
-                        rectangles[:, :4].tolist(),
-                        rectangles[:, 4].tolist(),
-                        threshold,
-                        0.4
-                    )
-                    if len(indices) > 0:
-                        best_matches = rectangles[indices.flatten()]
-                        all_matches.extend(best_matches)
-
-            if all_matches:
-                # 对所有匹配结果再次进行NMS
-                rectangles = np.array(all_matches)
-                indices = cv2.dnn.NMSBoxes(
-                    rectangles[:, :4].tolist(),
-                    rectangles[:, 4].tolist(),
-                    threshold,
-                    0.4
-                )
-
-                if len(indices) > 0:
-                    best_matches = rectangles[indices.flatten()]
-
-                    # 按照位置排序（先按y坐标，再按x坐标）
-                    sorted_matches = sorted(best_matches, key=lambda x: (x[1], x[0]))
-
-                    # 只选择最左上角的按钮
-                    selected_match = sorted_matches[0]
-
-                    logger.info(f"[food] 检测到 {len(best_matches)} 个食物按钮，"
-                                f"选择左上角按钮，位置: ({selected_match[0]}, {selected_match[1]})")
-
-                    # 显示和返回左上角的按钮
-                    self.overlay.update_overlay([selected_match])
-                    return [selected_match]
+            hits = None
+            if self.food_recognizer == 'index' and self.food_name in self.food_index.foods:
+                # 单次扫描识别面板上的全部食物，耗时与支持的食物数量基本无关
+                hits = self.recognize_foods(frame)
+                best_matches = [hit.box for hit in hits if hit.name == self.food_name]
+                if not best_matches:
+                    logger.info(f"[food] 食物索引识别到 {len(hits)} 张卡片但没有目标食物，改用模板匹配")
+                    hits = None
+
+            if hits is None:
+                # 先在上次的食物位置附近匹配，对每个模板单独NMS后再整体NMS，并换算为屏幕坐标
+                best_matches = frame.to_screen(self.match_cached(
+                    'food', frame, 'bgr', threshold, per_template_nms=True
+                ))
+            self.record_frame()
+            self.flight_recorder.note('detect', template='food', boxes=best_matches)
+
+            if len(best_matches) > 0:
+                # 按照位置排序（先按y坐标，再按x坐标）
+                sorted_matches = sorted(best_matches, key=lambda x: (x[1], x[0]))
+
+                # 只选择最左上角的按钮
+                selected_match = sorted_matches[0]
+
+                logger.info(f"[food] 检测到 {len(best_matches)} 个食物按钮，"
+                            f"选择左上角按钮，位置: ({selected_match[0]}, {selected_match[1]})")
+
+                # 显示和返回左上角的按钮
+                self.overlay.update_overlay([selected_match])
+                return [selected_match]
 
             logger.info("[food] 未检测到食物按钮")
             self.overlay.update_overlay([])
@@ -275,106 +391,274 @@ class CookingBot:
             logger.error(f"食物按钮检测失败: {e}")
             return []
 
+    def find_game_window(self):
+        """查找标题包含 window_title 的模拟器窗口"""
+        if self.window_handle:
+            # 多开时窗口由调度进程分配，不按标题查找
+            self.game_hwnd = self.window_handle
+            logger.info(f"使用指定的模拟器窗口句柄: {self.window_handle}")
+            return self.update_window_rect()
+
+        windows = []
+
+        def enum_windows_callback(hwnd, windows):
+            if win32gui.IsWindowVisible(hwnd):
+                window_title = win32gui.GetWindowText(hwnd)
+                if window_title:
+                    windows.append((hwnd, window_title))
+            return True
+
+        try:
+            win32gui.EnumWindows(enum_windows_callback, windows)
+        except Exception as e:
+            logger.error(f"枚举窗口失败: {e}")
+            return False
+
+        for hwnd, title in windows:
+            if self.window_title in title:
+                self.game_hwnd = hwnd
+                logger.info(f"找到模拟器窗口: {title}, 窗口句柄: {hwnd}")
+                return self.update_window_rect()
+
+        logger.warning(f"未找到标题包含 {self.window_title} 的窗口，使用全屏截图")
+        self.game_hwnd = None
+        self.window_rect = None
+        return False
+
+    def update_window_rect(self):
+        """更新窗口客户区在屏幕上的位置和大小信息"""
+        if self.game_hwnd:
+            try:
+                client_rect = win32gui.GetClientRect(self.game_hwnd)
+                client_left, client_top = win32gui.ClientToScreen(self.game_hwnd, (0, 0))
+                self.window_rect = (client_left, client_top,
+                                    client_left + client_rect[2], client_top + client_rect[3])
+                return True
+            except Exception as e:
+                logger.error(f"更新窗口位置信息失败: {e}")
+                self.window_rect = None
+                return False
+        return False
+
+    def get_capture_region(self):
+        """获取截图区域 (left, top, right, bottom)，没有可用的模拟器窗口时返回None表示全屏
+
+        指定了窗口句柄时None表示窗口暂时不可用，调用方不应退回全屏，见 window_available。
+        """
+        if not self.window_rect:
+            return None
+        left, top, right, bottom = self.window_rect
+        if right - left <= 0 or bottom - top <= 0:  # 窗口最小化时客户区为空
+            return None
+        return self.window_rect
+
+    def window_available(self):
+        """指定了窗口句柄时，窗口客户区是否可以截图；不可用时重新获取一次窗口位置
+
+        多开时全屏截图会截到其他实例的窗口，检测结果再点到别的实例上，因此绑定窗口后宁可跳过本次tick也不退回全屏截图。
+        没有指定窗口句柄（单开按标题查找）时总是返回True。
+        """
+        if not self.window_handle:
+            return True
+        if not self.get_capture_region():
+            self.update_window_rect()
+        available = self.get_capture_region() is not None
+        if available == self.window_lost:
+            self.window_lost = not available
+            if available:
+                logger.info(f"模拟器窗口已恢复: {self.window_rect}")
+            else:
+                logger.warning("模拟器窗口不可用（最小化或已关闭），暂停检测，等待窗口恢复")
+        return available
+
+    def capture_window_screenshot(self, region=None):
+        """截取模拟器窗口客户区截图
+
+        Args:
+            region: 截图区域 (left, top, right, bottom)，为None时截取全屏
+
+        Returns:
+            np.ndarray: RGB截图（复用缓冲区，下下次截图时被覆盖），失败返回None
+        """
+        try:
+            # 截图写入复用的缓冲区，帧内检测只读取，不需要复制
+            return default_capture().grab(region, 'rgb')
+        except Exception as e:
+            logger.error(f"截图失败: {e}")
+            return None
+
+    def get_frame(self):
+        """获取当前帧的预处理上下文，同一帧内的所有检测共享截图和预处理结果
+
+        只截取模拟器窗口客户区，帧内检测得到的坐标通过 frame.to_screen 换算回屏幕坐标。
+        """
+        if self.current_frame is not None:
+            return self.current_frame
+        if self.capture_source is not None:
+            screen, offset = self.capture_source()
+            self.current_frame = FrameContext(screen, offset=offset)
+        else:
+            region = self.get_capture_region()
+            if region is None and self.window_handle:
+                # 指定的窗口不可用时不截全屏（会截到其他实例的窗口），返回空帧并重新获取窗口位置
+                self.update_window_rect()
+                screen = None
+            else:
+                screen = self.capture_window_screenshot(region)
+            if screen is None and region:
+                if self.window_handle:
+                    self.update_window_rect()
+                else:
+                    # 单开时窗口截图失败退回全屏截图
+                    region = None
+                    screen = self.capture_window_screenshot()
+            offset = region[:2] if region else (0, 0)
+            self.current_frame = FrameContext(screen, offset=offset)
+        return self.current_frame
+
+    def record_frame(self):
+        """把当前帧交给飞行记录，同一帧只记录一次
+
+        只在检测按钮、食物时调用，点击后 wait_until 轮询的截图不记录，飞行记录不增加轮询的开销。
+        """
+        frame = self.current_frame
+        if frame is not None and frame is not self.recorded_frame:
+            self.recorded_frame = frame
+            self.flight_recorder.record_frame(frame.rgb, frame.offset, self.state.name)
+
+    def invalidate_frame(self):
+        """使当前帧失效，下次检测重新截图（新的状态tick开始或点击之后调用）"""
+        self.current_frame = None
+
     def get_screenshot(self):
-        """获取屏幕截图，带缓存"""
-        current_time = time.time()
-        if (self.last_screenshot is None or
-                current_time - self.last_screenshot_time >= 0.1):  # 直接使用固定值0.1
-            self.last_screenshot = np.array(pyautogui.screenshot())
-            self.last_screenshot_time = current_time
-        return self.last_screenshot
+        """获取当前帧的屏幕截图（RGB）"""
+        return self.get_frame().rgb
+
+    def match_templates(self, template_name, frame, kind, threshold, per_template_nms=False, scales=None):
+        """按当前匹配模式在整帧上匹配模板
+
+        Args:
+            template_name: 模板键
+            frame: FrameContext
+            kind: 使用的图像类型，'binary'（按钮）或 'bgr'（食物）
+            scales: 只搜索这些缩放系数，None表示全部尺度
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        screen = getattr(frame, kind)
+        template_pyramids = filter_levels(self.pyramid_cache.get(template_name), scales)
+        if self.match_mode == 'coarse':
+            coarse_pyramids = filter_levels(self.pyramid_cache.get_coarse(template_name, self.coarse_factor), scales)
+            return match_pyramids_coarse_to_fine(
+                screen, frame.downscaled(self.coarse_factor, kind), template_pyramids, coarse_pyramids,
+                self.coarse_factor, threshold, per_template_nms, executor=self.executor
+            )
+        if self.match_mode == 'fft':
+            return match_pyramids_spectrum(frame.spectrum(kind), template_pyramids, threshold, per_template_nms,
+                                           executor=self.executor)
+        if self.match_mode == 'binary' and kind == 'binary':
+            return match_pyramids_bits(frame.packed_binary, template_pyramids, threshold, per_template_nms,
+                                       executor=self.executor)
+        return match_pyramids(screen, template_pyramids, threshold, per_template_nms, executor=self.executor)
+
+    def match_cached(self, template_name, frame, kind, threshold, per_template_nms=False):
+        """检测模板：画面与上次检测时相比没有变化时直接复用上次的结果
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        cached = self.frame_gate.lookup(template_name, frame)
+        if cached is not None:
+            return cached
+
+        boxes = self.match_with_prior(template_name, frame, kind, threshold, per_template_nms)
+        self.frame_gate.store(template_name, frame, boxes)
+        return boxes
+
+    def match_with_prior(self, template_name, frame, kind, threshold, per_template_nms=False):
+        """先在上次命中位置附近匹配，数量不足时回退到整帧搜索
+
+        已完成UI缩放校准的模板只搜索校准尺度附近的窄带。
+
+        Returns:
+            np.ndarray: 检测框 [x, y, w, h, conf]，坐标相对于截图
+        """
+        height, width = frame.shape[:2]
+        if self.scale_calibration.set_size(width, height):
+            # 客户区尺寸变化后按钮位置全部失效，缩放改用该尺寸下的校准结果
+            logger.info(f"客户区尺寸: {self.scale_calibration.size_key}")
+            self.spatial_priors.forget()
+
+        template_pyramids = self.pyramid_cache.get(template_name)
+        scales = self.scale_calibration.select(template_name, template_pyramids)
+
+        region = self.spatial_priors.search_region(template_name, frame.shape)
+        if region is not None:
+            # 只处理先验区域：二值图只对该区域做二值化，先验命中时整帧不需要二值化
+            x0, y0, x1, y1 = region
+            boxes = match_pyramids(frame.crop(kind, region), filter_levels(template_pyramids, scales),
+                                   threshold, per_template_nms, executor=self.executor)
+            if self.spatial_priors.accept(template_name, boxes):
+                boxes[:, 0] += x0
+                boxes[:, 1] += y0
+                self.spatial_priors.remember(template_name, boxes, full_frame=False)
+                self.scale_calibration.observe(template_name, boxes, template_pyramids)
+                return boxes
+
+        boxes = self.match_templates(template_name, frame, kind, threshold, per_template_nms, scales)
+        self.spatial_priors.remember(template_name, boxes)
+        self.scale_calibration.observe(template_name, boxes, template_pyramids)
+        return boxes
+
+    def log_detection_stats(self):
+        """输出位置先验命中率和画面静止跳过率"""
+        summary = self.spatial_priors.summary()
+        if summary:
+            logger.info(f"位置先验命中率: {summary}")
+        summary = self.frame_gate.summary()
+        if summary:
+            logger.info(f"画面静止跳过匹配: {summary}")
+        if self.overlay.updates:
+            logger.info(f"覆盖层: 提交 {self.overlay.updates} 次, 重绘 {self.overlay.redraws} 次")
+        if self.rotation_stats['returns'] or self.rotation_stats['segments']:
+            logger.info(f"视角旋转: 直接回到灶台视角 {self.rotation_stats['returns']} 次"
+                        f"（找到 {self.rotation_stats['return_hits']} 次）, 分段旋转 {self.rotation_stats['segments']} 段")
+        if any(self.click_checks.values()):
+            logger.info(f"点击确认: 区域差异判定 {self.click_checks['diff']} 次, "
+                        f"模板匹配 {self.click_checks['match']} 次")
 
     def detect_buttons(self, template_name, threshold=0.7):
         """添加调试信息的按钮检测"""
         try:
-            if template_name == 'cook':
-                # cook按钮使用更快的检测参数
-                self.scale_factors = np.arange(0.9, 1.1, 0.1)
-                threshold = 0.5
-            else:
-                self.scale_factors = np.arange(0.8, 1.2, 0.1)
-                threshold = 0.6
+            threshold = self.button_threshold(template_name)
 
             if template_name == 'food':
                 return self.detect_food()
 
-            screen = self.get_screenshot()
-            if screen is None:
+            frame = self.get_frame()
+            if frame.rgb is None:
                 logger.error("获取屏幕截图失败")
                 return []
 
-            screen_bgr = cv2.cvtColor(screen, cv2.COLOR_RGB2BGR)
-            screen_processed = self.preprocess_image(screen_bgr)
-
-            # 保存处理后的截图用于调试
-            cv2.imwrite('./debug/debug_screen.png', screen_processed)
-
-            template_list = self.templates.get(template_name, [])
-            if not template_list:
+            # 同一帧的二值化结果（frame.binary）在多个模板检测之间共享，
+            # 截图和检测结果记录在飞行记录中，不再每次检测都写调试图像
+            if not self.pyramid_cache.get(template_name):
                 logger.error(f"没有找到模板: {template_name}")
                 return []
 
-            all_matches = []
-
-            for idx, template in enumerate(template_list):
-                # 保存处理后的模板用于调试
-                cv2.imwrite(f'./debug/debug_template_{template_name}_{idx}.png', template)
-
-                template_matches = []
+            # 先在上次命中位置附近匹配，未命中再整帧搜索，结果换算为屏幕坐标
+            best_matches = frame.to_screen(self.match_cached(
+                template_name, frame, 'binary', threshold
+            ))
+            self.record_frame()
+            self.flight_recorder.note('detect', template=template_name, boxes=best_matches)
 
-                for scale in self.scale_factors:
-                    if scale != 1.0:
-                        scaled_template = cv2.resize(
-                            template,
-                            None,
-                            fx=scale,
-                            fy=scale,
-                            interpolation=cv2.INTER_LINEAR
-                        )
-                    else:
-                        scaled_template = template
-
-                    result = cv2.matchTemplate(
-                        screen_processed,
-                        scaled_template,
-                        cv2.TM_CCOEFF_NORMED
-                    )
-
-                    # 输出最大匹配值
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                    logger.debug(f"模板 {template_name}_{idx} 在缩放 {scale:.2f} 下的最大匹配值: {max_val:.3f}")
-
-                    locations = np.where(result >= threshold)
-                    h, w = scaled_template.shape[:2]
-
-                    for pt in zip(*locations[::-1]):
-                        template_matches.append([
-                            int(pt[0]),
-                            int(pt[1]),
-                            int(w),
-                            int(h),
-                            float(result[pt[1], pt[0]])
-                        ])
-
-                if template_matches:
-                    all_matches.extend(template_matches)
-
-            # 对所有匹配结果进行NMS，使用固定阈值0.4
-            if all_matches:
-                rectangles = np.array(all_matches)
-                indices = cv2.dnn.NMSBoxes(
-                    rectangles[:, :4].tolist(),
-                    rectangles[:, 4].tolist(),
-                    threshold,
-                    0.4  # 直接使用固定值
-                )
-
-                if len(indices) > 0:
-                    best_matches = rectangles[indices.flatten()]
-                    logger.debug(f"[{template_name}] 检测到 {len(best_matches)} 个按钮"
-                                 f"置信度: {[f'{match[4]:.2f}' for match in best_matches]}")
-                    self.overlay.update_overlay(best_matches)
-                    return best_matches.tolist()
+            if len(best_matches) > 0:
+                logger.debug(f"[{template_name}] 检测到 {len(best_matches)} 个按钮"
+                             f"置信度: {[f'{match[4]:.2f}' for match in best_matches]}")
+                self.overlay.update_overlay(best_matches)
+                return best_matches.tolist()
 
             logger.debug(f"[{template_name}] 未检测到按钮")
             self.overlay.update_overlay([])
@@ -384,50 +668,37 @@ class CookingBot:
             logger.error(f"按钮检测失败: {e}")
             return []
 
-    def process_scale(self, screen, template, scale, threshold):
-        """优化的单一尺度处理"""
-        try:
-            if scale != 1.0:
-                scaled_template = cv2.resize(
-                    template,
-                    None,
-                    fx=scale,
-                    fy=scale,
-                    interpolation=cv2.INTER_LINEAR
-                )
-            else:
-                scaled_template = template
-
-            result = cv2.matchTemplate(
-                screen,
-                scaled_template,
-                cv2.TM_CCOEFF_NORMED
-            )
-
-            locations = np.where(result >= threshold)
-            h, w = scaled_template.shape[:2]
-
-            matches = []
-            for pt in zip(*locations[::-1]):
-                matches.append([
-                    int(pt[0]),
-                    int(pt[1]),
-                    int(w),
-                    int(h),
-                    float(result[pt[1], pt[0]])
-                ])
+    def mouse_click(self, x, y, double_click=False):
+        """点击指定屏幕坐标，点击后画面会变化，因此同时使当前帧失效
 
-            return matches
-
-        except Exception as e:
-            logger.error(f"尺度处理失败: {e}")
-            return []
+        Args:
+            x: 鼠标x坐标
+            y: 鼠标y坐标
+            double_click: 是否连续点击两次
+        """
+        if self.adb_device is not None:
+            self.adb_device.tap(x, y)
+            if double_click:
+                self.adb_device.tap(x, y)
+        else:
+            with self.input_lock:
+                pyautogui.click(x, y)
+                if double_click:
+                    pyautogui.click(x, y)
+        self.flight_recorder.note('click', x=x, y=y, double_click=double_click)
+        self.invalidate_frame()
 
     def set_food(self, food_name):
         """更改要制作的食物"""
         self.food_name = food_name
         self.template_config['food'] = [f'{food_name}.png', f'{food_name}_1.png']
-        self.templates = self.load_templates()  # 重新加载有模板
+        self.pyramid_cache.discard('food')  # 共享缓存中的是旧食物，在本进程重新生成
+        self.food_templates = self.load_food_templates()  # 只重新加载食物模板及其多尺度缓存
+        self.spatial_priors.forget('food')  # 新食物的位置需要重新搜索
+        self.scale_calibration.forget('food')  # 新食物图标需要重新校准缩放
+        self.frame_gate.forget('food')  # 缓存的是旧食物的检测结果
+        if self.food_index is not None and food_name not in self.food_index.foods:
+            self.food_index.load()  # foods 目录中新增了图标
         logger.info(f"已更改食物为: {food_name}")
 
     def get_available_foods(self):
@@ -443,21 +714,7 @@ class CookingBot:
     def preprocess_image(self, image):
         """简化的图像预处理方法"""
         try:
-            # 转换为灰度图
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-            # 应用简单的高斯模糊去噪
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-
-            # 自适应阈值分割
-            thresh = cv2.adaptiveThreshold(
-                blurred, 255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY,
-                11, 2
-            )
-
-            return thresh
+            return preprocess_binary(image)
 
         except Exception as e:
             logger.error(f"图像预处理失败: {e}")
@@ -474,12 +731,10 @@ class CookingBot:
                     cook_buttons[0])
                 x, y, w, h, conf = cook_button
 
-                # 立即点击,不等待
+                # 立即点击,不等待（按钮刚在当前帧检测到）
                 center_x = int(x + w // 2)
                 center_y = int(y + h // 2)
-                time.sleep(0.1)
-                pyautogui.click(center_x, center_y)
-                pyautogui.click(center_x, center_y)
+                self.mouse_click(center_x, center_y, double_click=True)
                 logger.info(f"点击cook按钮 位置: ({center_x}, {center_y})")
 
                 self.cook_clicks += 1
@@ -500,86 +755,136 @@ class CookingBot:
         return False
 
 
-    def rotate_view(self):
-        """优化的视角旋转和按钮检测"""
-        try:
-            logger.info(f"开始旋转视角检测，当前菜单点击次数: {self.menu_clicks}")
-
-
-
-            # 获取窗口中心点
-            screen_width, screen_height = pyautogui.size()
-            center_x = screen_width // 2
-            center_y = screen_height // 2
-
-            # 计算偏右上的位置
-            rotate_x = center_x + 200
-            rotate_y = center_y - 200
-
-            rotation_distance = 800  # 每次旋转的水平距离（像素）
-
-            # 分段旋转,每段都检测按钮
-            segment_distance = rotation_distance // 4
-            mouse_is_down = False  # 跟踪鼠标状态
-
-            for i in range(4):
+    def view_center(self):
+        """拖动视角使用的画面中心（屏幕坐标，ADB时为设备坐标），找到模拟器窗口时以其客户区为准"""
+        region = self.get_capture_region()
+        if self.adb_device is not None:
+            screen_width, screen_height = self.adb_device.screen_size()
+            return screen_width // 2, screen_height // 2
+        if region:
+            left, top, right, bottom = region
+            return (left + right) // 2, (top + bottom) // 2
+        screen_width, screen_height = pyautogui.size()
+        return screen_width // 2, screen_height // 2
+
+    def drag_view(self, distance):
+        """在画面中心偏上的位置按住鼠标水平拖动 distance 像素（负数反向），速度与分段旋转相同，并累计到 rotation_offset"""
+        if self.adb_device is None and not self.window_available():
+            # 指定的窗口不可用时不拖动，否则会按全屏中心拖到其他实例的窗口上
+            return
+        center_x, center_y = self.view_center()
+        start_x = center_x - distance // 2
+        start_y = center_y - 200
+        duration = ROTATION_DRAG_TIME * abs(distance) / ROTATION_SEGMENT_DISTANCE
+        if self.adb_device is not None:
+            # ADB直接滑动，不占用鼠标
+            self.adb_device.swipe(start_x, start_y, start_x + distance, start_y, int(duration * 1000))
+        else:
+            # 整段拖动期间独占鼠标
+            with self.input_lock:
+                pyautogui.moveTo(start_x, start_y)
+                pyautogui.mouseDown(button='left')
                 try:
-
-                    # 旋转前检测cook按钮
-                    if self.click_cook():
-                        return True
-
-                    logger.info(f"第 {i + 1}/4 段旋转")
-                    # 移动到起始位置
-                    pyautogui.moveTo(rotate_x, rotate_y)
-                    pyautogui.mouseDown(button='left')
-                    mouse_is_down = True
-
-                    # 缓慢旋转一段距离
-                    pyautogui.moveRel(segment_distance, 0, duration=0.1)
+                    pyautogui.moveRel(distance, 0, duration=duration)
+                finally:
                     pyautogui.mouseUp(button='left')
-                    mouse_is_down = False
+        self.rotation_offset = (self.rotation_offset + distance) % ROTATION_CIRCLE
+        self.invalidate_frame()
+
+    def rotation_distance(self, offset):
+        """从当前视角转到 offset 的最短拖动距离（带方向）"""
+        distance = (offset - self.rotation_offset) % ROTATION_CIRCLE
+        return distance - ROTATION_CIRCLE if distance > ROTATION_CIRCLE // 2 else distance
+
+    def sweep_count(self, template_name):
+        """旋转过程中的快速检查：在缩小 coarse_factor 倍的二值图上用较低阈值匹配，返回候选按钮数量"""
+        frame = self.get_frame()
+        threshold = self.button_threshold(template_name) - COARSE_THRESHOLD_MARGIN
+        coarse_pyramids = self.pyramid_cache.get_coarse(template_name, self.coarse_factor)
+        return len(match_pyramids(frame.downscaled(self.coarse_factor, 'binary'), coarse_pyramids, threshold,
+                                  executor=self.executor))
+
+    def stoves_visible(self):
+        """快速检查画面中是否有灶台：菜单按钮或完成按钮任一出现即可"""
+        return self.sweep_count('cook_menu') > 0 or self.sweep_count('finish') > 0
+
+    def remember_stoves(self):
+        """记录当前视角能看到灶台按钮"""
+        if self.stove_offset != self.rotation_offset:
+            logger.debug(f"记录灶台视角: 旋转量 {self.rotation_offset}")
+        self.stove_offset = self.rotation_offset
+        self.stove_seen_at = time.monotonic()
+
+    def stoves_in_view(self):
+        """拖动视角后检查当前状态需要的按钮是否出现：快速检查到足够的候选后才完整检测，找到时记住当前视角"""
+        if self.state == CookingState.DETECT_MENU:
+            # 第一次必须检测到3个菜单按钮，之后只要检测到按钮即可
+            template_name, needed = 'cook_menu', 3 if self.menu_clicks == 0 else 1
+        elif self.state == CookingState.DETECT_FINISH:
+            template_name, needed = 'finish', 1
+        else:
+            time.sleep(ROTATION_SETTLE)
+            return False
 
-                    # 等待画面完全稳定
-                    time.sleep(0.3)
+        # 拖动后画面可能还在移动，等到快速检查发现足够的候选为止
+        if not self.wait_until(lambda: self.sweep_count(template_name) >= needed, timeout=ROTATION_SETTLE):
+            return False
+        for attempt in range(2):
+            if attempt > 0:
+                self.invalidate_frame()  # 重试时使用新截图
+            buttons = self.detect_buttons(template_name)
+            logger.info(f"旋转检测第 {attempt + 1} 次: 检测到 {len(buttons)} 个按钮")
+            if len(buttons) >= needed:
+                logger.info(f"=== 检测到 {len(buttons)} 个{template_name}按钮，已点击菜单 {self.menu_clicks} 次，"
+                            f"停止旋转 ===")
+                self.remember_stoves()
+                return True
+        return False
 
-                    # 检测按钮
-                    if self.state == CookingState.DETECT_MENU:
-                        # 多次尝试检测菜单按钮
-                        for attempt in range(2):
-                            menu_buttons = self.detect_buttons('cook_menu')
-                            logger.info(f"旋转检测第 {attempt + 1} 次: 检测到 {len(menu_buttons)} 个按钮")
-                            if menu_buttons:
-                                if self.menu_clicks == 0:
-                                    # 第一次必须检测到3个按钮
-                                    if len(menu_buttons) >= 3:
-                                        logger.info(f"=== 首次检测到 {len(menu_buttons)} 个菜单按钮，停止旋转 ===")
-                                        return True
-                                    else:
-                                        logger.info("首次检测未满3个按钮，继续旋转")
-                                        continue
-                                else:
-                                    # 后续只要检测到按钮就停止旋转
-                                    logger.info(
-                                        f"=== 检测到 {len(menu_buttons)} 个菜单按钮，已点击 {self.menu_clicks} 次，停止旋转 ===")
-                                    return True
-                            time.sleep(0.3)
+    def rotate_view(self):
+        """旋转视角寻找灶台按钮
 
-                    elif self.state == CookingState.DETECT_FINISH:
-                        finish_buttons = self.detect_buttons('finish')
-                        if finish_buttons and len(finish_buttons) > 0:
-                            return True
+        记录了上次看到灶台的视角时先沿较短方向一次拖回该视角，菜单按钮或完成按钮任一出现即认为灶台在画面中；
+        finish状态下已经在灶台视角时不再旋转（完成按钮还没出现只是菜品还在烹饪）。
+        没有记录或该视角看不到灶台时再分段旋转一圈，每段拖动后只做快速检查，候选按钮足够时才完整检测。
+        """
+        try:
+            logger.info(f"开始旋转视角检测，当前菜单点击次数: {self.menu_clicks}")
 
-                    # 继续下一段旋转前的等待
-                    if i < 3:
-                        time.sleep(0.3)
+            if self.stove_offset is not None:
+                distance = self.rotation_distance(self.stove_offset)
+                if distance:
+                    logger.info(f"回到上次看到灶台的视角: 拖动 {distance} 像素")
+                    self.rotation_stats['returns'] += 1
+                    self.drag_view(distance)
+                if self.wait_until(self.stoves_visible, timeout=ROTATION_SETTLE):
+                    self.stove_seen_at = time.monotonic()
+                    if distance:
+                        self.rotation_stats['return_hits'] += 1
+                    if self.stoves_in_view():
+                        return True
+                    if self.state == CookingState.DETECT_FINISH:
+                        logger.info("灶台在画面中，完成按钮还没出现，不旋转")
+                        return False
+                elif (self.state == CookingState.DETECT_FINISH and self.finish_clicks < self.start_clicks
+                      and time.monotonic() - self.stove_seen_at < ROTATION_MEMORY_TIMEOUT):
+                    # 灶台都在烹饪时只有进度条，没有可匹配的按钮，保留记住的视角
+                    logger.info("菜品还在烹饪，保持在记住的灶台视角")
+                    return False
+                else:
+                    logger.info("记住的视角看不到菜单按钮和完成按钮，分段旋转寻找")
+                    self.stove_offset = None
 
-                except Exception as e:
-                    logger.error(f"旋转过程中出错: {e}")
-                    if mouse_is_down:
-                        pyautogui.mouseUp(button='left')
-                        mouse_is_down = False
-                    raise
+            for i in range(ROTATION_SEGMENTS):
+                # 旋转前检测cook按钮
+                if self.click_cook():
+                    return True
+
+                logger.info(f"第 {i + 1}/{ROTATION_SEGMENTS} 段旋转")
+                self.rotation_stats['segments'] += 1
+                self.drag_view(ROTATION_SEGMENT_DISTANCE)
+                if self.stoves_in_view():
+                    return True
 
             return True
 
@@ -588,27 +893,33 @@ class CookingBot:
             return False
 
         finally:
-            # 确保在任何情况下都释放鼠标
-            try:
-                pyautogui.mouseUp(button='left')
-            except:
-                pass
+            # 确保在任何情况下都释放鼠标（ADB滑动不占用鼠标，无需释放）
+            if self.adb_device is None:
+                try:
+                    with self.input_lock:
+                        pyautogui.mouseUp(button='left')
+                except:
+                    pass
 
 
     def reset_rotation(self):
         """重置旋转计数"""
         self.current_rotations = 0
-        # 确保鼠标左键被释放
-        pyautogui.mouseUp(button='left')
+        # 确保鼠标左键被释放（ADB模式不占用鼠标）
+        if self.adb_device is None:
+            with self.input_lock:
+                pyautogui.mouseUp(button='left')
 
 
     def safe_exit(self):
         """安全退出，确保释放所有按键"""
         try:
-            pyautogui.mouseUp(button='left')
+            if self.adb_device is None:
+                with self.input_lock:
+                    pyautogui.mouseUp(button='left')
             keyboard.unhook_all()
             self.executor.shutdown()
-            self.overlay.root.destroy()
+            self.overlay.close()
             logger.info("程序已安全退出")
         except Exception as e:
             logger.error(f"退出时发生错误: {e}")
@@ -625,9 +936,95 @@ class CookingBot:
         return (datetime.now() - self.state_start_time).total_seconds() > self.timeout
 
 
+    def button_threshold(self, template_name):
+        """按钮模板使用的匹配阈值"""
+        if template_name == 'cook':
+            # cook按钮使用更快的检测参数
+            return 0.5
+        return 0.6
+
+    def wait_until(self, condition, timeout, poll=0.05):
+        """轮询等待界面变化，条件满足时立即返回，取代点击后的固定等待
+
+        每次轮询前使当前帧失效，condition 中的检测都基于新截图。至少检查两次：
+        第一次截图可能早于界面响应，检测较慢时单次检查就会耗尽 timeout。
+
+        Args:
+            condition: 无参数的检查函数，返回真值表示界面已经变化
+            timeout: 最长等待时间（秒）
+            poll: 轮询间隔（秒）
+
+        Returns:
+            condition 最后一次的返回值，超时时为假值
+        """
+        deadline = time.perf_counter() + timeout
+        checks = 0
+        while True:
+            self.invalidate_frame()
+            result = condition()
+            checks += 1
+            remaining = deadline - time.perf_counter()
+            if result or (remaining <= 0 and checks >= 2):
+                return result
+            time.sleep(min(poll, max(remaining, 0)))
+
+    def roi_present(self, template_name, button, padding=0.5):
+        """只在按钮原位置附近检查模板是否仍然存在，只匹配一个尺度的小区域，也只二值化该区域，比整帧检测便宜得多
+
+        Args:
+            button: 屏幕坐标的检测框 [x, y, w, h, conf]
+            padding: 搜索区域四周扩展的距离，以按钮最大边长为单位
+        """
+        frame = self.get_frame()
+        if frame.rgb is None:
+            return False
+        template_pyramids = levels_for_box(self.pyramid_cache.get(template_name), button)
+        threshold = self.button_threshold(template_name)
+        # 按钮通常还在原处：先只搜索原位置附近 ROI_JITTER 像素，找不到再搜索扩展区域
+        for pad in (ROI_JITTER, int(max(button[2], button[3]) * padding) + 1):
+            boxes = match_pyramids(frame.binary_region(frame.region(button, pad)), template_pyramids, threshold)
+            if len(boxes) > 0:
+                return True
+        return False
+
+    def roi_snapshot(self, button):
+        """截取按钮区域的灰度图（只转换该区域），用于点击后判断该区域是否变化"""
+        frame = self.get_frame()
+        return frame.crop('gray', frame.region(button)).copy()
+
+    def roi_changed(self, button, snapshot, threshold=8.0):
+        """按钮区域与快照相比的平均灰度差是否超过阈值"""
+        frame = self.get_frame()
+        current = frame.crop('gray', frame.region(button))
+        if current.shape != snapshot.shape:
+            return True
+        return current.size > 0 and float(cv2.absdiff(current, snapshot).mean()) > threshold
+
+    def button_gone(self, template_name, button, snapshot):
+        """点击后按钮是否已经消失：先比较按钮区域与点击前快照的归一化差异，判断不了时才在原位置附近匹配模板"""
+        frame = self.get_frame()
+        diff = roi_difference(snapshot, frame.crop('gray', frame.region(button)))
+        if diff is not None and (diff <= CLICK_DIFF_SAME or diff >= CLICK_DIFF_GONE):
+            self.click_checks['diff'] += 1
+            return diff >= CLICK_DIFF_GONE
+        self.click_checks['match'] += 1
+        return not self.roi_present(template_name, button)
+
+    def confirm_click(self, template_name, button, snapshot, timeout):
+        """等待点击的按钮消失，返回是否消失
+
+        Args:
+            button: 屏幕坐标的检测框 [x, y, w, h, conf]
+            snapshot: 点击前的 roi_snapshot(button)
+        """
+        gone = self.wait_until(lambda: self.button_gone(template_name, button, snapshot), timeout=timeout)
+        self.flight_recorder.note('confirm', template=template_name, box=list(button), gone=bool(gone))
+        return gone
+
     def handle_timeout(self):
         """处理超时情况"""
         if (datetime.now() - self.state_start_time).seconds >= self.timeout:
+            self.flight_recorder.dump('timeout')
             if self.retry_count < self.max_retries:
                 self.retry_count += 1
                 logger.warning(f"状态 {self.state} 超时，第 {self.retry_count} 次重试")
@@ -642,6 +1039,7 @@ class CookingBot:
     def change_state(self, new_state):
         """切换状态"""
         logger.info(f"状态切换: {self.state} -> {new_state}, 当前菜单点击次数: {self.menu_clicks}")
+        self.flight_recorder.note('state', old=self.state.name, new=new_state.name)
         self.state = new_state
         self.reset_state_timer()
 
@@ -651,10 +1049,6 @@ class CookingBot:
         try:
             if self.click_cook():
                 return 
-            
-            # 保存调试图像
-            os.makedirs('debug', exist_ok=True)
-            self.save_debug_images('cook_menu')
 
             menu_buttons = self.detect_buttons('cook_menu')
             logger.info(f"检测到 {len(menu_buttons)} 个菜单按钮")
@@ -665,6 +1059,7 @@ class CookingBot:
 
             if len(menu_buttons) == 3 and self.menu_clicks == 0:
                 logger.info("=== 检测到3个菜单按钮，开始点击流程 ===")
+                self.remember_stoves()
                 self.reset_rotation()
                 self.change_state(CookingState.CLICK_MENU)
                 return
@@ -700,6 +1095,7 @@ class CookingBot:
 
         except Exception as e:
             logger.error(f"处理菜单检测状态时出错: {e}")
+            self.flight_recorder.dump('error')
             if not self.handle_timeout():
                 raise Exception("菜单检测状态处理超时")
 
@@ -718,10 +1114,11 @@ class CookingBot:
                 center_x = int(x + w // 2)
                 center_y = int(y + h // 2)
 
-                pyautogui.click(center_x, center_y)
-                pyautogui.click(center_x, center_y)  # 双击确保选中
+                before = self.roi_snapshot(self.food_button_pos)
+                self.mouse_click(center_x, center_y, double_click=True)  # 双击确保选中
                 logger.info(f"点击食物按钮位置: ({center_x}, {center_y})")
-                time.sleep(0.3)
+                # 等待食物图标出现选中效果
+                self.wait_until(lambda: self.roi_changed(self.food_button_pos, before), timeout=0.3)
 
                 # 首次检测并保存开始按钮位置
                 if not self.start_button_pos:
@@ -756,6 +1153,7 @@ class CookingBot:
             if str(e) == "完成所有操作":
                 raise
             logger.error(f"处理食物状态时出错: {e}")
+            self.flight_recorder.dump('error')
             if not self.handle_timeout():
                 raise Exception("食物状态处理超时")
 
@@ -775,14 +1173,13 @@ class CookingBot:
                 center_x = int(x + w // 2)
                 center_y = int(y + h // 2)
 
-                pyautogui.click(center_x, center_y)
-                pyautogui.click(center_x, center_y)
+                start_button = self.start_button_pos
+                before = self.roi_snapshot(start_button)
+                self.mouse_click(center_x, center_y, double_click=True)
                 logger.info(f"点击开始按钮位置: ({center_x}, {center_y})")
-                time.sleep(1)
 
-                # 验证点击是否成功
-                start_buttons = self.detect_buttons('cook_start', threshold=0.5)
-                if not start_buttons or len(start_buttons) == 0:
+                # 验证点击是否成功：等待开始按钮消失（比较按钮区域，判断不了时才匹配模板）
+                if self.confirm_click('cook_start', start_button, before, timeout=1.0):
                     logger.info("开始按钮点击成功（按钮消失）")
                     # 增加开始按钮点击计数
                     self.start_clicks += 1
@@ -809,9 +1206,10 @@ class CookingBot:
                             center_x = int(x + w // 2)
                             center_y = int(y + h // 2)
 
-                            pyautogui.click(center_x, center_y)
+                            before = self.roi_snapshot(back_button)
+                            self.mouse_click(center_x, center_y)
                             logger.info(f"点击back按钮 位置: ({center_x}, {center_y})")
-                            time.sleep(0.5)
+                            self.confirm_click('back', back_button, before, timeout=0.5)
 
                             # 直接进入finish状态并设置标记以结束程序
                             logger.warning("检测到back按钮，本轮结束后将停止程序")
@@ -832,6 +1230,7 @@ class CookingBot:
 
         except Exception as e:
             logger.error(f"处理开始状态时出错: {e}")
+            self.flight_recorder.dump('error')
             if not self.handle_timeout():
                 raise Exception("开始状态处理超时")
 
@@ -850,14 +1249,12 @@ class CookingBot:
                     finish_button = finish_buttons[0].tolist() if isinstance(finish_buttons[0], np.ndarray) else list(
                         finish_buttons[0])
                     x, y, w, h, _ = finish_button
-                    pyautogui.click(int(x + w // 2), int(y + h // 2))
-                    pyautogui.click(int(x + w // 2), int(y + h // 2))
+                    before = self.roi_snapshot(finish_button)
+                    self.mouse_click(int(x + w // 2), int(y + h // 2), double_click=True)
                     logger.info(f"点击遗留的finish按钮")
-                    time.sleep(0.5)
 
-                    # 验证点击结果
-                    verify_buttons = self.detect_buttons('finish')
-                    if not verify_buttons or len(verify_buttons) < len(finish_buttons):
+                    # 验证点击结果：等待该finish按钮消失
+                    if self.confirm_click('finish', finish_button, before, timeout=0.5):
                         logger.info("遗留finish按钮点击成功（按钮消失）")
                     else:
                         logger.warning("遗留finish按钮点击可能未生效")
@@ -880,13 +1277,11 @@ class CookingBot:
                             center_y = int(y + h // 2)
 
                             logger.info(f"点击finish按钮 位置: ({center_x}, {center_y}), 置信度: {conf:.2f}")
-                            pyautogui.click(center_x, center_y)
-                            pyautogui.click(center_x, center_y)
-                            time.sleep(0.5)  # 点击后短暂等待
+                            before = self.roi_snapshot(button_data)
+                            self.mouse_click(center_x, center_y, double_click=True)
 
-                            # 验证点击结果
-                            verify_buttons = self.detect_buttons('finish')
-                            if not verify_buttons or len(verify_buttons) < len(finish_buttons):
+                            # 验证点击结果：等待该finish按钮消失
+                            if self.confirm_click('finish', button_data, before, timeout=0.5):
                                 logger.info("finish按钮点击成功（按钮消失）")
                                 self.finish_clicks += 1
                                 logger.info(f"当前finish点击次数: {self.finish_clicks}")
@@ -912,7 +1307,7 @@ class CookingBot:
                                 f"旋转后仍未找到足够的finish按钮（当前: {len(finish_buttons)}，需要: {self.start_clicks}），继续寻找")
                         self.reset_rotation()
                     else:
-                        logger.info("完成一圈旋转，继续寻找finish按钮")
+                        logger.info("未找到finish按钮，继续寻找")
                         self.reset_rotation()
                     return  # 返回主循环继续检测
 
@@ -920,6 +1315,7 @@ class CookingBot:
             if str(e) == "完成所有操作":
                 raise
             logger.error(f"处理finish状态时出错: {e}")
+            self.flight_recorder.dump('error')
 
 
     def handle_click_menu_state(self):
@@ -943,43 +1339,39 @@ class CookingBot:
             center_x = int(x + w // 2)
             center_y = int(y + h // 2)
 
+            # 菜单按钮来自之前的检测：等到界面稳定、按钮仍在原位置附近时立即点击，不再固定等待1秒
+            if not self.wait_until(lambda: self.roi_present('cook_menu', menu_button), timeout=1.0):
+                logger.warning("菜单按钮已不在原位置，返回菜单检测状态")
+                self.change_state(CookingState.DETECT_MENU)
+                return
             logger.info(f"点击菜单按钮位置: ({center_x}, {center_y})")
-            time.sleep(1)
-            pyautogui.click(center_x, center_y)
-            time.sleep(1.5)  # 增加等待时间，确保界面响应
-
-            # 点击后验证：多次尝试检测食物或开始按钮
-            max_verify_attempts = 3
-            for attempt in range(max_verify_attempts):
-                if self.food_clicked:
-                    # 果已经选择过食物，使用保存的开始按钮位置
-                    if self.start_button_pos:
-                        logger.info("菜单点击成功，使用已保存的开始食物位置")
-                        self.menu_clicks += 1
-                        logger.info(f"当前菜单点击次数: {self.menu_clicks}")
-                        self.change_state(CookingState.DETECT_START)
-                        time.sleep(0.3)
-                        return
-                else:
-                    # 首次点击菜单，检测并保存食物按钮位置
-                    if not self.food_button_pos:
-                        food_buttons = self.detect_buttons('food')
-                        if food_buttons:
-                            logger.info("首次检测到食物按钮，保存位置")
-                            self.food_button_pos = food_buttons[0].tolist() if isinstance(food_buttons[0],
-                                                                                        np.ndarray) else list(
-                                food_buttons[0])
-                            self.menu_clicks += 1
-                            logger.info(f"当前菜单点击次数: {self.menu_clicks}")
-                            self.change_state(CookingState.DETECT_FOOD)
-                            return
-
-                if attempt < max_verify_attempts - 1:
-                    logger.info(f"第 {attempt + 1} 次验证未检测到目标按钮，等待重试")
-                    time.sleep(0.5)  # 每次验证间隔
+            self.mouse_click(center_x, center_y)
+
+            if self.food_clicked:
+                # 已经选择过食物，等待开始按钮出现在保存的位置后直接使用
+                if self.start_button_pos:
+                    start_button = self.start_button_pos
+                    self.wait_until(lambda: self.roi_present('cook_start', start_button), timeout=1.5)
+                    logger.info("菜单点击成功，使用已保存的开始食物位置")
+                    self.menu_clicks += 1
+                    logger.info(f"当前菜单点击次数: {self.menu_clicks}")
+                    self.change_state(CookingState.DETECT_START)
+                    return
+            elif not self.food_button_pos:
+                # 首次点击菜单，等待食物面板弹出后检测并保存食物按钮位置
+                food_buttons = self.wait_until(lambda: self.detect_buttons('food'), timeout=2.5)
+                if food_buttons:
+                    logger.info("首次检测到食物按钮，保存位置")
+                    self.food_button_pos = food_buttons[0].tolist() if isinstance(food_buttons[0],
+                                                                                np.ndarray) else list(
+                        food_buttons[0])
+                    self.menu_clicks += 1
+                    logger.info(f"当前菜单点击次数: {self.menu_clicks}")
+                    self.change_state(CookingState.DETECT_FOOD)
+                    return
 
-            # 多次验证都失败，返回检测菜单状态
-            logger.warning("多次验证后菜单点击未生效，返回菜单检测状态")
+            # 等待超时仍未检测到目标按钮，返回检测菜单状态
+            logger.warning("等待超时，菜单点击未生效，返回菜单检测状态")
             self.change_state(CookingState.DETECT_MENU)
             if not self.handle_timeout():
                 raise Exception("菜单点击超时")
@@ -1008,11 +1400,29 @@ class CookingBot:
         """运行烹饪机器人"""
         try:
             self.should_exit = False  # 添加新的标记
+            if self.adb_device is None:
+                self.find_game_window()
+            last_window_update_time = time.time()  # 记录上次窗口位置更新时间
+
             while self.running:
                 if self.loop_count != -1 and self.current_loop >= self.loop_count:
                     logger.info(f"=== 完成所有 {self.loop_count} 次循环，程序结束 ===")
                     break
 
+                # 每隔一段时间更新窗口位置信息，以处理窗口移动的情况
+                current_time = time.time()
+                if current_time - last_window_update_time >= 10:
+                    self.update_window_rect()
+                    last_window_update_time = current_time
+
+                # 每个状态tick使用一帧新的截图
+                self.invalidate_frame()
+
+                # 指定的窗口不可用时跳过本次tick，不在全屏截图上检测和点击
+                if not self.window_available():
+                    time.sleep(WINDOW_RETRY_INTERVAL)
+                    continue
+
                 try:
                     if self.state == CookingState.DETECT_MENU:
                         self.handle_menu_state()
@@ -1029,6 +1439,7 @@ class CookingBot:
                     if str(e) == "完成所有操作":
                         logger.info(f"=== 完成第 {self.current_loop + 1} 次循环 ===")
                         self.current_loop += 1
+                        self.log_detection_stats()
 
                         # 检查是否需要退出程序
                         if self.should_exit:
@@ -1045,52 +1456,24 @@ class CookingBot:
                     else:
                         raise
 
+                # 按限定帧率刷新覆盖层，检查模板文件是否有更新
+                self.overlay.pump()
+                self.reload_changed_templates()
                 time.sleep(0.1)  # 主循环间隔
 
         except KeyboardInterrupt:
             logger.info("收到键盘中断信号，程序结束")
         except Exception as e:
             logger.error(f"程序运行出错: {e}")
+            self.flight_recorder.dump('error', force=True)
         finally:
+            self.log_detection_stats()
             self.executor.shutdown()
+            self.flight_recorder.close()
+            self.overlay.close()
             logger.info("程序已退出")
 
 
-    def get_optimized_screenshot(self):
-        """获取优化后的截图"""
-        current_time = time.time()
-        if (self.last_screenshot is None or
-                current_time - self.last_screenshot_time >= 0.1):  # 直接使用固定值0.1
-            screen = np.array(pyautogui.screenshot())
-            screen = self.optimize_image_size(screen)
-            self.last_screenshot = screen
-            self.last_screenshot_time = current_time
-        return self.last_screenshot
-
-
-    def detect_with_roi(self, template_name):
-        """使用ROI区域进行检测"""
-        screen = self.get_optimized_screenshot()
-        if not self.roi_enabled:
-            return self.detect_buttons(screen, template_name)
-
-        h, w = screen.shape[:2]
-        roi_x = int(w * 0.2)
-        roi_y = int(h * 0.2)
-        roi_w = int(w * 0.6)
-        roi_h = int(h * 0.6)
-
-        roi = screen[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w]
-        matches = self.detect_buttons(roi, template_name)
-
-        # 调整坐标以匹配始幕
-        for match in matches:
-            match[0] += roi_x
-            match[1] += roi_y
-
-        return matches
-
-
     def reset_button_positions(self):
         """重置按钮位置缓存"""
         self.food_button_pos = None
@@ -1113,11 +1496,6 @@ class CookingBot:
             bool: 点击是否成功
         """
         try:
-            # 记录点击前的状态，用于后续验证
-            initial_buttons = self.detect_buttons(template_name)
-            initial_count = len(initial_buttons)
-            logger.debug(f"点击前按钮数量: {initial_count}")
-
             # 确保button是列表或元组类型
             if isinstance(button, np.ndarray):
                 button = button.tolist()
@@ -1127,17 +1505,15 @@ class CookingBot:
             center_x = x + w // 2
             center_y = y + h // 2
 
-            # 点击前短暂延迟，防止操作过快
-            time.sleep(0.1)
-            pyautogui.click(center_x, center_y)
-            pyautogui.click(center_x, center_y)
+            # 点击前只记录按钮区域，不再整帧检测
+            before = self.roi_snapshot(button)
+            self.mouse_click(center_x, center_y, double_click=True)
             logger.info(f"点击按钮: ({center_x}, {center_y})")
 
-            # 等待界面更新
-            time.sleep(wait_time)
-
             # 根据不同情况验证点击效果
             if verify_start_button:
+                # 等待界面更新
+                time.sleep(wait_time)
                 # 特殊情况：验证食物和开始按钮是否同时存在
                 food_buttons = self.detect_buttons('food')
                 start_buttons = self.detect_buttons('cook_start')
@@ -1145,17 +1521,13 @@ class CookingBot:
                 logger.debug(f"验证开始按钮: 食物按钮={len(food_buttons)}, 开始按钮={len(start_buttons)}")
                 return success
 
-            # 普通情况：检查按钮数量变化
-            current_buttons = self.detect_buttons(template_name)
-            current_count = len(current_buttons)
-            logger.debug(f"点击后按钮数量: {current_count}")
-
+            # 普通情况：点击的按钮消失即按钮数量发生了变化
+            success = self.confirm_click(template_name, button, before, timeout=wait_time)
             if expected_count is not None:
-                # 如果指期望数量，直接比较
+                # 指定了期望数量时才需要整帧检测计数
+                current_count = len(self.detect_buttons(template_name))
+                logger.debug(f"点击后按钮数量: {current_count}")
                 success = current_count == expected_count
-            else:
-                # 否则只要数量发生变化认为成功
-                success = current_count != initial_count
 
             logger.debug(f"点击验证结果: {success}")
             return success
@@ -1166,36 +1538,46 @@ class CookingBot:
 
 
     def save_debug_images(self, template_name):
-        """保存调试用的图像"""
-        try:
-            # 保存原始截图
-            screen = self.get_screenshot()
-            cv2.imwrite('debug/original_screen.png', cv2.cvtColor(screen, cv2.COLOR_RGB2BGR))
-
-            # 保存处理后的截图
-            screen_processed = self.preprocess_image(cv2.cvtColor(screen, cv2.COLOR_RGB2BGR))
-            cv2.imwrite('debug/processed_screen.png', screen_processed)
-
-            # 保存模板图像
-            template_list = self.templates.get(template_name, [])
-            for idx, template in enumerate(template_list):
-                cv2.imwrite(f'debug/template_{template_name}_{idx}.png', template)
-
-            logger.info(f"调试图像已保存到 debug 目录")
-
-        except Exception as e:
-            logger.error(f"保存调试图像失败: {e}")
+        """保存调试用的图像：当前帧和最近的检测结果交给飞行记录在后台写入 debug 目录"""
+        self.get_frame()
+        self.record_frame()
+        return self.flight_recorder.dump(template_name, force=True)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='自动烹饪机器人')
     parser.add_argument('--food', type=str, default='葡萄酱', help='食物名称')
     parser.add_argument('--loop', type=int, default=-1, help='循环次数，-1表示无限循环')
+    parser.add_argument('--match-mode', type=str, default='exhaustive', choices=['exhaustive', 'coarse', 'fft', 'binary'],
+                        help='整帧匹配模式：exhaustive 全尺度搜索，coarse 由粗到细，fft 所有模板共用整帧频谱，'
+                             'binary 按钮二值图位打包匹配')
+    parser.add_argument('--workers', type=int, default=None, help='模板匹配线程数，默认使用CPU核心数')
+    parser.add_argument('--no-overlay', action='store_true', help='不显示检测框覆盖层（无人值守运行）')
+    parser.add_argument('--food-recognizer', type=str, default='index', choices=['index', 'template'],
+                        help='食物识别方式：index 单次扫描识别面板上的全部食物，template 只匹配当前食物的模板')
+    parser.add_argument('--change-sensitivity', type=float, default=6.0,
+                        help='画面变化检测阈值（分块平均灰度差），0表示关闭')
+    parser.add_argument('--adb', type=str, default=None,
+                        help='通过ADB截图和点击的设备序列号，如 127.0.0.1:16384（MuMu模拟器12），不指定则操作桌面窗口')
+    parser.add_argument('--adb-port', type=int, default=5037, help='adb server 端口')
+    parser.add_argument('--flight-frames', type=int, default=FLIGHT_FRAMES,
+                        help='飞行记录保留的最近帧数，超时、出错或按 Ctrl+Shift+D 时写入debug目录，0表示关闭')
+    parser.add_argument('--no-template-cache', action='store_true',
+                        help='不使用 configs/template_cache 中的模板编译缓存，每次启动重新编译模板')
 
     args = parser.parse_args()
 
     try:
-        bot = CookingBot(food_name=args.food, loop_count=args.loop)
+        adb_device = None
+        if args.adb:
+            from adb_backend import AdbDevice
+            adb_device = AdbDevice(args.adb, port=args.adb_port)
+        # ADB截图坐标是设备坐标，与桌面覆盖层对不上，使用ADB时不显示覆盖层
+        bot = CookingBot(food_name=args.food, loop_count=args.loop, match_mode=args.match_mode,
+                     match_workers=args.workers, change_sensitivity=args.change_sensitivity,
+                     food_recognizer=args.food_recognizer, show_overlay=not args.no_overlay and adb_device is None,
+                     adb_device=adb_device, flight_frames=args.flight_frames,
+                     template_cache=not args.no_template_cache)
         # 显示所有可用的食物模板
         available_foods = bot.get_available_foods()
         logger.info(f"可用的食物模板: {available_foods}")
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 飞行记录模块
+在内存中保留最近 N 帧截图及其检测结果、点击和状态切换，只在状态超时、出错或按下热键时
+由后台线程写入 debug 目录，主循环中不再做任何PNG编码和磁盘写入。
+截图复制到首帧时按分辨率一次分配的 N 个环形缓冲区中，记录时不再分配内存（分辨率变化时重新分配）。
+
+每次转储生成一个目录 debug/flight_<时间>_<原因>/:
+  - frame_<序号>.png        原始截图
+  - frame_<序号>_boxes.png  标出该帧检测框的截图
+  - timeline.json           各帧的时间、状态，以及按时间排列的检测/点击/状态切换事件
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 保留的帧数和内存上限（超过任一项时丢弃最旧的帧）
+FLIGHT_FRAMES = 16
+FLIGHT_MAX_BYTES = 256 * 1024 * 1024
+# 保留的事件数
+FLIGHT_EVENTS = 512
+# 两次自动转储（超时/出错）的最小间隔（秒），热键转储不受限制
+DUMP_INTERVAL = 10.0
+# debug 目录中最多保留的转储目录数
+FLIGHT_KEEP = 20
+
+# 标注检测框使用的颜色（BGR），按模板名称轮流分配
+_BOX_COLORS = [(0, 255, 0), (0, 0, 255), (255, 0, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+
+
+def _json_default(value):
+    """numpy 数组和标量转换为 JSON 可写的类型"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class FlightRecorder:
+    """最近 N 帧截图和事件的环形缓冲区，按需异步转储到磁盘"""
+
+    def __init__(self, directory='debug', capacity=FLIGHT_FRAMES, max_bytes=FLIGHT_MAX_BYTES,
+                 min_interval=DUMP_INTERVAL, keep=FLIGHT_KEEP):
+        """
+        :param directory: 转储目录的上级目录
+        :param capacity: 保留的帧数，0 表示不记录
+        :param max_bytes: 保留的截图总字节数上限
+        :param min_interval: 自动转储的最小间隔（秒）
+        :param keep: 最多保留的转储目录数
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.min_interval = min_interval
+        self.keep = keep
+        self.frames = deque()  # [{'seq', 'time', 'state', 'offset', 'image'}]
+        self.events = deque(maxlen=FLIGHT_EVENTS)
+        self.slots = []  # 预先分配的截图缓冲区，按顺序循环复用
+        self.next_slot = 0
+        self.seq = 0
+        self.last_dump = None
+        self.dumps = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='flight')
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _allocate(self, rgb):
+        """按截图的尺寸分配环形缓冲区：capacity 个，总字节数不超过 max_bytes（至少1个）"""
+        count = max(1, min(self.capacity, self.max_bytes // max(rgb.nbytes, 1)))
+        self.slots = [np.empty_like(rgb) for _ in range(count)]
+        self.next_slot = 0
+
+    def record_frame(self, rgb, offset=(0, 0), state=None):
+        """把截图复制到下一个环形缓冲区（截图缓冲区会被之后的截图复用），返回帧序号"""
+        if not self.enabled or rgb is None:
+            return None
+        with self.lock:
+            if not self.slots or self.slots[0].shape != rgb.shape or self.slots[0].dtype != rgb.dtype:
+                self._allocate(rgb)
+            image = self.slots[self.next_slot]
+            self.next_slot = (self.next_slot + 1) % len(self.slots)
+            np.copyto(image, rgb)
+            self.seq += 1
+            self.frames.append({'seq': self.seq, 'time': time.time(), 'state': state,
+                                'offset': tuple(offset), 'image': image})
+            # 缓冲区数量即保留的帧数：被覆盖的缓冲区对应的旧帧一定已经出队
+            while len(self.frames) > len(self.slots):
+                self.frames.popleft()
+            return self.seq
+
+    def note(self, kind, **data):
+        """记录一个事件（'detect'、'click'、'state' 等），关联到最近一帧"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append(dict(data, kind=kind, time=time.time(), frame=self.seq))
+
+    def dump(self, reason, force=False):
+        """把当前缓冲区交给后台线程写入磁盘，返回转储目录；距上次转储不足 min_interval 秒时跳过（force 除外）"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            now = time.time()
+            if not self.frames and not self.events:
+                return None
+            if not force and self.last_dump is not None and now - self.last_dump < self.min_interval:
+                return None
+            self.last_dump = now
+            frames = list(self.frames)
+            events = list(self.events)
+            # 转储的截图交给后台线程写入，之后的截图写入重新分配的缓冲区，不会覆盖正在写入的内容
+            self.slots = []
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        path = os.path.join(self.directory, f"flight_{stamp}_{reason}")
+        self.dumps += 1
+        self.executor.submit(self._write, path, reason, frames, events)
+        logger.info(f"保存最近 {len(frames)} 帧和 {len(events)} 个事件到 {path}（{reason}）")
+        return path
+
+    def _write(self, path, reason, frames, events):
+        try:
+            os.makedirs(path, exist_ok=True)
+            detections = {}
+            for event in events:
+                if event['kind'] == 'detect':
+                    detections.setdefault(event['frame'], []).append(event)
+
+            timeline = []
+            for frame in frames:
+                name = f"frame_{frame['seq']:05d}"
+                bgr = cv2.cvtColor(frame['image'], cv2.COLOR_RGB2BGR)
+                cv2.imwrite(os.path.join(path, f"{name}.png"), bgr)
+                if frame['seq'] in detections:
+                    cv2.imwrite(os.path.join(path, f"{name}_boxes.png"),
+                                self._draw_boxes(bgr, frame['offset'], detections[frame['seq']]))
+                timeline.append({key: value for key, value in frame.items() if key != 'image'})
+
+            with open(os.path.join(path, 'timeline.json'), 'w', encoding='utf-8') as f:
+                json.dump({'reason': reason, 'time': time.time(), 'frames': timeline, 'events': events},
+                          f, indent=2, ensure_ascii=False, default=_json_default)
+            self._prune()
+        except Exception as e:
+            logger.error(f"保存飞行记录失败: {e}")
+
+    @staticmethod
+    def _draw_boxes(bgr, offset, detections):
+        """在截图上标出检测框（检测结果为屏幕坐标，减去截图偏移）"""
+        colors = {}
+        for event in detections:
+            color = colors.setdefault(event.get('template'), _BOX_COLORS[len(colors) % len(_BOX_COLORS)])
+            boxes = event.get('boxes')
+            for box in (boxes if boxes is not None else []):
+                x, y, w, h = [int(value) for value in list(box)[:4]]
+                x, y = x - offset[0], y - offset[1]
+                cv2.rectangle(bgr, (x, y), (x + w, y + h), color, 2)
+                label = f"{event.get('template')} {float(box[4]):.2f}" if len(box) > 4 else str(event.get('template'))
+                cv2.putText(bgr, label, (x, max(y - 4, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        return bgr
+
+    def _prune(self):
+        """只保留最近 keep 个转储目录"""
+        dumps = sorted(name for name in os.listdir(self.directory) if name.startswith('flight_'))
+        for name in dumps[:max(len(dumps) - self.keep, 0)]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def close(self):
+        """等待未完成的转储写完"""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 食物索引模块
+对 foods 目录下的全部食物图标建立一次索引（紧凑的颜色和形状描述子），
+配合通用卡片原型在食物面板上做单次扫描：先定位所有食物卡片，再逐张识别食物和所在的格子，
+识别耗时与支持的食物数量基本无关。
+"""
+
+import os
+import logging
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 卡片原型的匹配阈值（所有食物卡片的平均图像，只用于找候选位置，阈值较低）
+FOOD_CARD_THRESHOLD = 0.45
+# 识别阈值：描述子相似度低于该值的候选视为不是食物卡片
+FOOD_INDEX_THRESHOLD = 0.8
+# 最佳食物与次佳食物的相似度差距低于该值时视为无法区分
+FOOD_INDEX_MARGIN = 0.02
+# 按网格位置补查的格子与卡片未必严格对齐，阈值乘以该系数
+GRID_GAP_RELAX = 0.9
+
+# 描述子参数：HSV颜色直方图的分箱数和形状缩略图边长
+HUE_BINS, SAT_BINS, VAL_BINS = 12, 4, 4
+SHAPE_SIZE = 12
+COLOR_WEIGHT = 0.6
+
+# 识别结果：食物名称、检测框 [x, y, w, h, conf]、相似度、格子 (行, 列)
+FoodHit = namedtuple('FoodHit', 'name box score cell')
+
+
+def food_name_of(filename):
+    """文件名 -> 食物名称，'{食物}_1.png' 是同一食物的另一种外观（如选中状态）"""
+    stem = os.path.splitext(filename)[0]
+    return stem[:-2] if stem.endswith('_1') else stem
+
+
+def color_descriptor(bgr):
+    """HSV颜色直方图，取平方根后L2归一化（余弦相似度即 Hellinger 相似度）"""
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, [HUE_BINS, SAT_BINS, VAL_BINS], [0, 180, 0, 256, 0, 256])
+    hist = np.sqrt(hist.ravel())
+    return hist / max(np.linalg.norm(hist), 1e-9)
+
+
+def shape_descriptor(bgr):
+    """缩小到 SHAPE_SIZE 的灰度图，去均值后L2归一化（余弦相似度即低分辨率下的归一化相关系数）"""
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (SHAPE_SIZE, SHAPE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    small -= small.mean()
+    return small / max(np.linalg.norm(small), 1e-9)
+
+
+def describe(bgr):
+    """单个图标的描述子：加权拼接颜色和形状描述子，两个描述子都已归一化，点积就是加权相似度"""
+    return np.concatenate([color_descriptor(bgr) * np.sqrt(COLOR_WEIGHT),
+                           shape_descriptor(bgr) * np.sqrt(1 - COLOR_WEIGHT)]).astype(np.float32)
+
+
+def assign_grid_cells(boxes):
+    """按检测框中心把卡片归入网格，返回每个框的 (行, 列)
+
+    中心y相差不到半个卡片高度的归为同一行，中心x相差不到半个卡片宽度的归为同一列。
+    """
+    if len(boxes) == 0:
+        return []
+    boxes = np.asarray(boxes, dtype=np.float64)
+    centers_x = boxes[:, 0] + boxes[:, 2] / 2
+    centers_y = boxes[:, 1] + boxes[:, 3] / 2
+
+    def cluster(values, tolerance):
+        order = np.argsort(values)
+        labels = np.empty(len(values), dtype=int)
+        label, start = 0, values[order[0]]
+        for index in order:
+            if values[index] - start > tolerance:
+                label += 1
+                start = values[index]
+            labels[index] = label
+        return labels
+
+    rows = cluster(centers_y, np.median(boxes[:, 3]) / 2)
+    cols = cluster(centers_x, np.median(boxes[:, 2]) / 2)
+    return [(int(row), int(col)) for row, col in zip(rows, cols)]
+
+
+class FoodIndex:
+    """foods 目录下全部食物图标的描述子索引"""
+
+    def __init__(self, foods_dir, imread=None):
+        """
+        :param foods_dir: 食物图标目录
+        :param imread: 读取图标的函数，参数为路径，返回BGR图像或None；None表示直接解码图片文件
+        """
+        self.foods_dir = foods_dir
+        self.imread = imread or (lambda path: cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR))
+        self.names = []  # 每行描述子对应的食物名称
+        self.descriptors = np.empty((0, 0), dtype=np.float32)
+        self.prototype = None  # 全部图标的平均图像，用于定位卡片
+        self.load()
+
+    def load(self):
+        """读取全部图标，生成描述子矩阵和卡片原型"""
+        icons = []
+        names = []
+        for filename in sorted(os.listdir(self.foods_dir)):
+            if not filename.lower().endswith('.png'):
+                continue
+            path = os.path.join(self.foods_dir, filename)
+            icon = self.imread(path)
+            if icon is None:
+                logger.error(f"无法加载食物图标: {path}")
+                continue
+            icons.append(icon)
+            names.append(food_name_of(filename))
+
+        self.names = names
+        if not icons:
+            self.descriptors = np.empty((0, 0), dtype=np.float32)
+            self.prototype = None
+            return
+
+        self.descriptors = np.stack([describe(icon) for icon in icons])
+        # 各图标手工截取，尺寸略有差异，统一缩放到中位尺寸后取平均
+        width = int(np.median([icon.shape[1] for icon in icons]))
+        height = int(np.median([icon.shape[0] for icon in icons]))
+        resized = [cv2.resize(icon, (width, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+                   for icon in icons]
+        self.prototype = np.mean(resized, axis=0).astype(np.uint8)
+        logger.info(f"食物索引: {len(set(names))} 种食物, {len(names)} 个图标, 卡片原型 {width}x{height}")
+
+    @property
+    def foods(self):
+        return sorted(set(self.names))
+
+    def identify(self, bgr, boxes, threshold=FOOD_INDEX_THRESHOLD, margin=FOOD_INDEX_MARGIN):
+        """识别候选卡片上的食物，并补查网格中没有候选的格子
+
+        卡片原型是所有图标的平均，与个别外观特殊的卡片相关性偏低。面板是等间距网格，
+        已识别的卡片确定了行列位置后，空着的格子按网格位置再识别一次（阈值适当放宽）。
+
+        Args:
+            bgr: 整帧BGR图像
+            boxes: 候选卡片框 [x, y, w, h, conf]，坐标相对于 bgr
+            threshold: 相似度阈值
+            margin: 最佳食物需要领先次佳食物的相似度
+
+        Returns:
+            list[FoodHit]: 识别成功的卡片，检测框的置信度替换为描述子相似度
+        """
+        hits = self.classify(bgr, boxes, threshold, margin)
+        if hits:
+            gaps = grid_gaps([hit.box for hit in hits])
+            hits += self.classify(bgr, gaps, threshold * GRID_GAP_RELAX, margin)
+            hits = suppress_nested(hits)
+        cells = assign_grid_cells([hit.box for hit in hits])
+        return [hit._replace(cell=cell) for hit, cell in zip(hits, cells)]
+
+    def classify(self, bgr, boxes, threshold=FOOD_INDEX_THRESHOLD, margin=FOOD_INDEX_MARGIN):
+        """对每个框计算描述子并与索引比较，返回通过阈值的 FoodHit（cell 为None）"""
+        if len(boxes) == 0 or len(self.names) == 0:
+            return []
+
+        height, width = bgr.shape[:2]
+        kept = []
+        crops = []
+        for box in boxes:
+            x, y, w, h = (int(round(value)) for value in box[:4])
+            x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                continue
+            kept.append((x, y, w, h))
+            crops.append(describe(bgr[y0:y1, x0:x1]))
+        if not crops:
+            return []
+
+        # 候选数 x 图标数 的相似度矩阵，一次矩阵乘法完成全部比较
+        similarity = np.stack(crops) @ self.descriptors.T
+        names = np.asarray(self.names)
+        hits = []
+        for (x, y, w, h), scores in zip(kept, similarity):
+            best = int(np.argmax(scores))
+            others = scores[names != names[best]]
+            runner_up = float(others.max()) if len(others) else -1.0
+            score = float(scores[best])
+            if score < threshold or score - runner_up < margin:
+                continue
+            hits.append(FoodHit(names[best], [x, y, w, h, score], score, None))
+        return hits
+
+
+def grid_gaps(boxes):
+    """根据已识别卡片的行列位置，返回网格中空着的格子的框（使用卡片的中位尺寸）"""
+    if len(boxes) < 2:
+        return []
+    boxes = np.asarray(boxes, dtype=np.float64)
+    cells = assign_grid_cells(boxes)
+    rows = {}
+    cols = {}
+    for (row, col), box in zip(cells, boxes):
+        rows.setdefault(row, []).append(box[1])
+        cols.setdefault(col, []).append(box[0])
+    w, h = np.median(boxes[:, 2]), np.median(boxes[:, 3])
+    occupied = set(cells)
+    return [[float(np.median(cols[col])), float(np.median(rows[row])), w, h, 0.0]
+            for row in rows for col in cols if (row, col) not in occupied]
+
+
+def suppress_nested(hits):
+    """去掉中心落在更高分卡片内部的结果（卡片内部的局部区域偶尔也能通过识别）"""
+    kept = []
+    for hit in sorted(hits, key=lambda item: -item.score):
+        cx = hit.box[0] + hit.box[2] / 2
+        cy = hit.box[1] + hit.box[3] / 2
+        if not any(k.box[0] <= cx < k.box[0] + k.box[2] and k.box[1] <= cy < k.box[1] + k.box[3] for k in kept):
+            kept.append(hit)
+    return kept
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 耗时统计模块
+按名称汇总耗时直方图（状态处理、各模板检测的截图/预处理/匹配/NMS分段、点击到界面确认），
+定期写入JSON或CSV文件，供 cookGui 的耗时面板实时读取。
+
+分段计时使用线程内的栈：stages() 打开一次检测的统计，检测过程中（包括 template_matcher 内部）
+用 stage() 标记的各段只记录自身耗时（不含嵌套的子段），没有打开统计时 stage() 不做任何记录。
+每次记录只是一次对数分桶和几次加法，单次开销在微秒级，远小于毫秒级的检测耗时。
+"""
+
+import os
+import csv
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶：从 HIST_MIN_MS 开始每个桶上限乘以 HIST_RATIO（每倍频4个桶，相对误差约19%）
+HIST_MIN_MS = 0.05
+HIST_RATIO = 2 ** 0.25
+HIST_BUCKETS = 80  # 覆盖到约 0.05ms * 2^20 ≈ 52s
+# 定期写入报告的间隔（秒）
+REPORT_INTERVAL = 30.0
+
+_LOG_RATIO = math.log(HIST_RATIO)
+_local = threading.local()
+
+
+class LatencyHistogram:
+    """对数分桶的耗时直方图，分位数按桶上限估计"""
+
+    __slots__ = ('counts', 'count', 'total', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * HIST_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        index = int(math.log(ms / HIST_MIN_MS) / _LOG_RATIO) + 1 if ms > HIST_MIN_MS else 0
+        self.counts[min(index, HIST_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.minimum:
+            self.minimum = seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @staticmethod
+    def bucket_upper_ms(index):
+        return HIST_MIN_MS * HIST_RATIO ** index
+
+    def percentile(self, q):
+        """第 q 百分位数（毫秒），限制在实际最小值和最大值之间"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return max(min(self.bucket_upper_ms(index), self.maximum * 1000), self.minimum * 1000)
+        return self.maximum * 1000
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.maximum * 1000,
+            'total_s': self.total,
+        }
+
+    def buckets(self):
+        """非空的桶 [(桶上限ms, 次数)]"""
+        return [(round(self.bucket_upper_ms(index), 3), count) for index, count in enumerate(self.counts) if count]
+
+
+class _StageStack:
+    """一次分段统计：每段的自身耗时累加到 totals，栈中记录正在计时的段"""
+
+    __slots__ = ('totals', 'stack')
+
+    def __init__(self):
+        self.totals = {}
+        self.stack = []  # [[名称, 开始时间, 子段耗时]]
+
+
+@contextmanager
+def stage(name):
+    """标记一个分段（如 'capture'、'match'、'nms'），只在 LatencyRecorder.stages() 内生效"""
+    stages = getattr(_local, 'stages', None)
+    if stages is None:
+        yield
+        return
+    entry = [name, time.perf_counter(), 0.0]
+    stages.stack.append(entry)
+    try:
+        yield
+    finally:
+        stages.stack.pop()
+        elapsed = time.perf_counter() - entry[1]
+        stages.totals[name] = stages.totals.get(name, 0.0) + elapsed - entry[2]
+        if stages.stack:
+            stages.stack[-1][2] += elapsed
+
+
+class LatencyRecorder:
+    """按名称汇总耗时直方图，名称用 '/' 分级，如 'state/DETECT_FINISH'、'detect/cook/match'"""
+
+    def __init__(self, path=None, interval=REPORT_INTERVAL):
+        """
+        :param path: 定期写入的报告文件，扩展名为 .csv 时写CSV，否则写JSON；None表示不写文件
+        :param interval: 写入间隔（秒）
+        """
+        self.path = path
+        self.interval = interval
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_write = time.perf_counter()
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """记录代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    @contextmanager
+    def stages(self, prefix):
+        """打开一次分段统计：结束时记录 '{prefix}/total' 和代码块内各段的 '{prefix}/{段名}'
+
+        已经在分段统计内时（如 detect_buttons 转调 detect_food）只记录总耗时，各段归入外层统计。
+        """
+        outer = getattr(_local, 'stages', None)
+        stages = _local.stages = outer or _StageStack()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if outer is None:
+                _local.stages = None
+                for name, seconds in stages.totals.items():
+                    self.record(f"{prefix}/{name}", seconds)
+            self.record(f"{prefix}/total", elapsed)
+
+    def summary(self, prefix=''):
+        """返回 {名称: 统计}，统计项见 LatencyHistogram.summary"""
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())
+                    if name.startswith(prefix)}
+
+    def snapshot(self):
+        """包含直方图分桶的完整报告"""
+        with self.lock:
+            items = sorted(self.histograms.items())
+            return {
+                'started_at': self.started_at,
+                'elapsed_s': time.time() - self.started_at,
+                'histogram_ratio': HIST_RATIO,
+                'latency': {name: dict(histogram.summary(), buckets=histogram.buckets()) for name, histogram in items},
+            }
+
+    def write(self, path=None):
+        """写入报告文件，扩展名为 .csv 时每个名称一行，否则写JSON（含直方图分桶）"""
+        path = path or self.path
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if path.lower().endswith('.csv'):
+                summary = self.summary()
+                fields = ['name', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'total_s']
+                with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=fields)
+                    writer.writeheader()
+                    for name, item in summary.items():
+                        writer.writerow(dict({key: round(value, 4) for key, value in item.items()}, name=name))
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"写入耗时报告失败: {e}")
+
+    def maybe_write(self):
+        """距上次写入超过 interval 秒时写入报告（在主循环中每个tick调用）"""
+        if self.path and time.perf_counter() - self.last_write >= self.interval:
+            self.last_write = time.perf_counter()
+            self.write()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 多开调度模块
+为每个MuMu模拟器窗口启动一个独立进程运行 cook_mumu.CookingBot：
+  - 每个实例只截取、点击自己窗口的客户区（按窗口句柄绑定，坐标由各自的 FrameContext 换算）；
+    截图取自屏幕，点击使用真实鼠标，所有模拟器窗口必须平铺、互不遮挡且不能最小化，
+    窗口不可用时该实例暂停检测，不会退回全屏截图
+  - --adb N 改为通过ADB驱动N个实例（第 i 个实例为 127.0.0.1:16384+32*i），截图和点击不经过屏幕和鼠标，窗口可以重叠或最小化
+  - 模板金字塔由调度进程生成一次，放在共享内存中供所有实例只读使用
+  - 检测在各进程中并行执行，鼠标操作通过跨进程锁串行化，避免多个实例同时抢鼠标
+
+--fake N 用本地模拟窗口（离线回放的合成厨房）代替真实模拟器，可在没有模拟器和Windows的环境下做扩展性测试。
+
+用法:
+    python mumu_supervisor.py --food 葡萄酱 --loop -1
+    python mumu_supervisor.py --food 葡萄酱 --adb 4
+    python mumu_supervisor.py --fake 4 --cycles 2 --cook-time 2
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from food_index import FoodIndex
+from template_matcher import TemplatePyramidCache, ScaleCalibration
+from template_store import TemplateStore
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BTNS_DIR = os.path.join(SCRIPT_DIR, "btns")
+FOODS_DIR = os.path.join(SCRIPT_DIR, "foods")
+TEMPLATE_CACHE_DIR = os.path.join(SCRIPT_DIR, "configs", "template_cache")
+
+# 模拟窗口的客户区尺寸 (高, 宽) 和模拟的单次点击耗时（pyautogui 默认每次调用后暂停0.1秒）
+FAKE_WINDOW_SIZE = (720, 1280)
+FAKE_CLICK_COST = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+def find_emulator_windows(keyword="MuMu", exclude=("多开器",)):
+    """枚举标题包含 keyword 的可见窗口，返回 [(窗口句柄, 标题)]，跳过MuMu多开器等管理窗口"""
+    import win32gui
+
+    windows = []
+
+    def enum_windows_callback(hwnd, windows):
+        if win32gui.IsWindowVisible(hwnd):
+            title = win32gui.GetWindowText(hwnd)
+            if keyword in title and not any(word in title for word in exclude):
+                windows.append((hwnd, title))
+        return True
+
+    win32gui.EnumWindows(enum_windows_callback, windows)
+    return windows
+
+
+def build_shared_templates(food_name, btns_dir=BTNS_DIR, foods_dir=FOODS_DIR, store=None):
+    """按 CookingBot 的模板配置加载全部模板并生成多尺度缓存（调度进程调用一次，之后共享给各实例）
+
+    Args:
+        store: 模板编译缓存，None表示使用 configs/template_cache
+    """
+    from cook_mumu import TEMPLATE_SCALE_FACTORS, template_config_for
+
+    if store is None:
+        store = TemplateStore(TEMPLATE_CACHE_DIR, root=SCRIPT_DIR)
+    cache = TemplatePyramidCache()
+    for key, filenames in template_config_for(food_name).items():
+        folder = foods_dir if key == 'food' else btns_dir
+        pyramids = []
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            # 按钮使用二值图匹配，食物使用彩色图匹配
+            levels = store.pyramid(path, 'bgr' if key == 'food' else 'binary',
+                                   TEMPLATE_SCALE_FACTORS.get(key, TEMPLATE_SCALE_FACTORS['default']))
+            if not levels:
+                logger.error(f"无法加载模板: {path}")
+                continue
+            pyramids.append(levels)
+        cache.put(key, pyramids)
+
+    # 食物索引的通用卡片原型
+    prototype = FoodIndex(foods_dir, imread=store.image).prototype
+    if prototype is not None:
+        cache.build('food_card', [prototype], TEMPLATE_SCALE_FACTORS['food_card'])
+    store.save()
+    return cache
+
+
+class InputTurn:
+    """鼠标操作锁：包装跨进程锁，记录每次等待轮到本实例的时间"""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.waits = []
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.waits.append(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+        return False
+
+    def summary(self):
+        if not self.waits:
+            return {'count': 0, 'mean_ms': 0.0, 'p95_ms': 0.0}
+        waits = np.asarray(self.waits)
+        return {
+            'count': int(len(waits)),
+            'mean_ms': float(waits.mean() * 1000),
+            'p95_ms': float(np.percentile(waits, 95) * 1000),
+        }
+
+
+class FakeMouse:
+    """模拟窗口后端的鼠标：点击按屏幕坐标转发给本实例的模拟厨房
+
+    active 和 collisions 是所有实例共享的计数器，点击期间如果发现其他实例也在操作鼠标，
+    说明鼠标操作没有被串行化，计入 collisions。
+    """
+
+    def __init__(self, game, active, collisions, click_cost=FAKE_CLICK_COST):
+        self.game = game
+        self.active = active
+        self.collisions = collisions
+        self.click_cost = click_cost
+
+    def click(self, x, y, *args, **kwargs):
+        with self.active.get_lock():
+            self.active.value += 1
+            if self.active.value > 1:
+                with self.collisions.get_lock():
+                    self.collisions.value += 1
+        try:
+            time.sleep(self.click_cost)
+            self.game.click(x, y)
+        finally:
+            with self.active.get_lock():
+                self.active.value -= 1
+
+
+def run_instance(spec, shared_name, manifest, input_lock, results, options):
+    """子进程入口：运行一个模拟器实例的 CookingBot，结束后把报告放入 results"""
+    turn = InputTurn(input_lock)
+    # 每个实例单独的飞行记录目录：清理旧转储时不会删掉其他进程正在写入的目录
+    debug_dir = os.path.join('debug', f"instance_{spec['index']}")
+    pyramid_cache = TemplatePyramidCache.attach_shared(shared_name, manifest)
+
+    if spec['fake']:
+        from replay import SyntheticKitchen, ReplayHarness, install_headless_modules, imread_unicode
+        install_headless_modules()
+        import pyautogui
+        from cook_mumu import CookingBot
+        logging.getLogger().setLevel(options['log_level'])
+
+        buttons = {key: imread_unicode(os.path.join(options['btns_dir'], f"{key}.png"))
+                   for key in ('cook_menu', 'cook', 'finish', 'cook_start', 'back')}
+        game = SyntheticKitchen(buttons, options['food'], cook_time=options['cook_time'],
+                                ui_latency=options['ui_latency'], size=spec['size'], offset=spec['offset'],
+                                seed=spec['index'])
+        # 机器人照常通过 pyautogui 点击，由模拟鼠标按屏幕坐标转发给本实例的模拟窗口
+        pyautogui.click = FakeMouse(game, options['active'], options['collisions']).click
+
+        bot = CookingBot(food_name=options['food'], loop_count=-1, match_mode=options['match_mode'],
+                         match_workers=options['workers'], show_overlay=False,
+                         pyramid_cache=pyramid_cache, input_lock=turn, debug_dir=debug_dir)
+        bot.scale_calibration = ScaleCalibration()
+        bot.btns_dir = options['btns_dir']
+        bot.templates = bot.load_templates()
+
+        harness = ReplayHarness(bot, game, route_clicks=False)
+        report = harness.run(cycles=options['cycles'], duration=options['duration'])
+    else:
+        from cook_mumu import CookingBot
+        logging.getLogger().setLevel(options['log_level'])
+
+        adb_device = None
+        if spec['serial']:
+            from adb_backend import AdbDevice
+            adb_device = AdbDevice(spec['serial'], port=options['adb_port'])
+        bot = CookingBot(food_name=options['food'], loop_count=options['loop'], window_title=spec['title'],
+                         match_mode=options['match_mode'], match_workers=options['workers'], show_overlay=False,
+                         window_handle=spec['hwnd'], pyramid_cache=pyramid_cache, input_lock=turn,
+                         adb_device=adb_device, debug_dir=debug_dir)
+        start = time.time()
+        bot.run()
+        report = {'elapsed_s': time.time() - start, 'loops': bot.current_loop}
+
+    report['input_wait'] = turn.summary()
+    results.put((spec['index'], report))
+
+
+class MumuSupervisor:
+    """多开调度：发现模拟器窗口、共享模板缓存、为每个窗口启动一个机器人进程"""
+
+    def __init__(self, food_name, loop_count=-1, window_title="MuMu", match_mode='exhaustive',
+                 match_workers=None, fake=0, cycles=2, duration=300, cook_time=2.0, ui_latency=0.15,
+                 log_level='WARNING', adb=0, adb_port=5037):
+        """
+        :param fake: 模拟窗口数量，0表示使用真实的MuMu模拟器窗口
+        :param adb: 通过ADB驱动的MuMu实例数量，0表示按窗口截图和点击（窗口必须平铺且可见）
+        :param adb_port: adb server 端口
+        :param match_workers: 每个实例的模板匹配线程数，None表示按CPU核心数平均分配
+        :param cycles: 模拟窗口模式下每个实例完成多少个循环后停止
+        :param duration: 模拟窗口模式下的最长运行时间（秒）
+        """
+        self.ctx = multiprocessing.get_context('spawn')
+        self.food_name = food_name
+        self.window_title = window_title
+        self.fake = fake
+        self.adb = adb
+        self.options = {
+            'food': food_name,
+            'loop': loop_count,
+            'match_mode': match_mode,
+            'workers': match_workers,
+            'cycles': cycles,
+            'duration': duration,
+            'cook_time': cook_time,
+            'ui_latency': ui_latency,
+            'log_level': log_level,
+            'adb_port': adb_port,
+            'btns_dir': BTNS_DIR,
+            'active': self.ctx.Value('i', 0),
+            'collisions': self.ctx.Value('i', 0),
+        }
+        self.processes = []
+
+    def discover(self):
+        """返回每个实例的描述 [{'index', 'hwnd', 'serial', 'title', 'fake', 'offset', 'size'}]"""
+        if self.fake:
+            height, width = FAKE_WINDOW_SIZE
+            # 模拟窗口在虚拟桌面上两列平铺，每个实例的点击坐标都要减去自己的窗口偏移
+            return [{'index': i, 'hwnd': None, 'serial': None, 'title': f"fake-{i}", 'fake': True,
+                     'offset': ((i % 2) * width, (i // 2) * height), 'size': FAKE_WINDOW_SIZE}
+                    for i in range(self.fake)]
+        if self.adb:
+            # ADB序列号按MuMu多开实例序号分配，与窗口枚举顺序无关
+            from adb_backend import mumu_serial
+            return [{'index': i, 'hwnd': None, 'serial': mumu_serial(i), 'title': mumu_serial(i), 'fake': False,
+                     'offset': None, 'size': None}
+                    for i in range(self.adb)]
+        return [{'index': i, 'hwnd': hwnd, 'serial': None, 'title': title, 'fake': False, 'offset': None, 'size': None}
+                for i, (hwnd, title) in enumerate(find_emulator_windows(self.window_title))]
+
+    def run(self):
+        """启动所有实例并等待结束，返回 {实例序号: 报告}"""
+        specs = self.discover()
+        if not specs:
+            logger.error(f"未找到标题包含 {self.window_title} 的模拟器窗口")
+            return {}
+
+        if self.fake:
+            from replay import install_headless_modules, write_synthetic_buttons
+            install_headless_modules()
+            self.options['btns_dir'] = tempfile.mkdtemp(prefix='supervisor_btns_')
+            write_synthetic_buttons(self.options['btns_dir'])
+        if not self.options['workers']:
+            self.options['workers'] = max(1, (os.cpu_count() or 4) // len(specs))
+
+        # 模拟窗口使用临时生成的合成按钮，不写入模板编译缓存
+        store = TemplateStore() if self.fake else None
+        cache = build_shared_templates(self.food_name, btns_dir=self.options['btns_dir'], store=store)
+        shm, manifest = cache.export_shared()
+        input_lock = self.ctx.RLock()
+        results = self.ctx.Queue()
+        logger.info(f"启动 {len(specs)} 个实例, 共享模板 {shm.size / 1024:.0f} KB, "
+                    f"每个实例 {self.options['workers']} 个匹配线程")
+
+        reports = {}
+        try:
+            self.processes = [
+                self.ctx.Process(target=run_instance, name=spec['title'], daemon=True,
+                                 args=(spec, shm.name, manifest, input_lock, results, self.options))
+                for spec in specs
+            ]
+            for process in self.processes:
+                process.start()
+            # 先取结果再 join，避免子进程因队列未被读取而无法退出
+            while len(reports) < len(specs) and any(p.is_alive() for p in self.processes):
+                try:
+                    index, report = results.get(timeout=0.5)
+                    reports[index] = report
+                except queue.Empty:
+                    continue
+            for process in self.processes:
+                process.join()
+        except KeyboardInterrupt:
+            logger.info("收到键盘中断信号，停止所有实例")
+            self.stop()
+        finally:
+            shm.close()
+            shm.unlink()
+        return reports
+
+    def stop(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
+
+    @property
+    def collisions(self):
+        """模拟窗口模式下检测到的鼠标操作重叠次数（串行化正确时应为0）"""
+        return self.options['collisions'].value
+
+
+def print_reports(reports, collisions):
+    elapsed = max((report['elapsed_s'] for report in reports.values()), default=0.0)
+    print(f"实例数: {len(reports)}, 运行时长: {elapsed:.1f}s, 鼠标操作重叠: {collisions}")
+    print(f"  {'实例':<6}{'菜品':>6}{'循环':>6}{'点击':>6}{'循环/小时':>12}{'等锁平均ms':>12}{'等锁p95 ms':>12}")
+    dishes_per_hour = 0.0
+    for index, report in sorted(reports.items()):
+        wait = report['input_wait']
+        if 'dishes' in report:
+            dishes_per_hour += report['dishes_per_hour']
+            print(f"  {index:<6}{report['dishes']:>6}{report['cycles']:>6}{report['clicks']:>6}"
+                  f"{report['cycles_per_hour']:>12.1f}{wait['mean_ms']:>12.1f}{wait['p95_ms']:>12.1f}")
+        else:
+            print(f"  {index:<6}{'-':>6}{report['loops']:>6}{'-':>6}{'-':>12}"
+                  f"{wait['mean_ms']:>12.1f}{wait['p95_ms']:>12.1f}")
+    if dishes_per_hour:
+        print(f"合计菜品/小时: {dishes_per_hour:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='MuMu模拟器多开自动烹饪')
+    parser.add_argument('--food', type=str, default='sala', help='食物名称')
+    parser.add_argument('--loop', type=int, default=-1, help='每个实例的循环次数，-1表示无限循环')
+    parser.add_argument('--window', type=str, default='MuMu', help='模拟器窗口标题包含的关键字')
+    parser.add_argument('--match-mode', type=str, default='exhaustive', choices=['exhaustive', 'coarse', 'fft', 'binary'])
+    parser.add_argument('--workers', type=int, default=None, help='每个实例的模板匹配线程数')
+    parser.add_argument('--adb', type=int, default=0,
+                        help='通过ADB驱动N个MuMu实例（127.0.0.1:16384+32*i），窗口无需平铺可见')
+    parser.add_argument('--adb-port', type=int, default=5037, help='adb server 端口')
+    parser.add_argument('--fake', type=int, default=0, help='使用N个本地模拟窗口代替模拟器（扩展性测试）')
+    parser.add_argument('--cycles', type=int, default=2, help='模拟窗口模式下每个实例完成的循环数')
+    parser.add_argument('--duration', type=float, default=300, help='模拟窗口模式下的最长运行时间（秒）')
+    parser.add_argument('--cook-time', type=float, default=2.0, help='模拟厨房的烹饪时间（秒）')
+    parser.add_argument('--ui-latency', type=float, default=0.15, help='模拟窗口点击后的界面响应延迟（秒）')
+    parser.add_argument('--json', type=str, default=None, help='将各实例报告写入JSON文件')
+    parser.add_argument('--log-level', type=str, default='WARNING', help='各实例的日志级别')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+    supervisor = MumuSupervisor(args.food, loop_count=args.loop, window_title=args.window,
+                                match_mode=args.match_mode, match_workers=args.workers, fake=args.fake,
+                                cycles=args.cycles, duration=args.duration, cook_time=args.cook_time,
+                                ui_latency=args.ui_latency, log_level=args.log_level, adb=args.adb,
+                                adb_port=args.adb_port)
+    reports = supervisor.run()
+    print_reports(reports, supervisor.collisions)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({str(index): report for index, report in reports.items()}, f, indent=4, ensure_ascii=False)
+    return 0 if reports else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 覆盖层模块
+负责在屏幕上绘制检测框。检测线程只把最新结果放入单槽通道，覆盖层按限定帧率自行重绘，
+不再占用检测的关键路径
+"""
+
+import time
+import threading
+import tkinter as tk
+
+# 覆盖层默认最高刷新帧率
+OVERLAY_FPS = 15
+
+
+class LatestValue:
+    """只保留最新值的单槽通道
+
+    生产者 put 直接覆盖旧值，从不阻塞；消费者 take 只在有新值时返回，
+    中间被覆盖的值直接丢弃（覆盖层只需要显示最新一次的检测结果）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = 0
+        self._taken = 0
+
+    def put(self, value):
+        with self._lock:
+            self._value = value
+            self._version += 1
+
+    def take(self):
+        """取出最新值，自上次 take 后没有新值时返回None"""
+        with self._lock:
+            if self._version == self._taken:
+                return None
+            self._taken = self._version
+            return self._value
+
+
+class OverlayWindow:
+    """透明置顶的检测框覆盖层
+
+    update_overlay 只把检测结果放入 LatestValue，实际绘制在 pump 中进行：
+    主循环每个tick调用 pump，距上次绘制不足 1/fps 秒时直接返回，
+    结果没有变化时也不重绘。
+    """
+
+    def __init__(self, fps=OVERLAY_FPS, line_width=2, font_size=10):
+        self.root = tk.Tk()
+        self.root.title("Overlay")
+        self.root.attributes('-topmost', True)  # 置顶
+        self.root.attributes('-alpha', 0.8)  # 设置透明度
+        self.root.attributes('-transparentcolor', 'white')  # 设置透明色
+        self.root.overrideredirect(True)  # 无边框
+
+        # 获取屏幕尺寸
+        screen_width = self.root.winfo_screenwidth()
+        screen_height = self.root.winfo_screenheight()
+
+        # 设置窗口大小和位置
+        self.root.geometry(f"{screen_width}x{screen_height}+0+0")
+
+        # 创建画布
+        self.canvas = tk.Canvas(self.root, width=screen_width, height=screen_height,
+                                highlightthickness=0, bg='white')
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+
+        self.line_width = line_width
+        self.font_size = font_size
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.channel = LatestValue()
+        self.next_frame = 0.0
+        self.updates = 0  # update_overlay 调用次数
+        self.redraws = 0  # 实际重绘次数
+
+    def update_overlay(self, matches, button_name=None):
+        """提交最新的检测结果（检测线程调用，不做任何绘制）"""
+        self.updates += 1
+        self.channel.put(([list(match)[:5] for match in matches], button_name))
+
+    def pump(self):
+        """按限定帧率绘制最新结果并处理Tk事件（主循环每个tick调用）"""
+        now = time.perf_counter()
+        if now < self.next_frame:
+            return
+        self.next_frame = now + self.interval
+        value = self.channel.take()
+        if value is not None:
+            self.draw(*value)
+        self.root.update()
+
+    def draw(self, matches, button_name):
+        """重绘画布"""
+        self.redraws += 1
+        self.canvas.delete("all")
+
+        for x, y, w, h, conf in matches:
+            # 绘制绿色矩形框
+            self.canvas.create_rectangle(x, y, x + w, y + h,
+                                         outline='green', width=self.line_width)
+
+            # 显示按钮名称和置信度
+            display_text = f'{conf:.2f}'
+            if button_name:
+                display_text = f'{button_name}: {display_text}'
+
+            self.canvas.create_text(x, y - 3, text=display_text,
+                                    fill='green', anchor='sw',
+                                    font=('Arial', self.font_size, 'bold'))
+
+    def show(self):
+        """显示窗口"""
+        self.root.deiconify()
+
+    def close(self):
+        """关闭窗口"""
+        self.root.destroy()
+
+
+class NullOverlay:
+    """无人值守模式使用的空覆盖层，接口与 OverlayWindow 相同但不创建任何窗口"""
+
+    updates = 0
+    redraws = 0
+
+    def update_overlay(self, matches, button_name=None):
+        pass
+
+    def pump(self):
+        pass
+
+    def show(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_overlay(enabled=True, **kwargs):
+    """创建覆盖层，enabled为False时返回 NullOverlay"""
+    if not enabled:
+        return NullOverlay()
+    return OverlayWindow(**kwargs)
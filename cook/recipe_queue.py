@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 菜谱队列模块
+按顺序制作多种菜品（如 30 个葡萄酱，然后 20 个提拉米苏），不需要在菜品之间停止和重启机器人：
+  - RecipeQueue 记录每道菜的目标数量、已下锅数量和已完成数量，决定下一个空闲灶台做什么
+  - StoveScheduler 按菜单/finish按钮的位置识别是哪个灶台，记录每个灶台的忙碌时间，
+    统计灶台利用率和每小时完成的菜品数
+  - CookTimes 记录每种食物从点击start到出现finish按钮的时间，调度器据此预计每个灶台的完成时间，
+    只在预计完成时间附近检测finish按钮，其余时间空闲
+
+菜谱格式: "葡萄酱:30,提拉米苏:20"，数量省略或为-1表示不限数量。
+"""
+
+import os
+import re
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 灶台数量（菜单按钮数量）
+STOVE_COUNT = 3
+# 提前于预计完成时间开始密集检测finish按钮的秒数（另加预计烹饪时间的 FINISH_BURST_RATIO）
+FINISH_BURST_LEAD = 1.0
+FINISH_BURST_RATIO = 0.05
+# 看到finish按钮前一次检测（未出现）距今不超过该秒数时，才把看到的时间记为准确的烹饪时间
+FINISH_POLL_GAP = 1.0
+# 菜谱全部下锅后，超过预计烹饪时间的这么多倍仍没有看到finish按钮就停止等待
+FINISH_STALL_FACTOR = 3
+# 正在制作的食物没有烹饪时间记录时，停止等待前的秒数
+FINISH_STALL_DEFAULT = 600.0
+# 烹饪时间的指数滑动平均系数
+COOK_TIME_ALPHA = 0.3
+
+
+def parse_recipes(text):
+    """解析菜谱字符串，返回 [(食物名称, 目标数量)]，目标数量为None表示不限数量
+
+    支持中英文逗号、分号或换行分隔，食物名称和数量之间用冒号或*分隔。
+    """
+    recipes = []
+    for item in re.split(r'[,，;；\n]', text or ''):
+        item = item.strip()
+        if not item:
+            continue
+        parts = re.split(r'[:：*]', item)
+        name = parts[0].strip()
+        if not name:
+            raise ValueError(f"菜谱缺少食物名称: {item}")
+        target = None
+        if len(parts) > 1 and parts[1].strip():
+            try:
+                target = int(parts[1])
+            except ValueError:
+                raise ValueError(f"菜谱数量不是整数: {item}")
+            if target < 0:
+                target = None
+        recipes.append((name, target))
+    return recipes
+
+
+class RecipeQueue:
+    """按顺序排列的菜谱，每道菜下锅数量达到目标后再安排下一道"""
+
+    def __init__(self, recipes):
+        """
+        :param recipes: [(食物名称, 目标数量)] 或菜谱字符串，目标数量为None表示不限数量
+        """
+        if isinstance(recipes, str):
+            recipes = parse_recipes(recipes)
+        self.entries = [{'food': food, 'target': target, 'started': 0, 'done': 0} for food, target in recipes]
+
+    def entry(self, food):
+        """返回该食物第一个还需要制作的条目（同一食物可以出现多次）"""
+        for entry in self.entries:
+            if entry['food'] == food and (entry['target'] is None or entry['done'] < entry['target']):
+                return entry
+        return None
+
+    def next_food(self):
+        """下一个空闲灶台应该做的食物，所有菜谱都已下锅时返回None"""
+        for entry in self.entries:
+            if entry['target'] is None or entry['started'] < entry['target']:
+                return entry['food']
+        return None
+
+    def started(self, food):
+        """记录一道菜下锅"""
+        for entry in self.entries:
+            if entry['food'] == food and (entry['target'] is None or entry['started'] < entry['target']):
+                entry['started'] += 1
+                return
+
+    def completed(self, food):
+        """记录一道菜完成"""
+        entry = self.entry(food)
+        if entry is not None:
+            entry['done'] += 1
+
+    @property
+    def finished(self):
+        """所有有限数量的菜谱都已完成（含不限数量的菜谱时永远不会完成）"""
+        return all(entry['target'] is not None and entry['done'] >= entry['target'] for entry in self.entries)
+
+    def summary(self):
+        return [dict(entry) for entry in self.entries]
+
+    def __str__(self):
+        return ', '.join(f"{entry['food']} {entry['done']}/{'∞' if entry['target'] is None else entry['target']}"
+                         for entry in self.entries)
+
+
+class CookTimes:
+    """每种食物的烹饪时间（从点击start到出现finish按钮，秒），指数滑动平均，保存在JSON文件中"""
+
+    def __init__(self, path=None, alpha=COOK_TIME_ALPHA):
+        """
+        :param path: 保存路径，None表示不持久化
+        :param alpha: 新观测值的权重
+        """
+        self.path = path
+        self.alpha = alpha
+        self._times = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._times = json.load(f)
+            logger.info(f"已加载烹饪时间记录: {self.path}")
+        except Exception as e:
+            logger.error(f"加载烹饪时间记录失败: {e}")
+            self._times = {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._times, f, indent=4, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存烹饪时间记录失败: {e}")
+
+    def expected(self, food):
+        """预计烹饪时间，没有记录时返回None"""
+        return self._times.get(food)
+
+    def observe(self, food, seconds):
+        previous = self._times.get(food)
+        self._times[food] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        logger.info(f"{food} 烹饪时间 {seconds:.1f}s，预计烹饪时间更新为 {self._times[food]:.1f}s")
+        self.save()
+
+    def observe_upper_bound(self, food, seconds, margin):
+        """finish按钮第一次检测时就已经出现：实际烹饪时间不超过 seconds，预计时间缩短 margin 秒（且不超过 seconds）"""
+        previous = self._times.get(food)
+        estimate = seconds if previous is None else min(previous, seconds)
+        self._times[food] = max(estimate - margin, 0.0)
+        logger.info(f"{food} 烹饪时间不超过 {seconds:.1f}s，预计烹饪时间缩短为 {self._times[food]:.1f}s")
+        self.save()
+
+
+class StoveScheduler:
+    """灶台调度：把菜谱队列中的菜品分配给空闲灶台，并统计灶台利用率
+
+    灶台按菜单按钮中心位置区分：新位置与已知灶台的距离超过按钮尺寸时视为新灶台（最多 stoves 个）。
+    finish按钮与菜单按钮的位置有偏差，只用 finish_stove 查找正在制作的已知灶台，不会登记新灶台。
+    """
+
+    def __init__(self, queue, stoves=STOVE_COUNT, cook_times=None, clock=time.time):
+        self.queue = queue
+        self.clock = clock
+        self.capacity = stoves
+        self.cook_times = cook_times if cook_times is not None else CookTimes()
+        self.stoves = []  # [{'center', 'food', 'started_at', 'seen_at', 'absent_at', 'busy_s', 'dishes'}]
+        self.started_at = clock()
+        self.idle_s = 0.0  # 预计没有灶台完成时的空闲时间
+        self.unconfirmed = {}  # {灶台序号: finish按钮}，点击后未确认消失、等待下次检测确认的finish按钮
+        self.progress_at = self.started_at  # 最近一次下锅、看到finish按钮或收取菜品的时间
+        self.polled_at = None  # 最近一次检测finish按钮的时间
+
+    def _nearest(self, button):
+        """返回 (最近的已知灶台序号, 距离, 按钮中心, 按钮尺寸)，没有已知灶台时序号为None"""
+        x, y, w, h = [float(value) for value in button[:4]]
+        cx, cy = x + w / 2, y + h / 2
+        best, best_distance = None, None
+        for index, stove in enumerate(self.stoves):
+            distance = ((stove['center'][0] - cx) ** 2 + (stove['center'][1] - cy) ** 2) ** 0.5
+            if best_distance is None or distance < best_distance:
+                best, best_distance = index, distance
+        return best, best_distance, (cx, cy), max(w, h)
+
+    def nearest_stove(self, button):
+        """按finish按钮 [x, y, w, h, ...] 查找最近的已知灶台序号，还没有记录灶台时返回None（只查找，不登记）"""
+        return self._nearest(button)[0]
+
+    def stove_for(self, button):
+        """按菜单按钮 [x, y, w, h, ...] 找到对应的灶台序号，新位置登记为新灶台"""
+        best, best_distance, (cx, cy), size = self._nearest(button)
+        if best is not None and (best_distance <= size or len(self.stoves) >= self.capacity):
+            return best
+
+        self.stoves.append({'center': (cx, cy), 'food': None, 'started_at': None, 'seen_at': None, 'absent_at': None,
+                            'busy_s': 0.0, 'dishes': 0})
+        logger.info(f"记录第 {len(self.stoves)} 个灶台位置: ({cx:.0f}, {cy:.0f})")
+        return len(self.stoves) - 1
+
+    def next_food(self):
+        return self.queue.next_food()
+
+    def start(self, stove, food):
+        """灶台开始制作食物（start按钮点击成功后调用）"""
+        self.stoves[stove].update(food=food, started_at=self.clock(), seen_at=None, absent_at=None)
+        self.progress_at = self.clock()
+        self.queue.started(food)
+        logger.info(f"灶台 {stove + 1} 开始制作 {food}，菜谱进度: {self.queue}")
+
+    def finish_stove(self, button):
+        """按finish按钮 [x, y, w, h, ...] 找到正在制作的灶台序号，找不到时返回None
+
+        最近的灶台没有在制作时（finish按钮与菜单按钮位置偏差较大），只有最早下锅的灶台已过预计完成时间
+        才记到该灶台上，否则跳过该按钮，避免把烹饪时间和完成数量记到别的灶台和食物上。
+        """
+        stove = self.nearest_stove(button)
+        if stove is None or self.stoves[stove]['started_at'] is not None:
+            return stove
+        busy = [index for index, item in enumerate(self.stoves) if item['started_at'] is not None]
+        if busy:
+            earliest = min(busy, key=lambda index: self.stoves[index]['started_at'])
+            expected = self.expected_finish(earliest)
+            if expected is not None and expected <= self.clock():
+                return earliest
+        x, y, w, h = [float(value) for value in button[:4]]
+        logger.info(f"finish按钮 ({x + w / 2:.0f}, {y + h / 2:.0f}) 附近的灶台 {stove + 1} 没有在制作，"
+                    f"且没有已过预计完成时间的灶台，跳过")
+        return None
+
+    def finish_seen(self, stove):
+        """检测到灶台（finish_stove 返回的序号）的finish按钮：第一次看到时记录该食物的烹饪时间
+
+        只有上一次检测（不超过 FINISH_POLL_GAP 秒前）时该灶台还没有finish按钮，看到的时间才是准确的烹饪时间。
+        否则按钮可能早已出现（检测窗口打开前、或机器人正在操作其他灶台的食物面板），
+        已有预计时间时只作为上限把预计时间缩短一个提前量，还没有预计时间时不记录。
+        """
+        now = self.clock()
+        self.progress_at = now
+        state = self.stoves[stove]
+        if state['started_at'] is None or state['seen_at'] is not None:
+            return
+        state['seen_at'] = now
+        food = state['food']
+        if food is None:
+            return
+        seconds = now - state['started_at']
+        polled = (state['absent_at'] is not None and state['absent_at'] == self.polled_at
+                  and now - self.polled_at <= FINISH_POLL_GAP)
+        expected = self.cook_times.expected(food)
+        if polled:
+            self.cook_times.observe(food, seconds)
+        elif expected is not None:
+            self.cook_times.observe_upper_bound(food, seconds, self._lead(expected))
+        else:
+            logger.info(f"灶台 {stove + 1} 的finish按钮不是在连续检测中出现的，不记录 {food} 的烹饪时间")
+
+    def finish_polled(self, seen):
+        """一次finish按钮检测结束，seen 为本次看到finish按钮的灶台序号：记录其余正在制作的灶台此时还没有完成"""
+        now = self.clock()
+        for index, state in enumerate(self.stoves):
+            if state['started_at'] is not None and state['seen_at'] is None and index not in seen:
+                state['absent_at'] = now
+        self.polled_at = now
+
+    @staticmethod
+    def _lead(cook_time):
+        """预计完成时间前开始密集检测finish按钮的提前量（秒）"""
+        return FINISH_BURST_LEAD + FINISH_BURST_RATIO * cook_time
+
+    def expected_finish(self, stove):
+        """灶台的预计完成时间，空闲或没有烹饪时间记录时返回None"""
+        state = self.stoves[stove]
+        expected = self.cook_times.expected(state['food']) if state['started_at'] is not None else None
+        return None if expected is None else state['started_at'] + expected
+
+    @property
+    def all_busy(self):
+        return len(self.stoves) >= self.capacity and not self.idle_stoves
+
+    def seconds_until_finish_check(self):
+        """距离需要检测finish按钮还有多少秒，0表示现在就需要检测
+
+        灶台位置还没记录全、有灶台的烹饪时间未知、或有灶台进入预计完成时间前的密集检测窗口时为0；
+        超过预计完成时间仍未看到finish按钮的灶台一直保持在检测窗口内。
+        """
+        if len(self.stoves) < self.capacity:
+            return 0.0
+        now = self.clock()
+        waits = []
+        for index, state in enumerate(self.stoves):
+            if state['started_at'] is None or state['seen_at'] is not None:
+                continue
+            expected = self.expected_finish(index)
+            if expected is None:
+                return 0.0
+            waits.append(expected - self._lead(expected - state['started_at']) - now)
+        return max(min(waits), 0.0) if waits else 0.0
+
+    def finish_check_due(self):
+        return self.seconds_until_finish_check() <= 0
+
+    def record_idle(self, seconds):
+        self.idle_s += seconds
+
+    def finish(self, stove):
+        """灶台（finish_stove 返回的序号）的菜品已收取（finish按钮点击成功后调用），返回完成的食物"""
+        self.unconfirmed.pop(stove, None)
+        self.progress_at = self.clock()
+        state = self.stoves[stove]
+        food = state['food']
+        if state['started_at'] is not None:
+            state['busy_s'] += self.clock() - state['started_at']
+        state.update(food=None, started_at=None, seen_at=None, absent_at=None)
+        state['dishes'] += 1
+        if food is not None:
+            self.queue.completed(food)
+        logger.info(f"灶台 {stove + 1} 完成 {food}，菜谱进度: {self.queue}")
+        return food
+
+    def finish_unconfirmed(self, stove, button):
+        """点击finish按钮后没有在超时内确认消失：暂不记完成，下次检测finish按钮时再确认"""
+        self.unconfirmed[stove] = button
+
+    def settle_unconfirmed(self, finish_buttons):
+        """用最新一次finish按钮检测结果确认之前未确认的点击：原位置已没有finish按钮的记为该灶台完成"""
+        for stove, button in list(self.unconfirmed.items()):
+            if any(self._same_place(button, other) for other in finish_buttons):
+                continue
+            logger.info(f"灶台 {stove + 1} 的finish按钮已消失，补记完成")
+            self.finish(stove)
+
+    @staticmethod
+    def _same_place(button, other):
+        """两个检测框的中心距离不超过按钮尺寸"""
+        x, y, w, h = [float(value) for value in button[:4]]
+        ox, oy, ow, oh = [float(value) for value in other[:4]]
+        distance = ((x + w / 2 - ox - ow / 2) ** 2 + (y + h / 2 - oy - oh / 2) ** 2) ** 0.5
+        return distance <= max(w, h)
+
+    def stalled(self):
+        """等待灶台完成时，超过 FINISH_STALL_FACTOR 倍预计烹饪时间都没有下锅、看到finish按钮或收取菜品
+
+        正在制作的食物都没有烹饪时间记录时按 FINISH_STALL_DEFAULT 秒计算。
+        """
+        expected = [self.cook_times.expected(stove['food']) for stove in self.stoves if stove['started_at'] is not None]
+        expected = [seconds for seconds in expected if seconds is not None]
+        limit = FINISH_STALL_FACTOR * max(expected) if expected else FINISH_STALL_DEFAULT
+        return self.clock() - self.progress_at > limit
+
+    @property
+    def idle_stoves(self):
+        return [index for index, stove in enumerate(self.stoves) if stove['started_at'] is None]
+
+    def report(self):
+        """返回 {'elapsed_s', 'dishes', 'dishes_per_hour', 'utilization', 'stoves', 'recipes'}
+
+        灶台利用率 = 从下锅到收取的时间 / 运行时长，正在制作的菜品计入到当前时刻。
+        """
+        now = self.clock()
+        elapsed = max(now - self.started_at, 1e-9)
+        stoves = []
+        for index, stove in enumerate(self.stoves):
+            busy = stove['busy_s'] + (now - stove['started_at'] if stove['started_at'] is not None else 0.0)
+            stoves.append({'stove': index + 1, 'dishes': stove['dishes'], 'busy_s': busy,
+                           'utilization': busy / elapsed, 'food': stove['food']})
+        dishes = sum(stove['dishes'] for stove in stoves)
+        return {
+            'elapsed_s': elapsed,
+            'dishes': dishes,
+            'dishes_per_hour': dishes / (elapsed / 3600),
+            'utilization': sum(stove['busy_s'] for stove in stoves) / (elapsed * self.capacity),
+            'idle_s': self.idle_s,
+            'stoves': stoves,
+            'recipes': self.queue.summary(),
+        }
+
+    def log_report(self):
+        report = self.report()
+        logger.info(f"[灶台] 运行 {report['elapsed_s']:.0f}s, 完成 {report['dishes']} 道菜, "
+                    f"{report['dishes_per_hour']:.1f} 道/小时, 灶台利用率 {report['utilization']:.0%}, "
+                    f"等待完成时空闲 {report['idle_s']:.0f}s")
+        for stove in report['stoves']:
+            logger.info(f"[灶台] 灶台 {stove['stove']}: 完成 {stove['dishes']} 道, 利用率 {stove['utilization']:.0%}")
+        logger.info(f"[灶台] 菜谱进度: {self.queue}")
+        return report
@@ -0,0 +1,701 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 离线回放模块
+不依赖游戏和Windows环境，用合成或录制的画面驱动 CookingBot，测量烹饪循环吞吐量
+
+模拟游戏根据 mouse_click 的坐标切换画面（菜单、食物面板、烹饪中、完成），
+统计每小时完成的循环数、各状态停留时间和各模板的检测耗时。可在Linux上无界面运行。
+
+用法:
+    python replay.py --cycles 3 --cook-time 2
+    python replay.py --frames ./recorded_scenes --duration 60
+    python replay.py --json replay_report.json
+    python replay.py --recipes "葡萄酱:4,提拉米苏:2"
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import logging
+import argparse
+import struct
+import tempfile
+import threading
+import socketserver
+from collections import defaultdict, namedtuple
+
+import cv2
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FOODS_DIR = os.path.join(SCRIPT_DIR, "foods")
+
+logger = logging.getLogger(__name__)
+
+# 无界面运行时替换的桌面交互模块（截图和点击都由回放框架接管）
+HEADLESS_MODULES = ('pyautogui', 'keyboard', 'win32gui', 'win32con', 'win32com', 'win32com.client', 'tkinter')
+
+
+class _Null:
+    """吸收任意属性访问和调用的空对象，用于替代无界面环境下的窗口、热键等接口"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Null()
+
+    def __call__(self, *args, **kwargs):
+        return _Null()
+
+    def __bool__(self):
+        return False
+
+    def __int__(self):
+        return 0
+
+    def __str__(self):
+        return ''
+
+    __format__ = object.__format__
+
+
+def _null_module(name):
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attr: _Null()
+    return module
+
+
+def install_headless_modules(screen_size=(1920, 1080)):
+    """注册无界面环境下的桌面交互模块，必须在导入 cook 之前调用
+
+    截图由 capture_source 提供、点击由 ReplayHarness 接管，这些模块只需要能被导入和调用。
+    """
+    Size = namedtuple('Size', 'width height')
+    Point = namedtuple('Point', 'x y')
+
+    pyautogui = _null_module('pyautogui')
+    pyautogui.size = lambda: Size(*screen_size)
+    pyautogui.position = lambda: Point(0, 0)
+    win32com = _null_module('win32com')
+    win32com.client = _null_module('win32com.client')
+
+    modules = {name: _null_module(name) for name in HEADLESS_MODULES}
+    modules.update({'pyautogui': pyautogui, 'win32com': win32com, 'win32com.client': win32com.client})
+    sys.modules.update(modules)
+
+
+def imread_unicode(path):
+    """读取图像，兼容中文路径"""
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_button(text, color, size, hatch=False):
+    """生成合成按钮图像：纯色按钮加白边和文字，用于没有 btns 模板时"""
+    w, h = size
+    button = np.full((h, w, 3), color, dtype=np.uint8)
+    if hatch:
+        # 斜线底纹，让大按钮内部也有足够的纹理
+        for offset in range(-h, w, 14):
+            cv2.line(button, (offset, h), (offset + h, 0), (255, 255, 255), 2)
+    cv2.rectangle(button, (2, 2), (w - 3, h - 3), (255, 255, 255), 3)
+    scale = 0.9
+    (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_DUPLEX, scale, 2)
+    cv2.putText(button, text, ((w - tw) // 2, (h + th) // 2), cv2.FONT_HERSHEY_DUPLEX, scale,
+                (255, 255, 255), 2, cv2.LINE_AA)
+    return button
+
+
+# 合成按钮：模板键 -> (文字, 颜色BGR, 尺寸)，尺寸和宽高比各不相同以免互相误匹配
+SYNTHETIC_BUTTONS = {
+    'cook_menu': ('M', (60, 140, 220), (96, 96)),
+    'cook': ('', (40, 90, 200), (72, 150)),
+    'finish': ('OK', (60, 170, 60), (84, 120)),
+    'cook_start': ('START', (200, 120, 40), (240, 72)),
+    'back': ('<', (110, 110, 110), (64, 64)),
+}
+
+
+def write_synthetic_buttons(directory):
+    """将合成按钮写入目录，文件名与 CookingBot.template_config 一致"""
+    os.makedirs(directory, exist_ok=True)
+    buttons = {}
+    for key, (text, color, size) in SYNTHETIC_BUTTONS.items():
+        # cook按钮的检测阈值最低，使用斜线底纹避免与面板边缘等直线结构误匹配
+        buttons[key] = make_button(text, color, size, hatch=(key == 'cook'))
+        cv2.imwrite(os.path.join(directory, f"{key}.png"), buttons[key])
+    return buttons
+
+
+def paste(canvas, image, x, y):
+    """将图像粘贴到画布，返回粘贴区域 (x, y, w, h)"""
+    h, w = image.shape[:2]
+    canvas[y:y + h, x:x + w] = image
+    return (x, y, w, h)
+
+
+def inside(rect, x, y):
+    rx, ry, rw, rh = rect
+    return rx <= x < rx + rw and ry <= y < ry + rh
+
+
+class SyntheticKitchen:
+    """脚本化的模拟厨房
+
+    画面由模板合成：空闲的灶台上方显示菜单按钮，烹饪中显示进度条，烹饪完成显示finish按钮；
+    点击菜单按钮弹出食物面板（食物图标、start和back按钮），选中食物后点击start开始烹饪，
+    点击finish收取菜品。点击效果在 ui_latency 秒后才出现在画面上，模拟真实的界面延迟。
+    food_name 可以是食物名称列表（菜谱队列），列表中的食物都可以下锅，按食物分别统计完成数量。
+    """
+
+    def __init__(self, buttons, food_name, stoves=3, cook_time=3.0, ui_latency=0.15,
+                 size=(1080, 1920), offset=(0, 0), seed=0):
+        self.buttons = buttons
+        self.foods = [food_name] if isinstance(food_name, str) else list(food_name)
+        self.food_name = self.foods[0]
+        self.cook_time = cook_time
+        self.ui_latency = ui_latency
+        self.offset = offset
+        self.lock = threading.Lock()
+
+        rng = np.random.default_rng(seed)
+        height, width = size
+        noise = rng.integers(60, 140, (height // 16, width // 16, 3), dtype=np.uint8)
+        self.background = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+
+        # 食物面板中的图标：目标食物放在前面，其余食物作为干扰项，共8个
+        names = sorted({f[:-4] for f in os.listdir(FOODS_DIR) if f.endswith('.png') and not f[:-4].endswith('_1')})
+        names = (self.foods + [name for name in names if name not in self.foods])[:max(8, len(self.foods))]
+        self.food_icons = [(name, imread_unicode(os.path.join(FOODS_DIR, f"{name}.png"))) for name in names]
+
+        self.stoves = [{'state': 'idle', 'ready_at': 0.0, 'food': None, 'x': width * (i + 1) // (stoves + 1)}
+                       for i in range(stoves)]
+        self.panel = None  # 打开食物面板的灶台序号
+        self.selected = None  # 面板中选中的食物（游戏会记住上次选择）
+        self.pending = []  # [(生效时间, 动作)]
+        self.dishes = 0
+        self.dishes_by_food = defaultdict(int)
+        self.clicks = 0
+        self.started_at = time.time()
+
+    def capture(self):
+        """capture_source 接口：返回 (RGB画面, 画面左上角屏幕坐标)"""
+        with self.lock:
+            self.apply_pending()
+            frame, _ = self.render()
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), self.offset
+
+    def apply_pending(self):
+        now = time.time()
+        due = [action for at, action in self.pending if at <= now]
+        self.pending = [(at, action) for at, action in self.pending if at > now]
+        for action in due:
+            action()
+        for stove in self.stoves:
+            if stove['state'] == 'cooking' and now >= stove['ready_at']:
+                stove['state'] = 'done'
+
+    def render(self):
+        """绘制当前画面，同时返回可点击区域 [(rect, 动作)]"""
+        frame = self.background.copy()
+        targets = []
+        now = time.time()
+        stove_y = frame.shape[0] // 2
+
+        for index, stove in enumerate(self.stoves):
+            x = stove['x']
+            cv2.circle(frame, (x, stove_y + 90), 80, (40, 40, 40), -1)
+            if stove['state'] == 'idle':
+                button = self.buttons['cook_menu']
+                rect = paste(frame, button, x - button.shape[1] // 2, stove_y - 100)
+                targets.append((rect, ('menu', index)))
+            elif stove['state'] == 'cooking':
+                progress = 1.0 - max(stove['ready_at'] - now, 0.0) / self.cook_time
+                cv2.rectangle(frame, (x - 100, stove_y - 60), (x - 100 + int(200 * progress), stove_y - 40),
+                              (0, 200, 255), -1)
+            else:
+                button = self.buttons['finish']
+                rect = paste(frame, button, x - button.shape[1] // 2, stove_y - 100)
+                targets.append((rect, ('finish', index)))
+
+        if self.panel is not None:
+            height, width = frame.shape[:2]
+            x0, y0 = width // 2 - 420, height // 2 - 300
+            cv2.rectangle(frame, (x0, y0), (x0 + 840, y0 + 600), (230, 225, 215), -1)
+            targets = [(paste(frame, self.buttons['back'], x0 + 20, y0 + 20), ('back', None))]
+            for i, (name, icon) in enumerate(self.food_icons):
+                cx = x0 + 30 + (i % 4) * 200
+                cy = y0 + 100 + (i // 4) * 210
+                if name == self.selected:
+                    # 选中效果：图标整体提亮（不影响相关系数匹配）
+                    icon = cv2.add(icon, (40, 40, 40, 0))
+                targets.append((paste(frame, icon, cx, cy), ('food', name)))
+            start = self.buttons['cook_start']
+            targets.append((paste(frame, start, x0 + 840 - start.shape[1] - 30, y0 + 600 - start.shape[0] - 30),
+                            ('start', None)))
+        return frame, targets
+
+    def click(self, x, y):
+        """响应屏幕坐标的点击，效果在 ui_latency 秒后生效"""
+        with self.lock:
+            self.clicks += 1
+            self.apply_pending()
+            _, targets = self.render()
+            fx, fy = x - self.offset[0], y - self.offset[1]
+            for rect, (kind, arg) in reversed(targets):
+                if inside(rect, fx, fy):
+                    self.pending.append((time.time() + self.ui_latency, lambda: self.activate(kind, arg)))
+                    return kind
+        return None
+
+    def activate(self, kind, arg):
+        if kind == 'menu':
+            self.panel = arg
+        elif kind == 'food':
+            self.selected = arg
+        elif kind == 'start' and self.panel is not None and self.selected in self.foods:
+            stove = self.stoves[self.panel]
+            stove['state'] = 'cooking'
+            stove['food'] = self.selected
+            stove['ready_at'] = time.time() + self.cook_time
+            self.panel = None
+        elif kind == 'back':
+            self.panel = None
+        elif kind == 'finish':
+            self.stoves[arg]['state'] = 'idle'
+            self.dishes += 1
+            self.dishes_by_food[self.stoves[arg]['food']] += 1
+
+    @property
+    def cycles(self):
+        return self.dishes // len(self.stoves)
+
+
+class SceneScript:
+    """由录制画面和场景脚本驱动的模拟游戏
+
+    目录中的 scenes.json 描述场景图:
+        {
+            "start": "menu",
+            "offset": [0, 0],
+            "scenes": {
+                "menu": {"frame": "menu.png", "buttons": [{"rect": [x, y, w, h], "goto": "food"}]},
+                "cooking": {"frame": "cooking.png", "after": {"seconds": 3, "goto": "finish"}},
+                "finish": {"frame": "finish.png",
+                           "buttons": [{"rect": [x, y, w, h], "goto": "menu", "dishes": 3}]}
+            }
+        }
+    按钮坐标为画面内坐标；"dishes" 表示点击该按钮收取的菜品数。
+    """
+
+    def __init__(self, directory, ui_latency=0.15, stoves=3):
+        with open(os.path.join(directory, 'scenes.json'), 'r', encoding='utf-8') as f:
+            script = json.load(f)
+        self.scenes = script['scenes']
+        self.frames = {name: cv2.cvtColor(imread_unicode(os.path.join(directory, scene['frame'])), cv2.COLOR_BGR2RGB)
+                       for name, scene in self.scenes.items()}
+        self.offset = tuple(script.get('offset', (0, 0)))
+        self.ui_latency = ui_latency
+        self.stoves = [None] * stoves
+        self.lock = threading.Lock()
+        self.pending = []
+        self.dishes = 0
+        self.clicks = 0
+        self.enter(script['start'])
+
+    def enter(self, name):
+        self.scene = name
+        self.entered_at = time.time()
+
+    def apply_pending(self):
+        now = time.time()
+        due = [action for at, action in self.pending if at <= now]
+        self.pending = [(at, action) for at, action in self.pending if at > now]
+        for action in due:
+            action()
+        after = self.scenes[self.scene].get('after')
+        if after and now - self.entered_at >= after['seconds']:
+            self.enter(after['goto'])
+
+    def capture(self):
+        with self.lock:
+            self.apply_pending()
+            return self.frames[self.scene], self.offset
+
+    def click(self, x, y):
+        with self.lock:
+            self.clicks += 1
+            self.apply_pending()
+            fx, fy = x - self.offset[0], y - self.offset[1]
+            for button in self.scenes[self.scene].get('buttons', []):
+                if inside(button['rect'], fx, fy):
+                    self.pending.append((time.time() + self.ui_latency, lambda b=button: self.press(b)))
+                    return button['goto']
+        return None
+
+    def press(self, button):
+        self.dishes += button.get('dishes', 0)
+        self.enter(button['goto'])
+
+    @property
+    def cycles(self):
+        return self.dishes // len(self.stoves)
+
+
+class FakeAdbServer:
+    """本地替身 adb server，用于在没有模拟器时测试 adb_backend
+
+    实现 AdbDevice 用到的协议子集：host:version、host:connect、host:transport、
+    exec:screencap（原始RGBA输出）和 exec:sh（支持 input tap/swipe、wm size、echo）。
+    capture 返回 RGB画面 或 (RGB画面, 偏移)，点击和滑动转发给 click/swipe 回调。
+    """
+
+    def __init__(self, capture, click=None, swipe=None, input_latency=0.0, host='127.0.0.1', port=0):
+        """
+        :param capture: 无参数可调用对象，返回当前画面（RGB）
+        :param click: 收到 input tap 时调用 click(x, y)
+        :param swipe: 收到 input swipe 时调用 swipe(x1, y1, x2, y2, duration_ms)
+        :param input_latency: 模拟每条 input 命令的执行耗时（秒）
+        :param port: 监听端口，0表示自动分配
+        """
+        self.capture = capture
+        self.click = click
+        self.swipe = swipe
+        self.input_latency = input_latency
+        self.commands = []
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    server.serve(self.request)
+                except (ConnectionError, OSError):
+                    pass
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def reply(sock, message):
+        data = message.encode('utf-8')
+        sock.sendall(b'OKAY' + b'%04x' % len(data) + data)
+
+    def serve(self, sock):
+        while True:
+            header = sock.recv(4)
+            if len(header) < 4:
+                return
+            length = int(header, 16)
+            request = b''
+            while len(request) < length:
+                part = sock.recv(length - len(request))
+                if not part:
+                    return
+                request += part
+            request = request.decode('utf-8')
+
+            if request == 'host:version':
+                self.reply(sock, '0029')
+                return
+            if request.startswith('host:connect:'):
+                self.reply(sock, f"connected to {request[len('host:connect:'):]}")
+                return
+            if request.startswith('host:transport'):
+                sock.sendall(b'OKAY')  # 之后的请求发往设备
+                continue
+            if request == 'exec:screencap':
+                sock.sendall(b'OKAY')
+                self.send_screencap(sock)
+                return
+            if request == 'exec:sh':
+                sock.sendall(b'OKAY')
+                self.run_shell(sock)
+                return
+            message = f"unsupported service: {request}".encode('utf-8')
+            sock.sendall(b'FAIL' + b'%04x' % len(message) + message)
+            return
+
+    def send_screencap(self, sock):
+        frame = self.capture()
+        if isinstance(frame, tuple):
+            frame = frame[0]
+        rgba = cv2.cvtColor(frame, cv2.COLOR_RGB2RGBA)
+        height, width = rgba.shape[:2]
+        # 宽、高、像素格式（1 = RGBA_8888）、色彩空间
+        sock.sendall(struct.pack('<IIII', width, height, 1, 0))
+        sock.sendall(memoryview(np.ascontiguousarray(rgba)).cast('B'))
+
+    def run_shell(self, sock):
+        buffer = b''
+        while True:
+            part = sock.recv(4096)
+            if not part:
+                return
+            buffer += part
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                output = ''.join(self.execute(command.strip())
+                                 for command in line.decode('utf-8').split(';') if command.strip())
+                if output:
+                    sock.sendall(output.encode('utf-8'))
+
+    def execute(self, command):
+        self.commands.append(command)
+        args = command.split()
+        if args[:2] == ['input', 'tap']:
+            time.sleep(self.input_latency)
+            if self.click:
+                self.click(int(args[2]), int(args[3]))
+            return ''
+        if args[:2] == ['input', 'swipe']:
+            time.sleep(self.input_latency)
+            if self.swipe:
+                self.swipe(*[int(value) for value in args[2:7]])
+            return ''
+        if args[:2] == ['wm', 'size']:
+            frame = self.capture()
+            if isinstance(frame, tuple):
+                frame = frame[0]
+            return f"Physical size: {frame.shape[1]}x{frame.shape[0]}\n"
+        if args[0] == 'echo':
+            return ' '.join(args[1:]) + '\n'
+        return f"sh: {args[0]}: not found\n"
+
+
+class LatencyStats:
+    """按名称汇总耗时样本（秒）"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    def summary(self):
+        """返回 {名称: {'count', 'mean_ms', 'p95_ms', 'total_s'}}"""
+        result = {}
+        for name, values in self.samples.items():
+            values = np.asarray(values)
+            result[name] = {
+                'count': int(len(values)),
+                'mean_ms': float(values.mean() * 1000),
+                'p95_ms': float(np.percentile(values, 95) * 1000),
+                'total_s': float(values.sum()),
+            }
+        return result
+
+
+class ReplayHarness:
+    """将模拟游戏接到 CookingBot 上运行，并统计吞吐量和耗时
+
+    截图通过 capture_source 注入，点击通过替换实例的 mouse_click 转发给模拟游戏，
+    状态切换和检测方法在实例上包装计时，不修改 CookingBot 本身的逻辑。
+    route_clicks 为False时保留机器人自己的 mouse_click，由调用方让 pyautogui 把点击转发给模拟游戏。
+    """
+
+    def __init__(self, bot, game, route_clicks=True):
+        self.bot = bot
+        self.game = game
+        self.state_dwell = LatencyStats()  # 每次进入状态到离开的时间
+        self.handler_time = LatencyStats()  # 每个状态tick的处理时间
+        self.detect_time = LatencyStats()  # 每个模板每次检测的时间
+        self.clicks = []
+        self.elapsed = 0.0
+
+        bot.capture_source = game.capture
+        if route_clicks:
+            bot.mouse_click = self.mouse_click
+        self.wrap_state_changes()
+        self.wrap_handlers()
+        self.wrap_detections()
+
+    def mouse_click(self, x, y, double_click=False, delay=0.1):
+        """替代真实鼠标点击：转发给模拟游戏，点击后使当前帧失效"""
+        target = self.game.click(x, y)
+        if double_click:
+            self.game.click(x, y)
+        self.clicks.append((time.time(), self.bot.state.name, target))
+        self.bot.invalidate_frame()
+
+    def wrap_state_changes(self):
+        bot = self.bot
+        change_state = bot.change_state
+        self.state_entered = time.perf_counter()
+
+        def timed_change_state(new_state):
+            now = time.perf_counter()
+            self.state_dwell.add(bot.state.name, now - self.state_entered)
+            self.state_entered = now
+            change_state(new_state)
+
+        bot.change_state = timed_change_state
+
+    def wrap_handlers(self):
+        bot = self.bot
+        for name in [attr for attr in dir(type(bot)) if attr.startswith('handle_') and attr.endswith('_state')]:
+            handler = getattr(bot, name)
+
+            def timed_handler(handler=handler):
+                state = bot.state.name
+                start = time.perf_counter()
+                try:
+                    return handler()
+                finally:
+                    self.handler_time.add(state, time.perf_counter() - start)
+
+            setattr(bot, name, timed_handler)
+
+    def wrap_detections(self):
+        bot = self.bot
+        detect_buttons = bot.detect_buttons
+        detect_food = bot.detect_food
+
+        def timed_detect_buttons(template_name, *args, **kwargs):
+            if template_name == 'food':
+                return bot.detect_food()
+            start = time.perf_counter()
+            try:
+                return detect_buttons(template_name, *args, **kwargs)
+            finally:
+                self.detect_time.add(template_name, time.perf_counter() - start)
+
+        def timed_detect_food():
+            start = time.perf_counter()
+            try:
+                return detect_food()
+            finally:
+                self.detect_time.add('food', time.perf_counter() - start)
+
+        bot.detect_buttons = timed_detect_buttons
+        bot.detect_food = timed_detect_food
+
+    def run(self, cycles=None, duration=None):
+        """运行机器人，直到模拟游戏完成指定循环数或超过时长"""
+        start = time.time()
+
+        def watchdog():
+            while self.bot.running:
+                if cycles is not None and self.game.cycles >= cycles:
+                    break
+                if duration is not None and time.time() - start >= duration:
+                    break
+                time.sleep(0.05)
+            self.bot.running = False
+
+        thread = threading.Thread(target=watchdog, daemon=True)
+        thread.start()
+        self.bot.run()
+        self.bot.running = False
+        thread.join()
+        self.elapsed = time.time() - start
+        return self.report()
+
+    def report(self):
+        hours = max(self.elapsed, 1e-9) / 3600
+        report = {
+            'elapsed_s': self.elapsed,
+            'dishes': self.game.dishes,
+            'cycles': self.game.cycles,
+            'cycles_per_hour': self.game.cycles / hours,
+            'dishes_per_hour': self.game.dishes / hours,
+            'clicks': self.game.clicks,
+            'state_dwell': self.state_dwell.summary(),
+            'state_tick': self.handler_time.summary(),
+            'detect': self.detect_time.summary(),
+        }
+        if getattr(self.game, 'dishes_by_food', None):
+            report['dishes_by_food'] = dict(self.game.dishes_by_food)
+        scheduler = getattr(self.bot, 'scheduler', None)
+        if scheduler is not None:
+            report['stoves'] = scheduler.report()
+        return report
+
+
+def print_report(report):
+    print(f"运行时长: {report['elapsed_s']:.1f}s, 点击次数: {report['clicks']}")
+    print(f"完成菜品: {report['dishes']}, 完成循环: {report['cycles']}")
+    print(f"循环/小时: {report['cycles_per_hour']:.1f}, 菜品/小时: {report['dishes_per_hour']:.1f}")
+    if 'dishes_by_food' in report:
+        print("各菜品完成数量: " + ', '.join(f"{name} {count}" for name, count in report['dishes_by_food'].items()))
+    if 'stoves' in report:
+        stoves = report['stoves']
+        print(f"灶台利用率: {stoves['utilization']:.0%} ("
+              + ', '.join(f"灶台{item['stove']} {item['utilization']:.0%}" for item in stoves['stoves']) + ")")
+    for title, key in (('状态停留时间', 'state_dwell'), ('状态tick处理时间', 'state_tick'), ('模板检测时间', 'detect')):
+        print(f"\n{title}:")
+        print(f"  {'名称':<24}{'次数':>6}{'平均ms':>10}{'p95 ms':>10}")
+        for name, item in sorted(report[key].items()):
+            print(f"  {name:<24}{item['count']:>6}{item['mean_ms']:>10.1f}{item['p95_ms']:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='自动烹饪离线回放')
+    parser.add_argument('--frames', type=str, default=None, help='录制场景目录（含scenes.json），不指定则使用合成厨房')
+    parser.add_argument('--btns', type=str, default=None, help='按钮模板目录，不指定则使用合成按钮')
+    parser.add_argument('--food', type=str, default='sala', help='食物名称')
+    parser.add_argument('--recipes', type=str, default=None, help='菜谱队列，如 "葡萄酱:4,提拉米苏:2"，全部完成后停止')
+    parser.add_argument('--cycles', type=int, default=2, help='完成多少个循环后停止')
+    parser.add_argument('--duration', type=float, default=120, help='最长运行时间（秒）')
+    parser.add_argument('--cook-time', type=float, default=2.0, help='合成厨房的烹饪时间（秒）')
+    parser.add_argument('--ui-latency', type=float, default=0.15, help='点击后界面响应延迟（秒）')
+    parser.add_argument('--match-mode', type=str, default='exhaustive', choices=['exhaustive', 'coarse', 'fft', 'binary'])
+    parser.add_argument('--workers', type=int, default=None, help='模板匹配线程数')
+    parser.add_argument('--json', type=str, default=None, help='将报告写入JSON文件')
+    parser.add_argument('--log-level', type=str, default='WARNING', help='机器人日志级别')
+    args = parser.parse_args(argv)
+
+    install_headless_modules()
+    from cook import CookingBot
+    from template_matcher import ScaleCalibration
+    from recipe_queue import CookTimes
+    from template_store import TemplateStore
+
+    logging.getLogger().setLevel(args.log_level)
+
+    bot = CookingBot(food_name=args.food, loop_count=-1, match_mode=args.match_mode, match_workers=args.workers,
+                     show_overlay=False, recipes=args.recipes)
+    # 回放时不读写真实的缩放校准文件、烹饪时间记录和模板编译缓存
+    bot.scale_calibration = ScaleCalibration()
+    bot.scheduler.cook_times = CookTimes()
+    bot.template_store = TemplateStore()
+
+    if args.btns:
+        bot.btns_dir = args.btns
+        buttons = {key: imread_unicode(os.path.join(args.btns, f"{key}.png")) for key in SYNTHETIC_BUTTONS}
+    else:
+        bot.btns_dir = tempfile.mkdtemp(prefix='replay_btns_')
+        buttons = write_synthetic_buttons(bot.btns_dir)
+
+    if args.frames:
+        game = SceneScript(args.frames, ui_latency=args.ui_latency)
+    else:
+        foods = [entry['food'] for entry in bot.recipe_queue.entries]
+        game = SyntheticKitchen(buttons, foods, cook_time=args.cook_time, ui_latency=args.ui_latency)
+
+    harness = ReplayHarness(bot, game)
+    # 菜谱模式下机器人完成菜谱后自行停止，不按循环数停止
+    report = harness.run(cycles=None if args.recipes else args.cycles, duration=args.duration)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    return 0 if report['dishes'] > 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
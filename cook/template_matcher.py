@@ -0,0 +1,1098 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 模板匹配模块
+负责图像预处理、单帧预处理上下文（含局部二值化）、模板多尺度缓存、峰值提取与NMS、由粗到细匹配、整帧频谱共享匹配、位打包二值匹配、位置先验、UI缩放校准、画面变化检测等cook.py与cook_mumu.py共用的匹配功能
+"""
+
+import os
+import json
+import time
+import logging
+from functools import cached_property
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from latency import stage
+
+logger = logging.getLogger(__name__)
+
+
+# 各类模板的默认缩放系数
+BUTTON_SCALE_FACTORS = np.arange(0.8, 1.2, 0.1)
+COOK_SCALE_FACTORS = np.arange(0.9, 1.1, 0.1)  # cook按钮使用更快的检测参数
+FOOD_SCALE_FACTORS = np.arange(0.5, 1.5, 0.1)
+
+
+def preprocess_binary(image):
+    """将BGR图像转换为自适应阈值二值图（按钮模板与截图共用的预处理）"""
+    # 转换为灰度图
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return binarize_gray(gray)
+
+
+def binarize_gray(gray):
+    """对灰度图做模糊去噪和自适应阈值分割"""
+    # 应用简单的高斯模糊去噪
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    # 自适应阈值分割
+    return cv2.adaptiveThreshold(
+        blurred, 255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY,
+        11, 2
+    )
+
+
+# 画面变化检测缩略图的宽度（像素）
+THUMBNAIL_WIDTH = 160
+# 局部二值化时区域四周多取的像素：高斯模糊半径2 + 自适应阈值窗口半径5，再留1像素余量
+BINARY_MARGIN = 8
+
+
+class FrameContext:
+    """单帧预处理上下文
+
+    每次截图只创建一个实例，BGR、灰度、二值化和缩小版本在首次使用时才计算并缓存，
+    同一个状态tick内的所有检测共享这些结果，不再各自重复预处理整张截图。
+    """
+
+    def __init__(self, rgb, offset=(0, 0)):
+        self.rgb = rgb  # 截图原始数据（RGB）
+        self.offset = (int(offset[0]), int(offset[1]))  # 截图左上角在屏幕上的坐标
+        self.timestamp = time.time()
+        self._downscaled = {}
+        self._spectra = {}
+
+    @property
+    def shape(self):
+        return self.rgb.shape
+
+    @cached_property
+    def bgr(self):
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def binary(self):
+        """与按钮模板相同预处理的二值图"""
+        return binarize_gray(self.gray)
+
+    @cached_property
+    def thumbnail(self):
+        """用于画面变化检测的小尺寸灰度缩略图"""
+        height, width = self.gray.shape[:2]
+        size = (THUMBNAIL_WIDTH, max(1, round(height * THUMBNAIL_WIDTH / width)))
+        return cv2.resize(self.gray, size, interpolation=cv2.INTER_AREA)
+
+    def to_screen(self, boxes):
+        """将截图内的检测框 [x, y, w, h, conf] 平移到屏幕坐标，返回新数组"""
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 5)
+        boxes[:, 0] += self.offset[0]
+        boxes[:, 1] += self.offset[1]
+        return boxes
+
+    def region(self, box, pad=0):
+        """将屏幕坐标的检测框换算为截图内的区域 (x0, y0, x1, y1)，四周扩展 pad 像素并裁剪到截图范围"""
+        x, y, w, h = [int(v) for v in list(box)[:4]]
+        x -= self.offset[0]
+        y -= self.offset[1]
+        height, width = self.rgb.shape[:2]
+        return (max(x - pad, 0), max(y - pad, 0),
+                min(x + w + pad, width), min(y + h + pad, height))
+
+    def binary_region(self, region):
+        """区域 (x0, y0, x1, y1) 内的二值图，与 binary 的对应切片逐像素相同
+
+        整帧二值化已经算过时直接切片；否则只对区域四周扩展 BINARY_MARGIN 像素的灰度图做二值化再裁掉边缘，
+        检查一个按钮区域时不必二值化整张截图（2560x1440 的整帧二值化约 30ms）。
+        """
+        x0, y0, x1, y1 = region
+        if 'binary' in self.__dict__:
+            return self.binary[y0:y1, x0:x1]
+        height, width = self.rgb.shape[:2]
+        ox0, oy0 = max(x0 - BINARY_MARGIN, 0), max(y0 - BINARY_MARGIN, 0)
+        ox1, oy1 = min(x1 + BINARY_MARGIN, width), min(y1 + BINARY_MARGIN, height)
+        if 'gray' in self.__dict__:
+            gray = self.gray[oy0:oy1, ox0:ox1]
+        else:
+            gray = cv2.cvtColor(self.rgb[oy0:oy1, ox0:ox1], cv2.COLOR_RGB2GRAY)
+        return binarize_gray(gray)[y0 - oy0:y1 - oy0, x0 - ox0:x1 - ox0]
+
+    def crop(self, kind, region):
+        """指定类型图像在区域 (x0, y0, x1, y1) 内的部分，二值图和（还没有整帧结果的）灰度图只处理该区域"""
+        if kind == 'binary':
+            return self.binary_region(region)
+        x0, y0, x1, y1 = region
+        if kind == 'gray' and 'gray' not in self.__dict__:
+            return cv2.cvtColor(self.rgb[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY)
+        return getattr(self, kind)[y0:y1, x0:x1]
+
+    def downscaled(self, factor, kind='gray'):
+        """获取缩小后的图像
+
+        Args:
+            factor: 缩放系数（小于1）
+            kind: 'bgr'、'gray' 或 'binary'
+        """
+        key = (kind, round(float(factor), 3))
+        if key not in self._downscaled:
+            self._downscaled[key] = cv2.resize(
+                getattr(self, kind), None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA
+            )
+        return self._downscaled[key]
+
+    @cached_property
+    def packed_binary(self):
+        """位打包的整帧二值图（BinaryScreen），同一帧的所有按钮模板、所有尺度共用"""
+        return BinaryScreen(self.binary)
+
+    def spectrum(self, kind='binary'):
+        """获取整帧的频谱和局部统计（ScreenSpectrum），同一帧的所有模板、所有尺度共用"""
+        if kind not in self._spectra:
+            self._spectra[kind] = ScreenSpectrum(getattr(self, kind))
+        return self._spectra[kind]
+
+
+def build_scaled_templates(template, scale_factors):
+    """为单个模板生成各缩放尺度的版本
+
+    Returns:
+        list: [(scale, scaled_template), ...]
+    """
+    levels = []
+    for scale in scale_factors:
+        # np.arange 产生的浮点误差会让 1.0 变成 0.9999999，这里统一取两位小数
+        scale = round(float(scale), 2)
+        if scale != 1.0:
+            scaled_template = cv2.resize(
+                template,
+                None,
+                fx=scale,
+                fy=scale,
+                interpolation=cv2.INTER_LINEAR
+            )
+        else:
+            scaled_template = template
+
+        if scaled_template.shape[0] < 2 or scaled_template.shape[1] < 2:
+            continue
+        levels.append((scale, scaled_template))
+    return levels
+
+
+class TemplatePyramidCache:
+    """模板多尺度金字塔缓存
+
+    每个 (模板键, 缩放) 组合只在加载模板时生成一次，检测时直接复用，
+    避免每次检测都对所有模板重复执行 cv2.resize。
+    """
+
+    def __init__(self):
+        self._levels = {}  # key -> [[(scale, scaled_template), ...], ...]，每个模板一组
+        self._coarse = {}  # (key, factor) -> 与 _levels 结构相同的缩小版本，粗匹配使用
+
+    def build(self, key, templates, scale_factors):
+        """为指定键的全部模板（重新）生成金字塔"""
+        return self.put(key, [build_scaled_templates(template, scale_factors) for template in templates])
+
+    def put(self, key, pyramids):
+        """直接放入已生成的金字塔（如模板编译缓存中的只读视图），替换该键原有的缓存"""
+        self._levels[key] = pyramids
+        for cache_key in [k for k in self._coarse if k[0] == key]:
+            del self._coarse[cache_key]
+        return pyramids
+
+    def get_coarse(self, key, factor):
+        """获取指定键各尺度模板按 factor 缩小后的版本（首次使用时生成）"""
+        cache_key = (key, round(float(factor), 3))
+        if cache_key not in self._coarse:
+            self._coarse[cache_key] = [
+                [(scale, cv2.resize(template, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA))
+                 for scale, template in levels]
+                for levels in self._levels.get(key, [])
+            ]
+        return self._coarse[cache_key]
+
+    def get(self, key):
+        """获取指定键的金字塔，未缓存时返回空列表"""
+        return self._levels.get(key, [])
+
+    def discard(self, key):
+        """移除指定键的缓存"""
+        self._levels.pop(key, None)
+        for cache_key in [k for k in self._coarse if k[0] == key]:
+            del self._coarse[cache_key]
+
+    def keys(self):
+        return list(self._levels.keys())
+
+    def __contains__(self, key):
+        return key in self._levels
+
+    def export_shared(self):
+        """把全部模板金字塔复制到一块共享内存（多开时由调度进程调用一次）
+
+        Returns:
+            (SharedMemory, manifest): manifest 可以pickle后传给子进程，子进程用 attach_shared 取得只读视图。
+            调用方负责在所有子进程结束后 close 并 unlink 共享内存。
+        """
+        entries = []
+        offset = 0
+        for key, pyramids in self._levels.items():
+            for index, levels in enumerate(pyramids):
+                for scale, template in levels:
+                    template = np.ascontiguousarray(template)
+                    entries.append((key, index, float(scale), template, offset))
+                    offset += template.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for _, _, _, template, start in entries:
+            np.ndarray(template.shape, template.dtype, buffer=shm.buf, offset=start)[...] = template
+
+        manifest = {
+            'keys': {key: len(pyramids) for key, pyramids in self._levels.items()},
+            'levels': [(key, index, scale, template.shape, template.dtype.str, start)
+                       for key, index, scale, template, start in entries],
+        }
+        return shm, manifest
+
+    @classmethod
+    def attach_shared(cls, name, manifest):
+        """连接 export_shared 生成的共享内存，返回以只读视图为模板的缓存（不复制模板数据）"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python 3.13 之前没有 track 参数；子进程与调度进程共用同一个 resource_tracker，重复登记没有影响
+            shm = shared_memory.SharedMemory(name=name)
+
+        cache = cls()
+        cache._levels = {key: [[] for _ in range(count)] for key, count in manifest['keys'].items()}
+        for key, index, scale, shape, dtype, start in manifest['levels']:
+            view = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=start)
+            view.flags.writeable = False
+            cache._levels[key][index].append((scale, view))
+        cache.shared_memory = shm  # 保持引用，视图依赖这块内存
+        return cache
+
+
+# 检查按钮是否仍在原位置时，先只搜索原位置上下左右这么多像素内的位置
+ROI_JITTER = 3
+# 点击确认：按钮区域与点击前快照的差异（1 - 归一化相关系数）低于 CLICK_DIFF_SAME 视为界面还没有变化，
+# 高于 CLICK_DIFF_GONE 视为按钮已经消失，介于两者之间（按下效果、过渡动画）才做模板匹配
+CLICK_DIFF_SAME = 0.1
+CLICK_DIFF_GONE = 0.5
+# 灰度标准差低于该值的区域视为没有纹理
+ROI_FLAT_STD = 2.0
+
+
+def roi_difference(before, after):
+    """同一区域前后两张灰度图的归一化差异 1 - NCC：0 为相同，1 为不相关，不受整体亮度和对比度变化影响
+
+    没有纹理的区域相关系数没有意义：两张都没有纹理时按平均灰度是否接近返回0或1，只有一张没有纹理时返回1。
+    尺寸不同（窗口移动后区域被截图边缘裁剪）时返回None。
+    """
+    if before.shape != after.shape or before.size == 0:
+        return None
+    mean_a, std_a = [float(v[0][0]) for v in cv2.meanStdDev(before)]
+    mean_b, std_b = [float(v[0][0]) for v in cv2.meanStdDev(after)]
+    if std_a < ROI_FLAT_STD or std_b < ROI_FLAT_STD:
+        if std_a < ROI_FLAT_STD and std_b < ROI_FLAT_STD:
+            return 0.0 if abs(mean_a - mean_b) < 4 * ROI_FLAT_STD else 1.0
+        return 1.0
+    covariance = float(np.mean((before.astype(np.float32) - mean_a) * (after.astype(np.float32) - mean_b)))
+    return 1.0 - covariance / (std_a * std_b)
+
+
+def levels_for_box(template_pyramids, box):
+    """只保留与检测框尺寸相同的尺度（检测框的宽高就是命中尺度的模板尺寸），找不到时返回全部尺度"""
+    w, h = int(box[2]), int(box[3])
+    matched = [[(scale, template) for scale, template in levels if template.shape[:2] == (h, w)]
+               for levels in template_pyramids]
+    if any(matched):
+        return matched
+    return template_pyramids
+
+
+def fits_in(template, screen):
+    """模板是否不大于截图（matchTemplate 要求模板尺寸不超过被搜索图像）"""
+    return template.shape[0] <= screen.shape[0] and template.shape[1] <= screen.shape[1]
+
+
+# 命中点少于该数量时直接交给NMS，不再做局部极大值过滤
+PEAK_DILATE_MIN_HITS = 2048
+
+
+def extract_peaks(result, threshold, w, h):
+    """从 matchTemplate 结果图中提取局部极大值
+
+    命中点很多时只保留邻域内最大的点，邻域半径取模板短边的 1/5，
+    该范围内的点与极大值的 IoU 必然大于 0.4，本来也会被 NMS 抑制。
+
+    Returns:
+        np.ndarray: N x 5 数组，每行为 [x, y, w, h, conf]
+    """
+    # 对二维数组 flatnonzero 比 np.nonzero 快一个数量级
+    ys, xs = np.divmod(np.flatnonzero(result >= threshold), result.shape[1])
+    if len(xs) > PEAK_DILATE_MIN_HITS:
+        # 只在命中点的外接区域内做膨胀，比较每个点是否为邻域最大值
+        radius = max(1, min(w, h) // 5)
+        x0 = max(int(xs.min()) - radius, 0)
+        y0 = max(int(ys.min()) - radius, 0)
+        x1 = min(int(xs.max()) + radius + 1, result.shape[1])
+        y1 = min(int(ys.max()) + radius + 1, result.shape[0])
+        window = result[y0:y1, x0:x1]
+        kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+        dilated = cv2.dilate(window, kernel)
+
+        is_peak = window[ys - y0, xs - x0] >= dilated[ys - y0, xs - x0]
+        ys = ys[is_peak]
+        xs = xs[is_peak]
+
+    peaks = np.empty((len(xs), 5), dtype=np.float64)
+    peaks[:, 0] = xs
+    peaks[:, 1] = ys
+    peaks[:, 2] = w
+    peaks[:, 3] = h
+    peaks[:, 4] = result[ys, xs]
+    return peaks
+
+
+def nms_boxes(boxes, score_threshold, iou_threshold=0.4):
+    """向量化的非极大值抑制，行为与 cv2.dnn.NMSBoxes 一致
+
+    Args:
+        boxes: N x 5 数组 [x, y, w, h, conf]
+        score_threshold: 置信度阈值
+        iou_threshold: IoU 大于该值的框被抑制
+
+    Returns:
+        np.ndarray: 保留下来的框，按置信度从高到低排列
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
+    boxes = boxes[boxes[:, 4] >= score_threshold]
+    if len(boxes) == 0:
+        return boxes
+
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    order = np.argsort(-boxes[:, 4], kind='stable')
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+
+        order = rest[iou <= iou_threshold]
+
+    return boxes[keep]
+
+
+def match_level(screen, template, threshold):
+    """在截图上匹配单个尺度的模板，返回该尺度的峰值框（坐标相对于 screen）"""
+    if not fits_in(template, screen):
+        return np.empty((0, 5), dtype=np.float64)
+    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+    h, w = template.shape[:2]
+    return extract_peaks(result, threshold, w, h)
+
+
+def run_jobs(func, jobs, executor=None):
+    """依次或在线程池中执行一组任务，结果按提交顺序返回
+
+    matchTemplate 执行时会释放GIL，因此多个尺度/模板可以在线程池中真正并行。
+    """
+    if executor is None or len(jobs) < 2:
+        return [func(*job) for job in jobs]
+    futures = [executor.submit(func, *job) for job in jobs]
+    return [future.result() for future in futures]
+
+
+def merge_matches(owners, peaks_list, threshold, per_template_nms=False, iou_threshold=0.4):
+    """合并各尺度的峰值框后统一做NMS
+
+    Args:
+        owners: 与 peaks_list 一一对应的模板序号
+        peaks_list: 各尺度的峰值框
+        per_template_nms: 是否先对每个模板单独做一次NMS（食物模板使用）
+    """
+    grouped = {}
+    for owner, peaks in zip(owners, peaks_list):
+        if len(peaks) > 0:
+            grouped.setdefault(owner, []).append(peaks)
+
+    all_matches = []
+    for template_matches in grouped.values():
+        if per_template_nms:
+            # 对单个模板的结果进行NMS
+            all_matches.append(nms_boxes(np.vstack(template_matches), threshold, iou_threshold))
+        else:
+            all_matches.extend(template_matches)
+
+    if not all_matches:
+        return np.empty((0, 5), dtype=np.float64)
+    return nms_boxes(np.vstack(all_matches), threshold, iou_threshold)
+
+
+def match_pyramids(screen, template_pyramids, threshold, per_template_nms=False, iou_threshold=0.4,
+                   executor=None):
+    """在截图上匹配一组模板的全部尺度，返回NMS后的检测框
+
+    Args:
+        screen: 被搜索的图像（与模板同样预处理）
+        template_pyramids: TemplatePyramidCache.get 返回的金字塔列表
+        threshold: 匹配阈值
+        per_template_nms: 是否先对每个模板单独做一次NMS（食物模板使用）
+        iou_threshold: NMS 的 IoU 阈值
+        executor: 可选线程池，各模板各尺度的匹配分发到池中并行执行
+
+    Returns:
+        np.ndarray: N x 5 数组 [x, y, w, h, conf]，坐标相对于 screen
+    """
+    owners = []
+    jobs = []
+    for index, levels in enumerate(template_pyramids):
+        for scale, scaled_template in levels:
+            owners.append(index)
+            jobs.append((screen, scaled_template, threshold))
+
+    peaks_list = run_jobs(match_level, jobs, executor)
+    with stage('nms'):
+        return merge_matches(owners, peaks_list, threshold, per_template_nms, iou_threshold)
+
+
+class ScreenSpectrum:
+    """一帧截图的频域表示和局部归一化项，该帧的所有模板、所有尺度共用，结果与 cv2.matchTemplate(TM_CCOEFF_NORMED) 相同
+
+    TM_CCOEFF_NORMED = Σ T'·I / (‖T'‖ · sqrt(Σ I² - (Σ I)² / n))，T' 为去均值的模板，求和范围为模板覆盖的窗口：
+      - 分子是截图与 T' 的互相关：截图频谱只在创建时计算一次，每个模板只做一次模板的正变换和一次逆变换
+      - 分母的窗口和、窗口平方和只取决于模板尺寸，按尺寸缓存，同尺寸的模板共用
+    多通道图像各通道的频谱乘积先相加再逆变换，与 matchTemplate 对各通道求和一致。
+    """
+
+    # 分子接近分母时 matchTemplate 取 ±1，超过该倍数视为无效窗口取 0
+    NORM_TOLERANCE = 1.125
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.height, self.width = screen.shape[:2]
+        self.channels = 1 if screen.ndim == 2 else screen.shape[2]
+        # 补零到 DFT 的快速尺寸，模板从原点开始放置，有效区域内的循环相关不会绕回
+        self.dft_size = (cv2.getOptimalDFTSize(self.height), cv2.getOptimalDFTSize(self.width))
+        padded = np.zeros(self.dft_size, dtype=np.float32)
+        self.spectra = []
+        for channel in self._split(screen):
+            padded[:self.height, :self.width] = channel
+            self.spectra.append(cv2.dft(padded))
+        self._norms = {}  # (模板高, 模板宽) -> 各窗口的 sqrt(Σ I² - (Σ I)² / n)
+
+    @staticmethod
+    def _split(image):
+        return [image] if image.ndim == 2 else cv2.split(image)
+
+    def window_norm(self, h, w):
+        """模板尺寸为 h x w 时各匹配位置的窗口标准差项（未乘模板范数），多个线程同时计算同一尺寸时结果相同"""
+        norm = self._norms.get((h, w))
+        if norm is None:
+            out_h, out_w = self.height - h + 1, self.width - w + 1
+            sums = cv2.boxFilter(self.screen, cv2.CV_64F, (w, h), anchor=(0, 0), normalize=False,
+                                 borderType=cv2.BORDER_CONSTANT)[:out_h, :out_w]
+            squares = cv2.sqrBoxFilter(self.screen, cv2.CV_64F, (w, h), anchor=(0, 0), normalize=False,
+                                       borderType=cv2.BORDER_CONSTANT)[:out_h, :out_w]
+            variance = squares - sums * sums / (h * w)
+            if variance.ndim == 3:
+                variance = variance.sum(axis=2)
+            norm = self._norms[(h, w)] = np.sqrt(np.maximum(variance, 0)).astype(np.float32)
+        return norm
+
+    def match(self, template):
+        """返回与 cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED) 相同的结果图"""
+        h, w = template.shape[:2]
+        out_h, out_w = self.height - h + 1, self.width - w + 1
+
+        product = None
+        template_norm = 0.0
+        padded = np.zeros(self.dft_size, dtype=np.float32)
+        for spectrum, channel in zip(self.spectra, self._split(template)):
+            centered = channel.astype(np.float32)
+            centered -= centered.mean()
+            template_norm += float(np.dot(centered.ravel(), centered.ravel()))
+            padded[:h, :w] = centered
+            # 模板只占前 h 行，正变换时跳过全零行
+            channel_product = cv2.mulSpectrums(spectrum, cv2.dft(padded, nonzeroRows=h), 0, conjB=True)
+            product = channel_product if product is None else cv2.add(product, channel_product)
+
+        if template_norm < np.finfo(np.float64).eps:
+            # 与 matchTemplate 一致：纯色模板的结果全为1
+            return np.ones((out_h, out_w), dtype=np.float32)
+
+        numerator = cv2.idft(product, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT, nonzeroRows=out_h)[:out_h, :out_w]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = numerator / (self.window_norm(h, w) * np.float32(np.sqrt(template_norm)))
+        # 与 matchTemplate 相同的边界处理：|结果| 在 [1, 1.125) 取 ±1，更大（含分母为0）取 0
+        magnitude = np.abs(result)
+        clipped = magnitude >= 1
+        result[clipped] = np.sign(result[clipped])
+        result[~(magnitude < self.NORM_TOLERANCE)] = 0
+        return result
+
+
+def match_level_spectrum(spectrum, template, threshold):
+    """用共享的截图频谱匹配单个尺度的模板，返回该尺度的峰值框"""
+    if template.shape[0] > spectrum.height or template.shape[1] > spectrum.width:
+        return np.empty((0, 5), dtype=np.float64)
+    h, w = template.shape[:2]
+    return extract_peaks(spectrum.match(template), threshold, w, h)
+
+
+def match_pyramids_spectrum(spectrum, template_pyramids, threshold, per_template_nms=False, iou_threshold=0.4,
+                            executor=None):
+    """与 match_pyramids 相同，但所有模板、所有尺度共用一帧的截图频谱（FrameContext.spectrum）
+
+    Returns:
+        np.ndarray: N x 5 数组 [x, y, w, h, conf]，坐标相对于截图
+    """
+    owners = []
+    jobs = []
+    for index, levels in enumerate(template_pyramids):
+        for scale, scaled_template in levels:
+            owners.append(index)
+            jobs.append((spectrum, scaled_template, threshold))
+
+    peaks_list = run_jobs(match_level_spectrum, jobs, executor)
+    with stage('nms'):
+        return merge_matches(owners, peaks_list, threshold, per_template_nms, iou_threshold)
+
+
+# 位打包匹配：每次累加这么多行后检查候选位置是否还可能达到阈值
+BITS_ROW_BLOCK = 8
+# 位打包匹配每批处理的候选位置数，限制收集窗口字节时的内存
+BITS_CHUNK = 16384
+# 字节的置1位数（numpy 2.0 之前没有 np.bitwise_count）
+POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount(array):
+    """逐元素统计 uint8 数组中置1的位数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(array)
+    return POPCOUNT_TABLE[array]
+
+
+class BinaryScreen:
+    """一帧二值图的位打包表示，按钮模板在其上用按位与和popcount计算 TM_CCOEFF_NORMED，结果与 cv2.matchTemplate 相同
+
+    截图只有 0/255 两种值，记窗口内置1的像素数为 b、模板在这些像素上的灰度和为 S（缩放后的模板有中间灰度，
+    按位平面分解后 S = Σ 2^k · popcount(模板第k位平面 & 窗口)），则
+    TM_CCOEFF_NORMED = (S - ΣT · b / n) / (‖T'‖ · sqrt(b - b² / n))，n 为模板像素数。
+      - b 由整帧积分图得到；S 不超过模板中最大的 b 个像素之和，据此先排除不可能达到阈值的位置
+      - 其余位置每 BITS_ROW_BLOCK 行累加一次 S，剩余行的上界也达不到阈值时提前放弃
+    截图每行按 0~7 位的偏移各打包一份，任意横坐标的窗口都可以按字节对齐读取。
+    """
+
+    def __init__(self, binary):
+        bits = binary > 127
+        self.height, self.width = bits.shape[:2]
+        self.integral = cv2.integral(bits.view(np.uint8)).astype(np.int64)
+        row_bytes = (self.width + 7) // 8 + 1
+        self.packed = np.zeros((8, self.height, row_bytes), dtype=np.uint8)
+        for shift in range(8):
+            packed = np.packbits(bits[:, shift:], axis=1)
+            self.packed[shift, :, :packed.shape[1]] = packed
+
+    def window_bits(self, h, w, ys=None, xs=None, rows=None):
+        """窗口（左上角 ys, xs，尺寸 h x w，只统计前 rows 行）内置1的像素数，不指定位置时返回全部匹配位置"""
+        integral = self.integral
+        if ys is None:
+            out_h, out_w = self.height - h + 1, self.width - w + 1
+            return (integral[h:h + out_h, w:w + out_w] - integral[h:h + out_h, :out_w]
+                    - integral[:out_h, w:w + out_w] + integral[:out_h, :out_w])
+        bottom = ys + (h if rows is None else rows)
+        return integral[bottom, xs + w] - integral[bottom, xs] - integral[ys, xs + w] + integral[ys, xs]
+
+    def match(self, template, threshold, stats=None):
+        """返回结果图：达到阈值的位置为 TM_CCOEFF_NORMED 分数，其余位置为0
+
+        stats 为dict时累加 'positions'（匹配位置数）、'candidates'（通过置1像素数上界的位置数）、
+        'rows'（候选位置实际累加的行数之和）、'template_rows'（候选位置数 x 模板行数），供基准测试统计提前放弃的效果。
+        """
+        h, w = template.shape[:2]
+        out_h, out_w = self.height - h + 1, self.width - w + 1
+        result = np.zeros((out_h, out_w), dtype=np.float32)
+        n = h * w
+        values = template.astype(np.float64)
+        template_sum = float(values.sum())
+        template_norm = np.sqrt(max(float((values * values).sum()) - template_sum * template_sum / n, 0.0))
+        if template_norm < 1e-6:
+            # 纯色模板与 matchTemplate 一致按全1处理
+            result[:] = 1.0
+            return result
+
+        # 按窗口置1像素数 b 的分数上界：S 不超过模板中最大的 b 个像素之和
+        counts = np.arange(n + 1, dtype=np.float64)
+        top_sums = np.concatenate(([0.0], np.cumsum(np.sort(values.ravel())[::-1])))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            window_norms = np.sqrt(counts - counts * counts / n)
+            bounds = (top_sums - template_sum * counts / n) / (template_norm * window_norms)
+        bounds[~(window_norms > 0)] = 0.0
+
+        bits = self.window_bits(h, w)
+        ys, xs = np.divmod(np.flatnonzero(bounds[bits] >= threshold), out_w)
+        if stats is not None:
+            stats['positions'] = stats.get('positions', 0) + out_h * out_w
+            stats['candidates'] = stats.get('candidates', 0) + len(ys)
+            stats['template_rows'] = stats.get('template_rows', 0) + len(ys) * h
+        if len(ys) == 0:
+            return result
+
+        # 模板按位平面打包，相同的平面合并权重（二值模板只有一个平面）
+        planes = {}
+        for bit in range(8):
+            plane = (template >> bit) & 1
+            if plane.any():
+                key = plane.tobytes()
+                weight, packed = planes.get(key, (0, np.packbits(plane, axis=1)))
+                planes[key] = (weight + (1 << bit), packed)
+        planes = list(planes.values())
+        row_sums = values.sum(axis=1)
+        row_maxes = values.max(axis=1)
+        # 第 r 行之后剩余部分的模板灰度和、最大灰度
+        rest_sums = np.concatenate((np.cumsum(row_sums[::-1])[::-1], [0.0]))
+        rest_maxes = np.concatenate((np.maximum.accumulate(row_maxes[::-1])[::-1], [0.0]))
+        # 窗口字节在 packed 中的平铺下标 = 候选位置的起始下标 + 各行各字节的相对下标
+        _, height, row_bytes = self.packed.shape
+        byte_count = planes[0][1].shape[1]
+        offsets = (np.arange(h)[:, None] * row_bytes + np.arange(byte_count)[None, :]).astype(np.int64)
+        flat = self.packed.reshape(-1)
+
+        for start in range(0, len(ys), BITS_CHUNK):
+            cy, cx = ys[start:start + BITS_CHUNK], xs[start:start + BITS_CHUNK]
+            bases = ((cx % 8) * height + cy) * row_bytes + cx // 8
+            total = self.window_bits(h, w, cy, cx).astype(np.float64)
+            need = template_sum * total / n + threshold * template_norm * np.sqrt(total - total * total / n)
+            acc = np.zeros(len(cy), dtype=np.float64)
+            for r0 in range(0, h, BITS_ROW_BLOCK):
+                r1 = min(r0 + BITS_ROW_BLOCK, h)
+                window = flat[bases[:, None] + offsets[r0:r1].reshape(1, -1)]
+                for weight, packed in planes:
+                    acc += weight * popcount(window & packed[r0:r1].reshape(1, -1)).sum(axis=1, dtype=np.int64)
+                if stats is not None:
+                    stats['rows'] = stats.get('rows', 0) + len(cy) * (r1 - r0)
+                if r1 == h:
+                    break
+                rest_bits = total - self.window_bits(h, w, cy, cx, rows=r1)
+                alive = acc + np.minimum(rest_sums[r1], rest_maxes[r1] * rest_bits) >= need
+                if not alive.all():
+                    cy, cx, bases = cy[alive], cx[alive], bases[alive]
+                    total, need, acc = total[alive], need[alive], acc[alive]
+                    if len(cy) == 0:
+                        break
+            if len(cy) == 0:
+                continue
+            scores = (acc - template_sum * total / n) / (template_norm * np.sqrt(total - total * total / n))
+            passed = scores >= threshold
+            result[cy[passed], cx[passed]] = np.minimum(scores[passed], 1.0)
+        return result
+
+
+def match_level_bits(bits_screen, template, threshold):
+    """在位打包的二值截图上匹配单个尺度的模板，返回该尺度的峰值框"""
+    if template.shape[0] > bits_screen.height or template.shape[1] > bits_screen.width:
+        return np.empty((0, 5), dtype=np.float64)
+    h, w = template.shape[:2]
+    return extract_peaks(bits_screen.match(template, threshold), threshold, w, h)
+
+
+def match_pyramids_bits(bits_screen, template_pyramids, threshold, per_template_nms=False, iou_threshold=0.4,
+                        executor=None):
+    """与 match_pyramids 相同，但在位打包的二值截图（FrameContext.packed_binary）上用popcount匹配，只用于按钮二值图
+
+    Returns:
+        np.ndarray: N x 5 数组 [x, y, w, h, conf]，坐标相对于截图
+    """
+    owners = []
+    jobs = []
+    for index, levels in enumerate(template_pyramids):
+        for scale, scaled_template in levels:
+            owners.append(index)
+            jobs.append((bits_screen, scaled_template, threshold))
+
+    peaks_list = run_jobs(match_level_bits, jobs, executor)
+    with stage('nms'):
+        return merge_matches(owners, peaks_list, threshold, per_template_nms, iou_threshold)
+
+
+# 粗匹配阈值比最终阈值低的幅度：缩小后细节丢失，分数会略低于原图
+COARSE_THRESHOLD_MARGIN = 0.15
+# 缩小后模板短边低于该值时粗匹配不可靠，该尺度直接在原图上匹配
+COARSE_MIN_TEMPLATE_SIZE = 8
+# 每个模板尺度最多细化的候选数量
+COARSE_MAX_CANDIDATES = 32
+
+
+def refine_level(screen, coarse_screen, template, coarse_template, factor, threshold, iou_threshold=0.4):
+    """由粗到细匹配单个尺度的模板：先在缩小图上定位候选，再在原图候选附近精确匹配"""
+    if not fits_in(template, screen):
+        return np.empty((0, 5), dtype=np.float64)
+    if min(coarse_template.shape[:2]) < COARSE_MIN_TEMPLATE_SIZE or not fits_in(coarse_template, coarse_screen):
+        return match_level(screen, template, threshold)
+
+    coarse_threshold = threshold - COARSE_THRESHOLD_MARGIN
+    pad = int(np.ceil(1.0 / factor)) + 2  # 粗定位误差约为 1/factor 个像素
+    height, width = screen.shape[:2]
+    h, w = template.shape[:2]
+
+    coarse_result = cv2.matchTemplate(coarse_screen, coarse_template, cv2.TM_CCOEFF_NORMED)
+    ch, cw = coarse_template.shape[:2]
+    candidates = nms_boxes(extract_peaks(coarse_result, coarse_threshold, cw, ch),
+                           coarse_threshold, iou_threshold)[:COARSE_MAX_CANDIDATES]
+
+    level_matches = []
+    for cx, cy, _, _, _ in candidates:
+        # 在原图中候选位置附近的小区域内精确匹配
+        x0 = max(int(cx / factor) - pad, 0)
+        y0 = max(int(cy / factor) - pad, 0)
+        x1 = min(int(cx / factor) + w + pad, width)
+        y1 = min(int(cy / factor) + h + pad, height)
+        peaks = match_level(screen[y0:y1, x0:x1], template, threshold)
+        if len(peaks) > 0:
+            peaks[:, 0] += x0
+            peaks[:, 1] += y0
+            level_matches.append(peaks)
+
+    if not level_matches:
+        return np.empty((0, 5), dtype=np.float64)
+    return np.vstack(level_matches)
+
+
+def match_pyramids_coarse_to_fine(screen, coarse_screen, template_pyramids, coarse_pyramids,
+                                  factor, threshold, per_template_nms=False, iou_threshold=0.4,
+                                  executor=None):
+    """由粗到细的多尺度匹配
+
+    先在缩小 factor 倍的截图上用较低阈值定位候选位置，再只在候选附近的小区域内
+    用原尺寸模板精确匹配。返回值与 match_pyramids 相同。
+
+    Args:
+        screen: 原尺寸截图
+        coarse_screen: 缩小后的截图
+        template_pyramids: 原尺寸模板金字塔
+        coarse_pyramids: 与 template_pyramids 一一对应的缩小模板
+        factor: 缩小系数
+        executor: 可选线程池，各模板各尺度分发到池中并行执行
+    """
+    owners = []
+    jobs = []
+    for index, (levels, coarse_levels) in enumerate(zip(template_pyramids, coarse_pyramids)):
+        for (scale, template), (_, coarse_template) in zip(levels, coarse_levels):
+            owners.append(index)
+            jobs.append((screen, coarse_screen, template, coarse_template, factor, threshold, iou_threshold))
+
+    peaks_list = run_jobs(refine_level, jobs, executor)
+    with stage('nms'):
+        return merge_matches(owners, peaks_list, threshold, per_template_nms, iou_threshold)
+
+
+class SpatialPriors:
+    """按钮位置先验
+
+    记录每个模板键最近一次命中的区域（所有命中框的外接矩形，截图内坐标）和命中数量。
+    下次检测先在该区域向外扩展的窗口内匹配，找到的数量不少于上次时视为命中，
+    否则回退到整帧搜索。区域外新出现的按钮（例如陆续完成的finish按钮）只能由整帧搜索发现，
+    因此距离上次整帧搜索超过 max_age 秒后先验失效，强制做一次整帧搜索。
+    """
+
+    def __init__(self, expand=1.0, max_age=2.0):
+        """
+        :param expand: 搜索窗口在外接矩形四周扩展的距离，以按钮最大边长为单位
+        :param max_age: 先验在整帧搜索后的有效时间（秒）
+        """
+        self.expand = expand
+        self.max_age = max_age
+        self._priors = {}  # key -> {'rect': (x0, y0, x1, y1), 'size': (w, h), 'count': n, 'time': 整帧搜索时间}
+        self._stats = {}  # key -> [命中次数, 未命中次数]
+
+    def search_region(self, key, frame_shape):
+        """获取模板键的优先搜索区域 (x0, y0, x1, y1)，没有先验时返回None"""
+        prior = self._priors.get(key)
+        if prior is None or time.time() - prior['time'] > self.max_age:
+            return None
+        x0, y0, x1, y1 = prior['rect']
+        margin = int(max(prior['size']) * self.expand) + 1
+        height, width = frame_shape[:2]
+        region = (max(x0 - margin, 0), max(y0 - margin, 0),
+                  min(x1 + margin, width), min(y1 + margin, height))
+        # 搜索窗口几乎覆盖整帧时没有意义
+        if (region[2] - region[0]) * (region[3] - region[1]) >= 0.8 * width * height:
+            return None
+        return region
+
+    def accept(self, key, boxes):
+        """判断在优先区域内的结果是否可信，并记录命中/未命中"""
+        prior = self._priors.get(key)
+        hit = prior is not None and len(boxes) >= max(1, prior['count'])
+        stats = self._stats.setdefault(key, [0, 0])
+        stats[0 if hit else 1] += 1
+        return hit
+
+    def remember(self, key, boxes, full_frame=True):
+        """根据检测结果（截图内坐标）更新先验，未检测到时保留原有先验
+
+        Args:
+            full_frame: 结果是否来自整帧搜索，只有整帧搜索会刷新先验的有效时间
+        """
+        if len(boxes) == 0:
+            return
+        previous = self._priors.get(key)
+        if not full_frame and previous is None:
+            return
+        boxes = np.asarray(boxes)
+        x0 = int(boxes[:, 0].min())
+        y0 = int(boxes[:, 1].min())
+        x1 = int((boxes[:, 0] + boxes[:, 2]).max())
+        y1 = int((boxes[:, 1] + boxes[:, 3]).max())
+        self._priors[key] = {
+            'rect': (x0, y0, x1, y1),
+            'size': (int(boxes[:, 2].max()), int(boxes[:, 3].max())),
+            'count': len(boxes),
+            'time': time.time() if full_frame else previous['time'],
+        }
+
+    def forget(self, key=None):
+        """清除指定模板键（或全部）的先验，例如窗口大小变化后"""
+        if key is None:
+            self._priors.clear()
+        else:
+            self._priors.pop(key, None)
+
+    def hit_rate(self, key):
+        hits, misses = self._stats.get(key, (0, 0))
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    def stats(self):
+        """返回 {key: {'hits': n, 'misses': n, 'hit_rate': r}}"""
+        return {key: {'hits': hits, 'misses': misses,
+                      'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+                for key, (hits, misses) in self._stats.items()}
+
+    def summary(self):
+        """生成用于日志的命中率摘要"""
+        return ', '.join(f"{key}: {item['hits']}/{item['hits'] + item['misses']} ({item['hit_rate']:.0%})"
+                         for key, item in self.stats().items())
+
+
+# 校准后只搜索校准尺度及其两侧各 SCALE_BAND 个相邻尺度
+SCALE_BAND = 1
+# 窄带搜索连续未命中该次数后，重新做一次全尺度搜索
+SCALE_MISS_LIMIT = 3
+
+
+def filter_levels(template_pyramids, scales):
+    """只保留金字塔中缩放系数在 scales 内的尺度，scales 为None时原样返回"""
+    if scales is None:
+        return template_pyramids
+    return [[(scale, template) for scale, template in levels if scale in scales]
+            for levels in template_pyramids]
+
+
+class ScaleCalibration:
+    """UI缩放校准
+
+    游戏UI的缩放只在窗口大小变化时改变，因此按客户区尺寸记录每个模板键的最佳缩放系数，
+    之后的检测只搜索该尺度附近的窄带。窄带连续未命中 miss_limit 次后重新做一次全尺度
+    搜索并重新校准。校准结果保存在JSON文件中，下次启动时直接复用。
+    """
+
+    def __init__(self, path=None, band=SCALE_BAND, miss_limit=SCALE_MISS_LIMIT):
+        """
+        :param path: 校准结果保存路径，None表示不持久化
+        :param band: 校准尺度两侧保留的相邻尺度个数
+        :param miss_limit: 触发全尺度搜索的连续未命中次数
+        """
+        self.path = path
+        self.band = band
+        self.miss_limit = miss_limit
+        self.size_key = None
+        self._scales = {}  # "宽x高" -> {key: scale}
+        self._misses = {}  # key -> 连续未命中次数
+        self._sweeping = set()  # 本次检测使用全尺度搜索的模板键
+        self.load()
+
+    def load(self):
+        """从文件加载校准结果"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._scales = json.load(f)
+            logger.info(f"已加载UI缩放校准: {self.path}")
+        except Exception as e:
+            logger.error(f"加载UI缩放校准失败: {e}")
+            self._scales = {}
+
+    def save(self):
+        """将校准结果保存到文件"""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            # 先写临时文件再替换：多开时多个进程共用同一个校准文件，直接覆盖可能写出交错的JSON
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._scales, f, indent=4, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"保存UI缩放校准失败: {e}")
+
+    def set_size(self, width, height):
+        """设置当前客户区尺寸，尺寸变化时返回True"""
+        size_key = f"{int(width)}x{int(height)}"
+        if size_key == self.size_key:
+            return False
+        self.size_key = size_key
+        self._misses.clear()
+        self._sweeping.clear()
+        return True
+
+    def scale(self, key):
+        """当前尺寸下模板键的校准缩放系数，未校准时返回None"""
+        return self._scales.get(self.size_key, {}).get(key)
+
+    def select(self, key, template_pyramids):
+        """确定本次检测要搜索的缩放系数集合，None表示全尺度搜索"""
+        scale = self.scale(key)
+        if scale is None or self._misses.get(key, 0) >= self.miss_limit:
+            self._sweeping.add(key)
+            return None
+        self._sweeping.discard(key)
+        all_scales = sorted({level_scale for levels in template_pyramids for level_scale, _ in levels})
+        if not all_scales:
+            return None
+        index = min(range(len(all_scales)), key=lambda i: abs(all_scales[i] - scale))
+        return set(all_scales[max(index - self.band, 0):index + self.band + 1])
+
+    def observe(self, key, boxes, template_pyramids):
+        """记录一次检测结果
+
+        命中时根据置信度最高的框的尺寸反推匹配的缩放系数并更新校准；
+        窄带未命中时累计次数，全尺度搜索结束后重新计数。
+        """
+        sweeping = key in self._sweeping
+        self._sweeping.discard(key)
+        if len(boxes) == 0:
+            self._misses[key] = 0 if sweeping else self._misses.get(key, 0) + 1
+            return
+        self._misses[key] = 0
+
+        best = boxes[int(np.argmax(boxes[:, 4]))]
+        w, h = int(best[2]), int(best[3])
+        for levels in template_pyramids:
+            for scale, template in levels:
+                if template.shape[1] == w and template.shape[0] == h:
+                    if scale != self.scale(key):
+                        self._scales.setdefault(self.size_key, {})[key] = scale
+                        logger.info(f"[{key}] UI缩放校准为 {scale} (客户区 {self.size_key})")
+                        self.save()
+                    return
+
+    def forget(self, key):
+        """清除模板键在所有尺寸下的校准，例如更换了模板图片"""
+        changed = False
+        for scales in self._scales.values():
+            changed = scales.pop(key, None) is not None or changed
+        self._misses.pop(key, None)
+        if changed:
+            self.save()
+
+
+# 画面变化检测：缩略图按 GATE_CELL x GATE_CELL 像素分块比较
+GATE_CELL = 8
+# 缓存的检测结果最长复用时间（秒），超过后无论画面是否变化都重新检测
+GATE_MAX_AGE = 5.0
+
+
+class FrameChangeGate:
+    """画面变化检测
+
+    检测前先比较当前帧与上次检测该模板时的缩略图，任一分块的平均绝对差都不超过
+    sensitivity（灰度级）时认为画面静止，直接复用上次的检测结果。按分块而不是整帧比较，
+    倒计时数字这类小范围变化不会触发重新检测，新按钮出现这类较大变化则一定会触发。
+    """
+
+    def __init__(self, sensitivity=6.0, max_age=GATE_MAX_AGE):
+        """
+        :param sensitivity: 分块平均绝对差阈值，越小越敏感，0表示关闭检测（始终重新匹配）
+        :param max_age: 缓存结果的最长复用时间（秒）
+        """
+        self.sensitivity = sensitivity
+        self.max_age = max_age
+        self._cache = {}  # key -> (缩略图, 检测结果, 时间戳)
+        self.checks = 0
+        self.skips = 0
+
+    def changed(self, previous, current):
+        """判断两张缩略图之间是否有超过阈值的分块变化"""
+        if previous.shape != current.shape:
+            return True
+        diff = cv2.absdiff(previous, current)
+        height, width = diff.shape[:2]
+        rows = height // GATE_CELL * GATE_CELL
+        cols = width // GATE_CELL * GATE_CELL
+        cells = diff[:rows, :cols].reshape(rows // GATE_CELL, GATE_CELL, cols // GATE_CELL, GATE_CELL)
+        if cells.size and cells.mean(axis=(1, 3)).max() > self.sensitivity:
+            return True
+        # 不足一个分块的边缘部分单独比较
+        edges = [diff[rows:, :], diff[:rows, cols:]]
+        return any(edge.size and edge.mean() > self.sensitivity for edge in edges)
+
+    def lookup(self, key, frame):
+        """画面未变化时返回上次的检测结果（副本），否则返回None"""
+        if self.sensitivity <= 0:
+            return None
+        self.checks += 1
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        thumbnail, boxes, timestamp = cached
+        if frame.timestamp - timestamp > self.max_age or self.changed(thumbnail, frame.thumbnail):
+            return None
+        self.skips += 1
+        return boxes.copy()
+
+    def store(self, key, frame, boxes):
+        """记录本次检测时的画面和结果"""
+        if self.sensitivity <= 0:
+            return
+        self._cache[key] = (frame.thumbnail, np.array(boxes, dtype=np.float64).reshape(-1, 5), frame.timestamp)
+
+    def forget(self, key=None):
+        """清除指定模板键（或全部）的缓存结果"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    @property
+    def skip_ratio(self):
+        return self.skips / self.checks if self.checks else 0.0
+
+    def summary(self):
+        """生成用于日志的跳过率摘要"""
+        if not self.checks:
+            return ''
+        return f"{self.skips}/{self.checks} ({self.skip_ratio:.0%})"
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+自动烹饪 - 模板编译缓存模块
+把 btns/ 和 foods/ 下的模板图片预处理（按钮二值化、食物保留彩色）并生成多尺度版本后保存到磁盘，
+下次启动时内存映射读取，不再逐个解码PNG、二值化和缩放：
+  - templates_<代号>.npy  全部模板数据首尾相接的字节数组，用 np.load(mmap_mode='r') 映射，各尺度模板是其中的只读视图
+  - manifest.json         每个条目的源文件、修改时间、大小、SHA-1，以及各尺度模板在数组中的位置
+
+源文件的修改时间和大小没变时直接使用缓存；变了但内容哈希相同时只更新记录；内容变了才重新编译该文件。
+保存时写入新的数组文件再替换清单，正在映射旧文件的进程不受影响（旧文件在之后的保存中删除）。
+TemplateWatcher 定期检查模板目录，主循环据此只重新编译并替换发生变化的模板，不需要重启机器人。
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+import cv2
+import numpy as np
+
+from template_matcher import preprocess_binary, build_scaled_templates
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，预处理或多尺度生成方式改变时加1，旧缓存自动失效
+STORE_VERSION = 1
+# 各尺度模板在字节数组中的起始位置按该字节数对齐
+STORE_ALIGN = 64
+# 检查模板目录的间隔（秒）
+WATCH_INTERVAL = 2.0
+# 数组文件写入后至少保留的秒数，避免删除其他进程刚写入、还没来得及写入清单的数组文件
+STALE_GRACE = WATCH_INTERVAL * 5
+# 视为模板的图片扩展名
+TEMPLATE_EXTS = ('.png', '.jpg', '.bmp')
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def compile_template(image, kind):
+    """按类型预处理模板：'binary' 为自适应阈值二值图（按钮），'bgr' 为原始彩色图（食物）"""
+    if kind == 'binary':
+        return preprocess_binary(image)
+    return image
+
+
+class TemplateStore:
+    """模板编译缓存，条目按源文件、预处理类型和缩放系数索引"""
+
+    def __init__(self, directory=None, root=None):
+        """
+        :param directory: 缓存目录，None表示只在内存中编译、不读写磁盘
+        :param root: 源文件路径相对该目录记录，程序目录整体移动后缓存仍然有效；None表示记录绝对路径
+        """
+        self.directory = directory
+        self.root = root
+        self.entries = {}  # 条目键 -> {'source', 'mtime_ns', 'size', 'sha1', 'levels': [(scale, template)]}
+        self.blob = None  # 当前映射的字节数组，条目中的模板是它的视图
+        self.dirty = False
+        self.hits = 0
+        self.compiles = 0
+        self.load()
+
+    def source_key(self, path):
+        path = os.path.abspath(path)
+        if self.root is None:
+            return path
+        try:
+            return os.path.relpath(path, self.root)
+        except ValueError:  # Windows上不同盘符之间没有相对路径
+            return path
+
+    def source_path(self, source):
+        return source if os.path.isabs(source) or self.root is None else os.path.join(self.root, source)
+
+    def load(self):
+        """映射磁盘上的缓存，清单不存在、版本不同或读取失败时从空缓存开始"""
+        if not self.directory:
+            return
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != STORE_VERSION:
+                logger.info("模板缓存格式已更新，重新编译全部模板")
+                return
+            blob = np.load(os.path.join(self.directory, manifest['blob']), mmap_mode='r')
+            entries = {}
+            for key, item in manifest['entries'].items():
+                levels = []
+                for scale, shape, dtype, offset in item['levels']:
+                    dtype = np.dtype(dtype)
+                    size = int(np.prod(shape)) * dtype.itemsize
+                    levels.append((scale, blob[offset:offset + size].view(dtype).reshape(shape)))
+                entries[key] = dict(item, levels=levels)
+            self.entries = entries
+            self.blob = blob
+            logger.info(f"已加载模板缓存: {len(entries)} 个条目 ({blob.nbytes / 1024:.0f} KB)")
+        except Exception as e:
+            logger.error(f"加载模板缓存失败，重新编译: {e}")
+            self.entries = {}
+            self.blob = None
+
+    def pyramid(self, path, kind, scale_factors):
+        """获取模板文件按 kind 预处理后的各尺度版本 [(scale, template)]，文件不存在或无法解码时返回None"""
+        scales = [round(float(scale), 2) for scale in scale_factors]
+        source = self.source_key(path)
+        key = f"{source}|{kind}|{','.join(f'{scale:.2f}' for scale in scales)}"
+        try:
+            stat = os.stat(path)
+            entry = self.entries.get(key)
+            if entry is not None and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+                self.hits += 1
+                return list(entry['levels'])
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            sha1 = hashlib.sha1(data).hexdigest()
+            if entry is not None and entry['sha1'] == sha1:
+                # 只是修改时间变了（如重新复制了同样的文件）
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                self.dirty = True
+                self.hits += 1
+                return list(entry['levels'])
+
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                return None
+            levels = build_scaled_templates(compile_template(image, kind), scales)
+        except OSError:
+            return None
+        except Exception as e:
+            logger.error(f"编译模板失败 {path}: {e}")
+            return None
+
+        self.entries[key] = {'source': source, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                             'sha1': sha1, 'levels': levels}
+        self.dirty = True
+        self.compiles += 1
+        logger.debug(f"已编译模板: {path} ({kind}, {len(levels)} 个尺度)")
+        return list(levels)
+
+    def image(self, path, kind='bgr'):
+        """获取模板文件按 kind 预处理后的原尺寸图像，失败时返回None"""
+        levels = self.pyramid(path, kind, [1.0])
+        return levels[0][1] if levels else None
+
+    def save(self):
+        """有新编译或更新的条目时写入新的数组文件并替换清单，源文件已删除的条目不再保存"""
+        if not self.directory or not self.dirty:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = {key: entry for key, entry in self.entries.items()
+                       if os.path.exists(self.source_path(entry['source']))}
+            items = {}
+            layout = []
+            offset = 0
+            for key, entry in entries.items():
+                levels = []
+                for scale, template in entry['levels']:
+                    offset = -(-offset // STORE_ALIGN) * STORE_ALIGN
+                    levels.append([scale, list(template.shape), template.dtype.str, offset])
+                    layout.append((offset, template))
+                    offset += template.nbytes
+                items[key] = {'source': entry['source'], 'mtime_ns': entry['mtime_ns'], 'size': entry['size'],
+                              'sha1': entry['sha1'], 'levels': levels}
+
+            blob = np.zeros(offset, dtype=np.uint8)
+            for start, template in layout:
+                blob[start:start + template.nbytes] = np.ascontiguousarray(template).reshape(-1).view(np.uint8)
+            # 每次写入新文件：其他进程（或本进程的旧模板）可能仍在映射旧文件，Windows上无法覆盖
+            name = f"templates_{time.time_ns()}_{os.getpid()}.npy"
+            np.save(os.path.join(self.directory, name), blob)
+
+            manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+            temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': STORE_VERSION, 'blob': name, 'entries': items}, f, indent=1, ensure_ascii=False)
+            os.replace(temp_path, manifest_path)
+
+            self.entries = entries
+            self.dirty = False
+            self._remove_stale(name)
+            logger.info(f"已保存模板缓存: {len(items)} 个条目 ({offset / 1024:.0f} KB)")
+        except Exception as e:
+            logger.error(f"保存模板缓存失败: {e}")
+
+    def _remove_stale(self, current):
+        """删除旧的数组文件，仍被映射而无法删除的留到下次保存
+
+        多开时各实例共用同一个缓存目录并可能同时保存：清单当前指向的数组文件和刚写入不久的数组文件
+        （可能是其他进程已写入数组、尚未替换清单）都保留。
+        """
+        keep = {current}
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                keep.add(json.load(f).get('blob'))
+        except Exception:
+            pass
+        cutoff = time.time() - STALE_GRACE
+        for name in os.listdir(self.directory):
+            if name.startswith('templates_') and name.endswith('.npy') and name not in keep:
+                path = os.path.join(self.directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+class TemplateWatcher:
+    """定期扫描模板目录中图片文件的修改时间和大小，找出新增、修改和删除的文件"""
+
+    def __init__(self, directories, interval=WATCH_INTERVAL, clock=time.monotonic):
+        """
+        :param directories: 监视的目录列表
+        :param interval: 两次扫描的最小间隔（秒）
+        """
+        self.directories = list(directories)
+        self.interval = interval
+        self.clock = clock
+        self.snapshot = self.scan()
+        self.last_check = clock()
+
+    def scan(self):
+        """返回 {文件路径: (修改时间, 大小)}"""
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.lower().endswith(TEMPLATE_EXTS) and entry.is_file():
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def poll(self):
+        """距上次扫描超过 interval 秒时重新扫描，返回发生变化的文件路径（在主循环中每个tick调用）"""
+        now = self.clock()
+        if now - self.last_check < self.interval:
+            return []
+        self.last_check = now
+        snapshot = self.scan()
+        changed = sorted(path for path in set(snapshot) | set(self.snapshot)
+                         if snapshot.get(path) != self.snapshot.get(path))
+        self.snapshot = snapshot
+        return changed
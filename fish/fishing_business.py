@@ -6,10 +6,10 @@
 import logging
 import time
 import threading
-from PIL import ImageGrab
 from PyQt5.QtCore import QObject, pyqtSignal
 from config_manager import ConfigManager
 from image_detector import ImageDetector
+from common.capture import default_capture
 
 
 class FishingBusiness(QObject):
@@ -358,8 +358,8 @@ class FishingBusiness(QObject):
         
         # 截取按钮位置图像
         x, y, w, h = button_pos
-        region_img = ImageGrab.grab(bbox=(x, y, x + w, y + h))
-        if not region_img:
+        region_img = default_capture().grab((x, y, x + w, y + h), 'rgb')
+        if region_img is None:
             return None
         
         # 检测按钮
@@ -7,11 +7,11 @@
 import logging
 import time
 import threading
-from PIL import ImageGrab
 from PyQt5.QtCore import QObject, pyqtSignal
 from image_processor import ImageProcessor
 from config_manager import ConfigManager
 from click_utils import click_position
+from common.capture import default_capture
 import re
 ##
 class PaintBusiness(QObject):
@@ -155,19 +155,12 @@ class PaintBusiness(QObject):
             if not self.background_color_button_pos:
                 return
             
-            # 截取当前屏幕
-            screenshot = ImageGrab.grab()
-            
             # 计算按钮中心点
             center_x = self.background_color_button_pos[0] + self.background_color_button_pos[2] // 2
             center_y = self.background_color_button_pos[1] + self.background_color_button_pos[3] // 2
             
-            # 获取中心点颜色
-            color = screenshot.getpixel((center_x, center_y))
-            
-            # 如果是RGBA格式，转换为RGB
-            if len(color) == 4:
-                color = color[:3]
+            # 获取中心点颜色（只截取这一个像素）
+            color = default_capture().pixel(center_x, center_y)
             
             logging.info(f"背景色读取完成: RGB{color}")
             self.status_updated.emit(f"背景色读取完成: RGB{color}")
@@ -363,12 +356,9 @@ class PaintBusiness(QObject):
         try:
             colors = []
             
-            # 分析父颜色区域（2列×8行）
-            screenshot = ImageGrab.grab()
-            
-            # 计算每个颜色按钮的大小和位置
-            area_width = self.parent_color_area_pos[2]
-            area_height = self.parent_color_area_pos[3]
+            # 分析父颜色区域（2列×8行），只截取颜色区域
+            area_x, area_y, area_width, area_height = self.parent_color_area_pos
+            area_img = default_capture().grab((area_x, area_y, area_x + area_width, area_y + area_height), 'rgb')
             
             # 2列8行布局
             button_width = area_width // 2
@@ -381,11 +371,7 @@ class PaintBusiness(QObject):
                     center_y = self.parent_color_area_pos[1] + row * button_height + button_height // 2
                     
                     # 获取颜色
-                    color = screenshot.getpixel((center_x, center_y))
-                    
-                    # 如果是RGBA格式，转换为RGB
-                    if len(color) == 4:
-                        color = color[:3]
+                    color = tuple(int(value) for value in area_img[center_y - area_y, center_x - area_x])
                     
                     # 检查是否为背景色（跳过）
                     if self._is_background_color(color):
@@ -417,12 +403,9 @@ class PaintBusiness(QObject):
         try:
             colors = []
             
-            # 分析子颜色区域（2列×最多5行）
-            screenshot = ImageGrab.grab()
-            
-            # 计算每个颜色按钮的大小和位置
-            area_width = self.child_color_area_pos[2]
-            area_height = self.child_color_area_pos[3]
+            # 分析子颜色区域（2列×最多5行），只截取颜色区域
+            area_x, area_y, area_width, area_height = self.child_color_area_pos
+            area_img = default_capture().grab((area_x, area_y, area_x + area_width, area_y + area_height), 'rgb')
             
             # 2列最多5行布局
             button_width = area_width // 2
@@ -435,11 +418,7 @@ class PaintBusiness(QObject):
                     center_y = self.child_color_area_pos[1] + row * button_height + button_height // 2
                     
                     # 获取颜色
-                    color = screenshot.getpixel((center_x, center_y))
-                    
-                    # 如果是RGBA格式，转换为RGB
-                    if len(color) == 4:
-                        color = color[:3]
+                    color = tuple(int(value) for value in area_img[center_y - area_y, center_x - area_x])
                     
                     # 检查是否为背景色（跳过）
                     if self._is_background_color(color):
@@ -470,19 +449,12 @@ class PaintBusiness(QObject):
             if not self.background_color_button_pos:
                 return False
             
-            # 截取当前屏幕
-            screenshot = ImageGrab.grab()
-            
             # 计算背景色按钮中心点
             center_x = self.background_color_button_pos[0] + self.background_color_button_pos[2] // 2
             center_y = self.background_color_button_pos[1] + self.background_color_button_pos[3] // 2
             
-            # 获取背景色
-            bg_color = screenshot.getpixel((center_x, center_y))
-            
-            # 如果是RGBA格式，转换为RGB
-            if len(bg_color) == 4:
-                bg_color = bg_color[:3]
+            # 获取背景色（只截取这一个像素）
+            bg_color = default_capture().pixel(center_x, center_y)
             
             # 计算颜色差异（简单的欧几里得距离）
             diff = sum((c1 - c2) ** 2 for c1, c2 in zip(color, bg_color)) ** 0.5